@@ -106,7 +106,16 @@ if __name__ == '__main__':
     # 如果试用期有效，显示剩余时间并继续启动应用
     print(f"CADtoExcel - {message}")
 
-    # 在生产环境中应使用WSGI服务器（如gunicorn或uwsgi）
-    # 这里仅为开发环境使用
-    # app.run(host='0.0.0.0', port=5001, debug=True)
-    app.run(host='0.0.0.0', port=5001, debug=False, use_reloader=False, threaded=True)
+    # 预加载后启动服务：CADTOEXCEL_HTTP_WORKERS 大于1时使用gunicorn多进程服务，否则使用单进程多线程服务
+    from src.server import serve
+    from src.settings import HTTP_WORKERS, HTTP_THREADS, HTTP_MAX_REQUESTS, HTTP_SHUTDOWN_TIMEOUT, WORKER_PROCESSES
+    serve(
+        app,
+        host='0.0.0.0',
+        port=5001,
+        workers=HTTP_WORKERS,
+        threads=HTTP_THREADS,
+        max_requests=HTTP_MAX_REQUESTS,
+        worker_processes=WORKER_PROCESSES,
+        shutdown_timeout=HTTP_SHUTDOWN_TIMEOUT
+    )
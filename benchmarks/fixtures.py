@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+基准测试用的合成数据
+
+按指定规模生成dwgread风格的JSON（OBJECTS 列表中的MTEXT及其他实体）和工艺流程卡（.xls/.xlsx），
+内容覆盖真实图纸中常见的尺寸标注、公差、技术要求、标题栏文本和字体格式控制码。
+使用固定的随机种子，相同参数生成的数据完全相同，不同次运行的结果可以比较。
+"""
+
+import os
+import json
+import random
+import logging
+from typing import Any, Dict, List
+
+# xlwt 为可选依赖，未安装时无法生成 .xls 工艺流程卡
+try:
+    import xlwt
+except ImportError:
+    xlwt = None
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEED = 20240601
+
+# 工艺流程卡中工序标题行所在的行（0-based），与真实工艺流程卡一致
+PROCESS_HEADER_ROW = 6
+
+# 工序部分的结束标记
+PROCESS_END_TEXT = "以上全程保护外观无划痕伤"
+
+# 工序名称均在外观要求对照表中，报告生成时会匹配到外观检验项
+PROCESS_NAMES = ['剪床', '镭射', 'NC冲', '去毛刺', '折弯', '攻牙', '钻孔', '沉孔', '普冲', '钳工校形']
+
+# 标题栏等固定文本，会被 _is_dimension_text 过滤
+_TITLE_BLOCK_TEXTS = [
+    "文件编号",
+    "说明",
+    "WI-GC006-D",
+    "{\\fSimSun|b0|i0|c134|p2;华阳通机电有限公司}",
+    "\\f楷体_GB2312|b0|i0|c134|p49;备注:\\P    ",
+    "C:\\drawings\\template.dwt",
+]
+
+_NOTE_TEXTS = [
+    "技术要求：未注公差按GB/T1804-m",
+    "去毛刺，锐边倒钝",
+    "表面喷粉，颜色RAL7035",
+    "折弯内R角按板厚",
+]
+
+_OTHER_ENTITIES = ['LINE', 'CIRCLE', 'ARC', 'LWPOLYLINE', 'DIMENSION', 'INSERT']
+
+
+def _dimension_text(rng: random.Random) -> str:
+    """生成一条随机的尺寸标注文本"""
+    size = f"{rng.uniform(1, 500):.1f}"
+    tolerance = rng.choice(['0.05', '0.1', '0.2', '0.3'])
+    kind = rng.randrange(8)
+    if kind == 0:
+        return f"\\A1;{rng.randint(1, 99)}-%%c{size}{{\\H0.7x;\\S+{tolerance}^ 0;}}"
+    if kind == 1:
+        return f"%%c{size}"
+    if kind == 2:
+        return f"R{size}"
+    if kind == 3:
+        return f"{rng.choice([30, 45, 60, 90, 135])}%%d"
+    if kind == 4:
+        return f"{size}%%p{tolerance}"
+    if kind == 5:
+        return f"M{rng.choice([3, 4, 5, 6, 8, 10])}"
+    if kind == 6:
+        return f"{size}x{rng.uniform(1, 500):.1f}"
+    return size
+
+
+def generate_dwg_objects(mtext_count: int, seed: int = DEFAULT_SEED) -> Dict[str, Any]:
+    """
+    生成dwgread风格的原始DWG数据
+
+    约70%的MTEXT为尺寸标注，其余为技术要求和标题栏文本；另生成同样数量的其他实体，
+    与真实图纸中MTEXT只占一部分实体的情况一致。
+
+    Args:
+        mtext_count: MTEXT实体数量
+        seed: 随机种子
+
+    Returns:
+        Dict[str, Any]: {"OBJECTS": [...]}，与 dwgread -O JSON 的结构相同
+    """
+    rng = random.Random(seed)
+    objects = []
+    handle = 0x100
+    for _ in range(mtext_count):
+        roll = rng.random()
+        if roll < 0.7:
+            text = _dimension_text(rng)
+            layer = rng.choice(['DIM', '尺寸', '0'])
+        elif roll < 0.85:
+            text = rng.choice(_NOTE_TEXTS)
+            layer = 'TEXT'
+        else:
+            text = rng.choice(_TITLE_BLOCK_TEXTS)
+            layer = '0'
+        objects.append({
+            "entity": "MTEXT",
+            "handle": [0, 2, handle],
+            "ownerhandle": [4, 1, 0x1F],
+            "layer": layer,
+            "text": text
+        })
+        handle += 1
+
+        objects.append({
+            "entity": rng.choice(_OTHER_ENTITIES),
+            "handle": [0, 2, handle],
+            "ownerhandle": [4, 1, 0x1F],
+            "layer": '0'
+        })
+        handle += 1
+
+    return {"OBJECTS": objects}
+
+
+def write_dwg_json(path: str, mtext_count: int, seed: int = DEFAULT_SEED) -> str:
+    """
+    将 generate_dwg_objects 的结果写入JSON文件
+
+    Args:
+        path: 输出文件路径
+        mtext_count: MTEXT实体数量
+        seed: 随机种子
+
+    Returns:
+        str: 输出文件路径
+    """
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(generate_dwg_objects(mtext_count, seed), f, ensure_ascii=False)
+    return path
+
+
+def process_card_rows(process_count: int, seed: int = DEFAULT_SEED) -> List[List[str]]:
+    """
+    生成工艺流程卡第一个工作表的内容
+
+    前6行为标题和产品信息（A4版本、D4产品编码、C5图号、C6零件名称、H6材料），第7行为工序标题行，
+    之后为工序行：每隔几道工序有一行只填写说明的续行，最后是结束标记行和签字行。
+
+    Args:
+        process_count: 工序行数
+        seed: 随机种子
+
+    Returns:
+        List[List[str]]: 按行排列的单元格文本（A-H列）
+    """
+    rng = random.Random(seed)
+    rows = [[''] * 8 for _ in range(PROCESS_HEADER_ROW)]
+    rows[0][0] = '工艺流程卡'
+    rows[3][0] = '版本:03'
+    rows[3][3] = '产品编码:21013554'
+    rows[4][2] = '81206851'
+    rows[5][2] = '安装支架'
+    rows[5][7] = 'Fe.08 T=3'
+    rows.append(['工序', '工序代码', '工序内容', '', '', '', '', ''])
+
+    for index in range(process_count):
+        name = PROCESS_NAMES[index % len(PROCESS_NAMES)]
+        if index and index % 4 == 0:
+            # 续行：工序名称和代码沿用上一行
+            rows.append(['', '', f"{name}注意事项{index}", '', '', '', '', ''])
+            continue
+        code = f"{(index + 1) * 10:04d}"
+        rows.append([name, code, f"{name}，按图纸要求加工，公差±{rng.choice(['0.1', '0.2'])}", '', '', '', '', ''])
+
+    rows.append(['', '', PROCESS_END_TEXT, '', '', '', '', ''])
+    rows.append(['编制', '', '审核', '', '批准', '', '', ''])
+    return rows
+
+
+def write_process_card(path: str, process_count: int, seed: int = DEFAULT_SEED) -> str:
+    """
+    按扩展名将工艺流程卡写入 .xlsx（openpyxl）或 .xls（xlwt）文件
+
+    Args:
+        path: 输出文件路径
+        process_count: 工序行数
+        seed: 随机种子
+
+    Returns:
+        str: 输出文件路径
+
+    Raises:
+        ImportError: 缺少写入该格式所需的库
+        ValueError: 不支持的扩展名
+    """
+    rows = process_card_rows(process_count, seed)
+    file_ext = os.path.splitext(path)[1].lower()
+
+    if file_ext == '.xlsx':
+        from openpyxl import Workbook
+        wb = Workbook()
+        ws = wb.active
+        ws.title = '工艺流程卡'
+        for row in rows:
+            ws.append([value or None for value in row])
+        wb.save(path)
+    elif file_ext == '.xls':
+        if xlwt is None:
+            raise ImportError("生成 .xls 工艺流程卡需要安装 xlwt")
+        wb = xlwt.Workbook(encoding='utf-8')
+        ws = wb.add_sheet('工艺流程卡')
+        for row_index, row in enumerate(rows):
+            for col_index, value in enumerate(row):
+                if value:
+                    ws.write(row_index, col_index, value)
+        wb.save(path)
+    else:
+        raise ValueError(f"不支持的文件格式: {file_ext}，仅支持 .xls 或 .xlsx")
+
+    return path
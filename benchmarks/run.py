@@ -0,0 +1,397 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+处理流程的基准测试
+
+在合成数据上分别测量各处理步骤的耗时，并测量从dwgread JSON到检验报告的完整流程：
+
+    is_dimension_text        从dwgread JSON的OBJECTS中筛选MTEXT（与 parse_dwg_file 相同的过滤逻辑）
+    clean_cad_text           将筛选后的MTEXT转换为报告中的显示文本（每次运行前清空 parse_mtext 缓存）
+    parse_excel_file         解析 .xls/.xlsx 工艺流程卡
+    generate_template_report 由DWG数据JSON和工艺流程卡生成检验报告（不导出图纸图像）
+    end_to_end               读取dwgread JSON、筛选MTEXT、解析工艺流程卡并生成检验报告
+
+结果写入JSON文件，可作为基线；指定 --baseline 时与基线比较，最短耗时超过基线一定比例的用例视为性能回退，
+以退出码1结束。缺少依赖（如pandas、openpyxl、xlwt）的用例跳过，不影响其余用例；但基线中的用例本次被跳过或
+未运行（--only 未选中的除外）时同样以退出码1结束。只为 --only 选中的用例生成合成数据。
+
+    python benchmarks/run.py --output baseline.json
+    python benchmarks/run.py --baseline baseline.json --threshold 0.2
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import platform
+import argparse
+import tempfile
+import statistics
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 设置项目根目录
+ROOT_DIR = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.fixtures import DEFAULT_SEED, generate_dwg_objects, write_process_card
+from src.mtext_parser import parse_mtext
+from src.settings import APPEARANCE_MAP_FILE, TEMPLATE_FILE
+
+# 确保日志目录存在
+logs_dir = os.path.join(ROOT_DIR, 'logs')
+os.makedirs(logs_dir, exist_ok=True)
+
+# 配置日志：各模块的日志照常写入文件（与实际运行时的开销一致），终端只输出测试结果
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(os.path.join(logs_dir, 'benchmark.log'), encoding='utf-8')
+    ]
+)
+logger = logging.getLogger(__name__)
+
+# 结果文件格式版本，格式变化时递增
+RESULTS_VERSION = 1
+
+# 报告中的DWG文件名（决定输出的报告文件名）
+DWG_FILE_NAME = 'BENCH-01.dwg'
+
+
+@dataclass
+class Case:
+    """一个基准测试用例"""
+    name: str
+    run: Callable[[], Any]  # 被测量的操作
+    setup: Optional[Callable[[], None]] = None  # 每次测量前执行，不计入耗时
+
+
+def parse_sizes(value: str) -> List[int]:
+    """解析逗号分隔的规模列表，如 10,1000,100000"""
+    try:
+        sizes = [int(item) for item in value.split(',') if item.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无效的规模列表: {value}")
+    if not sizes or any(size <= 0 for size in sizes):
+        raise argparse.ArgumentTypeError(f"规模必须为正整数: {value}")
+    return sizes
+
+
+def filter_mtext(raw_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    按 parse_dwg_file 的规则从原始DWG数据中筛选MTEXT实体
+
+    Args:
+        raw_data: dwgread风格的原始DWG数据
+
+    Returns:
+        List[Dict[str, Any]]: 保留的MTEXT（text 和 ownerhandle）
+    """
+    from src.dwg_parser import _is_dimension_text
+
+    mtext_entities = []
+    for obj in raw_data.get('OBJECTS', []):
+        if isinstance(obj, dict) and obj.get('entity') == 'MTEXT' and _is_dimension_text(obj):
+            if 'ownerhandle' in obj:
+                mtext_entities.append({"text": obj.get('text', ''), "ownerhandle": obj['ownerhandle']})
+    return mtext_entities
+
+
+def measure(case: Case, repeat: int, warmup: int) -> Dict[str, Any]:
+    """
+    多次运行用例并记录每次的耗时
+
+    Args:
+        case: 测试用例
+        repeat: 计时的运行次数
+        warmup: 计时前不计时的运行次数
+
+    Returns:
+        Dict[str, Any]: 最短耗时 min、中位数 median 和每次耗时 runs（秒）
+    """
+    runs = []
+    for index in range(warmup + repeat):
+        if case.setup:
+            case.setup()
+        start = time.perf_counter()
+        case.run()
+        elapsed = time.perf_counter() - start
+        if index >= warmup:
+            runs.append(elapsed)
+    return {
+        'min': min(runs),
+        'median': statistics.median(runs),
+        'runs': runs
+    }
+
+
+def build_cases(args, work_dir: str, skipped: Dict[str, str]) -> List[Case]:
+    """
+    按规模参数构建测试用例，只为 --only 选中的用例生成合成数据；缺少依赖的用例记录到 skipped
+
+    Args:
+        args: 命令行参数
+        work_dir: 存放合成数据和生成报告的临时目录
+        skipped: 用例名 -> 跳过原因
+
+    Returns:
+        List[Case]: 测试用例
+    """
+    def selected(name: str) -> bool:
+        return not args.only or any(pattern in name for pattern in args.only)
+
+    mtext_counts = [count for count in args.mtext
+                    if selected(f"is_dimension_text[mtext={count}]") or selected(f"clean_cad_text[mtext={count}]")]
+    report_sizes = [(count, rows) for count in args.report_mtext for rows in args.rows
+                    if selected(f"generate_template_report[mtext={count},rows={rows}]")
+                    or selected(f"end_to_end[mtext={count},rows={rows}]")]
+    cases = []
+
+    # 原始DWG数据按所需的最大规模生成一次，较小规模取其前缀，不同规模的数据分布一致
+    largest = max(mtext_counts + [count for count, _ in report_sizes], default=0)
+    all_objects = generate_dwg_objects(largest, args.seed)['OBJECTS'] if largest else []
+
+    def raw_data(mtext_count):
+        # 每个MTEXT后跟一个其他实体
+        return {"OBJECTS": all_objects[:mtext_count * 2]}
+
+    # MTEXT筛选
+    for count in mtext_counts:
+        name = f"is_dimension_text[mtext={count}]"
+        if selected(name):
+            data = raw_data(count)
+            cases.append(Case(name, lambda data=data: filter_mtext(data)))
+
+    # CAD文本清理
+    clean_counts = [count for count in mtext_counts if selected(f"clean_cad_text[mtext={count}]")]
+    clean_cad_text = None
+    if clean_counts:
+        try:
+            from src.report_generator import clean_cad_text
+        except ImportError as e:
+            for count in clean_counts:
+                skipped[f"clean_cad_text[mtext={count}]"] = str(e)
+    if clean_cad_text is not None:
+        for count in clean_counts:
+            texts = [item['text'] for item in filter_mtext(raw_data(count))]
+            cases.append(Case(
+                f"clean_cad_text[mtext={count}]",
+                lambda texts=texts: [clean_cad_text(text) for text in texts],
+                setup=parse_mtext.cache_clear
+            ))
+
+    # 工艺流程卡按需生成，同一格式和行数只生成一次；缺少依赖时记录原因
+    process_cards = {}
+    card_errors = {}
+
+    def process_card(file_format, rows):
+        key = (file_format, rows)
+        if key not in process_cards and key not in card_errors:
+            path = os.path.join(work_dir, f"card-{rows}.{file_format}")
+            try:
+                # 解析工艺流程卡需要pandas，缺少时不必生成
+                import src.excel_parser
+                process_cards[key] = write_process_card(path, rows, args.seed)
+            except ImportError as e:
+                card_errors[key] = str(e)
+        return process_cards.get(key)
+
+    # 工艺流程卡解析
+    for file_format in args.formats:
+        for rows in args.rows:
+            name = f"parse_excel_file[{file_format},rows={rows}]"
+            if not selected(name):
+                continue
+            path = process_card(file_format, rows)
+            if path is None:
+                skipped[name] = card_errors[(file_format, rows)]
+                continue
+            from src.excel_parser import parse_excel_file
+            cases.append(Case(name, lambda path=path: parse_excel_file(path)))
+
+    # 报告生成和完整流程，使用 .xlsx 工艺流程卡（缺少时使用 .xls）
+    generate_template_report = None
+    reason = "没有可用的工艺流程卡"
+    if report_sizes:
+        try:
+            from src.excel_parser import parse_excel_file
+            from src.report_generator import generate_report_from_data, generate_template_report
+        except ImportError as e:
+            reason = str(e)
+
+    written = set()
+    for count, rows in report_sizes:
+        suffix = f"[mtext={count},rows={rows}]"
+        names = [name for name in (f"generate_template_report{suffix}", f"end_to_end{suffix}") if selected(name)]
+        card = None
+        if generate_template_report is not None:
+            card = next(filter(None, (process_card(file_format, rows)
+                                      for file_format in ('xlsx', 'xls') if file_format in args.formats)), None)
+        if card is None:
+            for name in names:
+                skipped[name] = reason
+            continue
+
+        raw_path = os.path.join(work_dir, f"raw-{count}.json")
+        dwg_path = os.path.join(work_dir, f"dwg-{count}.json")
+        if count not in written:
+            written.add(count)
+            with open(raw_path, 'w', encoding='utf-8') as f:
+                json.dump(raw_data(count), f, ensure_ascii=False)
+            with open(dwg_path, 'w', encoding='utf-8') as f:
+                json.dump({"file_name": DWG_FILE_NAME, "mtext": filter_mtext(raw_data(count))}, f, ensure_ascii=False)
+
+        output_dir = os.path.join(work_dir, f"reports-{count}-{rows}")
+        if selected(f"generate_template_report{suffix}"):
+            cases.append(Case(
+                f"generate_template_report{suffix}",
+                lambda dwg_path=dwg_path, card=card, output_dir=output_dir: generate_template_report(
+                    dwg_path, card, APPEARANCE_MAP_FILE, TEMPLATE_FILE, output_dir, render_drawing=False
+                ),
+                setup=parse_mtext.cache_clear
+            ))
+
+        if selected(f"end_to_end{suffix}"):
+            def end_to_end(raw_path=raw_path, card=card, output_dir=output_dir):
+                with open(raw_path, 'r', encoding='utf-8') as f:
+                    dwg_data = {"file_name": DWG_FILE_NAME, "mtext": filter_mtext(json.load(f))}
+                excel_data = parse_excel_file(card)
+                return generate_report_from_data(
+                    dwg_data, excel_data, APPEARANCE_MAP_FILE, TEMPLATE_FILE, output_dir,
+                    original_excel_file=card, render_drawing=False
+                )
+
+            cases.append(Case(f"end_to_end{suffix}", end_to_end, setup=parse_mtext.cache_clear))
+
+    return cases
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float, min_delta: float,
+            only: Optional[List[str]] = None) -> Tuple[List[str], List[str]]:
+    """
+    与基线比较各用例的最短耗时
+
+    Args:
+        results: 本次结果
+        baseline: 基线结果
+        threshold: 允许的相对增长，如0.2表示慢20%以内不算回退
+        min_delta: 允许的绝对增长（秒），避免极短的用例因计时误差误报
+        only: --only 指定的用例名片段，未选中的基线用例不检查
+
+    Returns:
+        Tuple[List[str], List[str]]: (性能回退的用例名, 基线中有但本次未运行或被跳过的用例名)
+    """
+    regressions = []
+    print(f"\n{'用例':<48} {'基线(ms)':>6} {'本次(ms)':>6} {'变化':>6}")
+    for name, current in results['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if previous is None:
+            print(f"{name:<50} {'-':>10} {current['min'] * 1000:10.2f} {'新增':>7}")
+            continue
+        change = current['min'] / previous['min'] - 1 if previous['min'] > 0 else 0.0
+        regressed = change > threshold and current['min'] - previous['min'] > min_delta
+        marker = '  回退' if regressed else ''
+        print(f"{name:<50} {previous['min'] * 1000:10.2f} {current['min'] * 1000:10.2f} {change:+8.1%}{marker}")
+        if regressed:
+            regressions.append(name)
+
+    # 基线中的用例本次跳过（如缺少依赖）或未运行（如规模参数不同）时无法确认没有回退，同样视为失败
+    missing = [
+        name for name in baseline.get('results', {})
+        if name not in results['results'] and (not only or any(pattern in name for pattern in only))
+    ]
+    for name in missing:
+        reason = results['skipped'].get(name)
+        print(f"{name:<50} {baseline['results'][name]['min'] * 1000:10.2f} {'-':>10} {'跳过' if reason else '未运行':>7}"
+              + (f"  {reason}" if reason else ''))
+    return regressions, missing
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='CADtoExcel 基准测试：在合成数据上测量解析和报告生成的耗时')
+    parser.add_argument('--mtext', type=parse_sizes, default=[10, 1000, 100000],
+                        help='MTEXT筛选和文本清理用例的MTEXT数量，逗号分隔，默认 10,1000,100000')
+    parser.add_argument('--rows', type=parse_sizes, default=[10, 100, 500],
+                        help='工艺流程卡的工序行数，逗号分隔，默认 10,100,500')
+    parser.add_argument('--report-mtext', type=parse_sizes, default=[10, 1000],
+                        help='报告生成和完整流程用例的MTEXT数量（每个尺寸占报告一行），逗号分隔，默认 10,1000')
+    parser.add_argument('--formats', type=lambda value: [item.strip() for item in value.split(',') if item.strip()],
+                        default=['xls', 'xlsx'], help='工艺流程卡格式，默认 xls,xlsx')
+    parser.add_argument('--only', action='append', help='只运行名称包含该字符串的用例，可重复指定')
+    parser.add_argument('--repeat', type=int, default=5, help='每个用例计时的运行次数，默认5')
+    parser.add_argument('--warmup', type=int, default=1, help='计时前不计时的运行次数，默认1')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='合成数据的随机种子')
+    parser.add_argument('--output', help='结果JSON文件路径（可作为之后比较的基线）')
+    parser.add_argument('--baseline', help='基线结果JSON文件，与之比较并在性能回退时以退出码1结束')
+    parser.add_argument('--threshold', type=float, default=0.2, help='最短耗时超过基线多少比例视为回退，默认0.2')
+    parser.add_argument('--min-delta', type=float, default=0.005,
+                        help='最短耗时至少增加多少秒才视为回退，默认0.005')
+    args = parser.parse_args()
+
+    unknown = [item for item in args.formats if item not in ('xls', 'xlsx')]
+    if unknown:
+        parser.error(f"不支持的工艺流程卡格式: {', '.join(unknown)}")
+    if args.repeat < 1 or args.warmup < 0:
+        parser.error("--repeat 至少为1，--warmup 不能为负数")
+    return args
+
+
+def main():
+    """基准测试入口"""
+    args = parse_args()
+
+    results = {
+        'version': RESULTS_VERSION,
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'repeat': args.repeat,
+            'warmup': args.warmup,
+            'seed': args.seed
+        },
+        'results': {},
+        'skipped': {}
+    }
+
+    with tempfile.TemporaryDirectory(prefix='cadtoexcel-bench-') as work_dir:
+        cases = build_cases(args, work_dir, results['skipped'])
+        for case in cases:
+            logger.info(f"运行用例: {case.name}")
+            result = measure(case, args.repeat, args.warmup)
+            results['results'][case.name] = result
+            print(f"{case.name:<50} 最短 {result['min'] * 1000:10.2f} ms  中位数 {result['median'] * 1000:10.2f} ms",
+                  flush=True)
+
+    for name, reason in results['skipped'].items():
+        print(f"{name:<50} 跳过: {reason}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('meta', {}).get('platform') != results['meta']['platform']:
+            print(f"注意：基线运行于 {baseline.get('meta', {}).get('platform')}，与本次环境不同")
+        regressions, missing = compare(results, baseline, args.threshold, args.min_delta, args.only)
+        if regressions:
+            print(f"{len(regressions)} 个用例性能回退超过 {args.threshold:.0%}: {', '.join(regressions)}")
+        if missing:
+            print(f"基线中有 {len(missing)} 个用例本次跳过或未运行: {', '.join(missing)}")
+        if regressions or missing:
+            return 1
+        print("没有性能回退")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
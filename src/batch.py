@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import csv
+import sys
+import json
+import time
+import logging
+import traceback
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Any, Iterator, Optional, Tuple
+
+from src import metrics
+from src.pairing import pair_files
+from src.pipeline import get_report_path
+from src.settings import APPEARANCE_MAP_FILE, TEMPLATE_FILE, JOB_STALE_SECONDS, REPORT_CACHE_DIRNAME
+from src.workspace import remove_stale_workspaces
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+DWG_EXTENSIONS = ('.dwg',)
+EXCEL_EXTENSIONS = ('.xls', '.xlsx')
+
+
+def discover_pairs(directory: str, confirm_cell: bool = False) -> Tuple[List[Tuple[str, str]], List[str]]:
+    """
+    在目录中查找DWG和Excel文件，按规范化的图号和版本号配对（见 pairing.pair_files）
+
+    Args:
+        directory: 输入目录
+        confirm_cell: 是否读取Excel的C5单元格图号进行确认
+
+    Returns:
+        Tuple[List[Tuple[str, str]], List[str]]: (按文件名排序的(DWG路径, Excel路径)列表, 未匹配的DWG路径列表)
+    """
+    dwg_files = []
+    excel_files = []
+    for entry in os.scandir(directory):
+        if not entry.is_file():
+            continue
+        ext = os.path.splitext(entry.name)[1].lower()
+        if ext in DWG_EXTENSIONS:
+            dwg_files.append(entry.path)
+        elif ext in EXCEL_EXTENSIONS:
+            excel_files.append(entry.path)
+    return pair_files(dwg_files, excel_files, confirm_cell=confirm_cell)
+
+
+def load_manifest(manifest_file: str) -> List[Tuple[str, str]]:
+    """
+    读取文件对清单，相对路径以清单所在目录为基准
+
+    支持两种格式：
+        CSV：表头包含 dwg 和 excel 两列
+        JSON：[{"dwg": "...", "excel": "..."}, ...] 或 [["a.dwg", "a.xls"], ...]
+
+    Args:
+        manifest_file: 清单文件路径（.csv 或 .json）
+
+    Returns:
+        List[Tuple[str, str]]: (DWG路径, Excel路径)列表
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest_file))
+    ext = os.path.splitext(manifest_file)[1].lower()
+
+    entries = []
+    if ext == '.csv':
+        with open(manifest_file, 'r', encoding='utf-8-sig', newline='') as f:
+            reader = csv.DictReader(f)
+            if not reader.fieldnames or 'dwg' not in reader.fieldnames or 'excel' not in reader.fieldnames:
+                raise ValueError(f"清单文件 {manifest_file} 缺少 dwg 或 excel 列")
+            for row in reader:
+                entries.append((row['dwg'], row['excel']))
+    elif ext == '.json':
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if not isinstance(data, list):
+            raise ValueError(f"清单文件 {manifest_file} 应为文件对列表")
+        for item in data:
+            if isinstance(item, dict):
+                entries.append((item['dwg'], item['excel']))
+            else:
+                entries.append((item[0], item[1]))
+    else:
+        raise ValueError(f"不支持的清单格式: {ext}，仅支持 .csv 或 .json")
+
+    pairs = []
+    for dwg_file, excel_file in entries:
+        dwg_file = (dwg_file or '').strip()
+        excel_file = (excel_file or '').strip()
+        if not dwg_file or not excel_file:
+            continue
+        pairs.append((os.path.join(base_dir, dwg_file), os.path.join(base_dir, excel_file)))
+    return pairs
+
+
+def is_up_to_date(dwg_file: str, excel_file: str, output_dir: str) -> bool:
+    """
+    检查报告是否比输入文件、外观要求对照表和报告模板都新
+
+    Args:
+        dwg_file: DWG文件路径
+        excel_file: Excel文件路径
+        output_dir: 输出目录
+
+    Returns:
+        bool: 报告已存在且是最新的
+    """
+    report_path = get_report_path(dwg_file, output_dir)
+    if not os.path.exists(report_path):
+        return False
+
+    report_mtime = os.path.getmtime(report_path)
+    for source in (dwg_file, excel_file, APPEARANCE_MAP_FILE, TEMPLATE_FILE):
+        if os.path.exists(source) and os.path.getmtime(source) > report_mtime:
+            return False
+    return True
+
+
+def _init_worker() -> None:
+    """工作进程初始化：标准输出只用于NDJSON结果，日志和打印信息转到标准错误"""
+    sys.stdout = sys.stderr
+    redirect_logging_to_stderr()
+
+
+def redirect_logging_to_stderr() -> None:
+    """将写入标准输出的日志处理器改为写入标准错误"""
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.StreamHandler) and getattr(handler, 'stream', None) is sys.__stdout__:
+            handler.setStream(sys.stderr)
+
+
+def process_pair(dwg_file: str, excel_file: str, output_dir: str, export_json: bool = False,
+                 save_raw: bool = False, use_cache: bool = True, trace: bool = False, profile_memory: bool = False,
+                 memory_threshold: int = 0, cache_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    处理一个文件对，捕获异常并返回可序列化的结果记录
+
+    Args:
+        dwg_file: DWG文件路径
+        excel_file: Excel文件路径
+        output_dir: 输出目录
+        export_json: 是否导出解析结果JSON
+        save_raw: 是否保存压缩的原始DWG数据
+        use_cache: 是否使用报告缓存
+        trace: 是否记录跟踪用的细分步骤和工作簿读写（见 tracing 模块）
+        profile_memory: 是否记录各阶段的内存峰值和RSS变化（各阶段依次执行，处理变慢）
+        memory_threshold: 内存阈值（字节），超过时在结果记录中标记并记录警告，0表示不标记
+        cache_dir: 报告缓存目录，默认使用Web服务的缓存目录（settings.REPORT_CACHE_DIR）
+
+    Returns:
+        Dict[str, Any]: 结果记录，包含 status（success/error）、report、dwg_json、excel_json、cached、duration、
+            timings、spans（各阶段和外部命令的计时段，见 metrics 模块）以及开启内存分析时的 memory 等字段
+    """
+    from src.pipeline import process_files
+
+    record = {
+        "dwg": dwg_file,
+        "excel": excel_file,
+        "status": "success",
+        "pid": os.getpid()
+    }
+    start = time.perf_counter()
+    with metrics.recording(trace, profile_memory) as recorder:
+        try:
+            with metrics.span('process_pair', metrics.CATEGORY_DETAIL, dwg=os.path.basename(dwg_file),
+                              excel=os.path.basename(excel_file)):
+                result = process_files(dwg_file, excel_file, output_dir, export_json=export_json, save_raw=save_raw,
+                                       use_cache=use_cache, cache_dir=cache_dir)
+            record["report"] = result["report"]
+            record["dwg_json"] = result["dwg_json"]
+            record["excel_json"] = result["excel_json"]
+            record["timings"] = result["timings"]
+            record["cached"] = result["cached"]
+        except Exception as e:
+            logger.error(f"处理文件对 {dwg_file} 和 {excel_file} 时出错: {e}")
+            logger.error(traceback.format_exc())
+            record["status"] = "error"
+            record["error"] = str(e)
+    # 出错时同样返回已完成阶段的计时段
+    record["spans"] = recorder.spans
+    if profile_memory:
+        record["memory"] = metrics.memory_summary(recorder.spans, memory_threshold)
+        if record["memory"]["over_threshold"]:
+            logger.warning(
+                f"处理文件对 {os.path.basename(dwg_file)} 时内存超过阈值: 阶段峰值 {record['memory']['peak'] / 1048576:.1f} MB，"
+                f"RSS增长 {record['memory']['rss_delta'] / 1048576:.1f} MB"
+            )
+    record["duration"] = time.perf_counter() - start
+    return record
+
+
+def run_batch(pairs: List[Tuple[str, str]], output_dir: str, jobs: int = 1, force: bool = False,
+              export_json: bool = False, save_raw: bool = False, trace: bool = False, profile_memory: bool = False,
+              memory_threshold: int = 0) -> Iterator[Dict[str, Any]]:
+    """
+    并行处理多个文件对，按完成顺序逐个产出结果记录
+
+    Args:
+        pairs: (DWG路径, Excel路径)列表
+        output_dir: 输出目录
+        jobs: 工作进程数，为1时在当前进程中顺序处理
+        force: 是否忽略已是最新的报告和报告缓存，全部重新生成
+        export_json: 是否导出解析结果JSON
+        save_raw: 是否保存压缩的原始DWG数据
+        trace: 是否在结果记录的 spans 中记录跟踪用的细分步骤
+        profile_memory: 是否在结果记录的 memory 中记录各阶段的内存
+        memory_threshold: 内存阈值（字节），超过时标记文件对
+
+    报告缓存保存在输出目录下的 report_cache 中，不写入Web服务的缓存目录。
+
+    Yields:
+        Dict[str, Any]: 结果记录，跳过的文件对 status 为 skipped；报告文件名与其他文件对相同（DWG同名）的文件对
+            status 为 error，不做处理
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    remove_stale_workspaces(output_dir, JOB_STALE_SECONDS)
+
+    # 报告按DWG文件名命名，不同目录中的同名DWG会写入同一个报告，这些文件对都不处理
+    report_counts = Counter(os.path.normcase(get_report_path(dwg_file, output_dir)) for dwg_file, _ in pairs)
+
+    pending = []
+    for dwg_file, excel_file in pairs:
+        missing = [path for path in (dwg_file, excel_file) if not os.path.exists(path)]
+        report_path = get_report_path(dwg_file, output_dir)
+        sharing = report_counts[os.path.normcase(report_path)]
+        if sharing > 1:
+            yield {
+                "dwg": dwg_file,
+                "excel": excel_file,
+                "status": "error",
+                "error": f"报告文件名冲突: {sharing} 个文件对的报告都是 {report_path}，请重命名DWG文件或分批处理",
+                "duration": 0.0
+            }
+        elif missing:
+            yield {
+                "dwg": dwg_file,
+                "excel": excel_file,
+                "status": "error",
+                "error": f"文件不存在: {', '.join(missing)}",
+                "duration": 0.0
+            }
+        elif not force and is_up_to_date(dwg_file, excel_file, output_dir):
+            yield {
+                "dwg": dwg_file,
+                "excel": excel_file,
+                "status": "skipped",
+                "report": report_path,
+                "duration": 0.0
+            }
+        else:
+            pending.append((dwg_file, excel_file))
+
+    if not pending:
+        return
+
+    cache_dir = os.path.join(output_dir, REPORT_CACHE_DIRNAME)
+
+    if jobs <= 1:
+        for dwg_file, excel_file in pending:
+            yield process_pair(dwg_file, excel_file, output_dir, export_json, save_raw, not force, trace,
+                               profile_memory, memory_threshold, cache_dir)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker) as executor:
+        futures = {
+            executor.submit(process_pair, dwg_file, excel_file, output_dir, export_json, save_raw, not force, trace,
+                            profile_memory, memory_threshold, cache_dir): (dwg_file, excel_file)
+            for dwg_file, excel_file in pending
+        }
+        for future in as_completed(futures):
+            dwg_file, excel_file = futures[future]
+            try:
+                yield future.result()
+            except Exception as e:
+                # 工作进程异常退出
+                yield {
+                    "dwg": dwg_file,
+                    "excel": excel_file,
+                    "status": "error",
+                    "error": f"工作进程异常: {e}",
+                    "duration": 0.0
+                }
@@ -4,19 +4,22 @@
 import os
 import sys
 import json
+import time
 import logging
 import argparse
-from typing import Dict, List, Any, Optional
+import importlib
+from typing import Dict, List, Any, Optional, Tuple
 import traceback
 
+# 记录启动时间，用于 --profile-imports
+_START_TIME = time.perf_counter()
+
 # 设置项目根目录
 ROOT_DIR = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
 sys.path.insert(0, ROOT_DIR)
 
-# 导入自定义模块
-from src.excel_parser import parse_excel_file, save_excel_data_to_json
-from src.dwg_parser import parse_dwg_file, save_dwg_data_to_json, convert_dwg_to_dxf
-from src.report_generator import generate_template_report
+# 导入自定义模块（仅轻量模块，其余模块由各子命令按需导入）
+from src.settings import APPEARANCE_MAP_FILE, TEMPLATE_FILE, MEMORY_THRESHOLD_BYTES, REPORT_CACHE_DIRNAME
 
 # 确保日志目录存在
 logs_dir = os.path.join(ROOT_DIR, 'logs')
@@ -33,6 +36,66 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 按需导入的模块及其耗时（秒）
+_import_timings: List[Tuple[str, float]] = []
+
+
+def lazy_import(module_name: str):
+    """
+    按需导入模块并记录导入耗时
+
+    Args:
+        module_name: 模块名，如 'src.dwg_parser'
+
+    Returns:
+        module: 导入的模块
+    """
+    already_loaded = module_name in sys.modules
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    if not already_loaded:
+        _import_timings.append((module_name, time.perf_counter() - start))
+    return module
+
+
+def print_import_profile():
+    """向标准错误输出各模块的导入耗时"""
+    total = time.perf_counter() - _START_TIME
+    print("导入耗时统计:", file=sys.stderr)
+    for module_name, elapsed in _import_timings:
+        print(f"  {module_name:<28} {elapsed * 1000:9.1f} ms", file=sys.stderr)
+    imported = sum(elapsed for _, elapsed in _import_timings)
+    print(f"  {'按需导入合计':<24} {imported * 1000:9.1f} ms", file=sys.stderr)
+    print(f"  {'进程总耗时':<25} {total * 1000:9.1f} ms", file=sys.stderr)
+
+
+def print_memory_profile(memory: Dict[str, Any]):
+    """向标准错误输出各阶段的内存峰值和RSS变化"""
+    print("内存统计（阶段峰值 / RSS变化）:", file=sys.stderr)
+    for stage, usage in memory['stages'].items():
+        rss = f"{usage['rss_delta'] / 1048576:+9.1f} MB" if usage['rss_delta'] is not None else '      未知'
+        print(f"  {stage:<16} {usage['peak'] / 1048576:9.1f} MB {rss}", file=sys.stderr)
+    if memory['over_threshold']:
+        print("  内存超过阈值", file=sys.stderr)
+
+
+def add_profiling_arguments(parser, subcommand: bool = False):
+    """
+    添加 process 和 batch 使用的 --trace、--profile-memory 和 --memory-threshold 参数
+
+    Args:
+        parser: 顶层解析器或子命令解析器
+        subcommand: 是否为子命令解析器。子命令中未指定的参数不设默认值，保留写在子命令之前的值
+    """
+    parser.add_argument('--trace', metavar='FILE', default=argparse.SUPPRESS if subcommand else None,
+                        help='将 process 或 batch 的处理过程保存为Chrome trace-event JSON（可在Perfetto中打开）')
+    parser.add_argument('--profile-memory', action='store_true', default=argparse.SUPPRESS if subcommand else False,
+                        help='记录 process 或 batch 各阶段的内存峰值（tracemalloc）和RSS变化，各阶段依次执行')
+    parser.add_argument('--memory-threshold', type=float, metavar='MB',
+                        default=argparse.SUPPRESS if subcommand else MEMORY_THRESHOLD_BYTES / 1048576,
+                        help='内存分析时阶段峰值或RSS增长超过该值的文件对标记为 over_threshold')
+
+
 def parse_args():
     parser = argparse.ArgumentParser(description='CADtoExcel: 解析CAD文件和Excel文件，生成结构化数据和检验报告')
     
@@ -44,17 +107,49 @@ def parse_args():
     process_parser.add_argument('--dwg', required=True, help='DWG文件路径')
     process_parser.add_argument('--excel', required=True, help='Excel文件路径')
     process_parser.add_argument('--output', default='outputs', help='输出目录')
+    process_parser.add_argument('--save-json', action='store_true', help='额外导出DWG和Excel解析结果JSON')
+    process_parser.add_argument('--save-raw', action='store_true', help='保存压缩的原始DWG数据(.jsonl.gz)')
+    process_parser.add_argument('--no-cache', action='store_true', help='不使用报告缓存，重新解析并生成报告')
+    add_profiling_arguments(process_parser, subcommand=True)
     
     # 转换命令
     convert_parser = subparsers.add_parser('convert', help='将DWG文件转换为DXF格式')
     convert_parser.add_argument('--dwg', required=True, help='要转换的DWG文件路径')
     convert_parser.add_argument('--output', default='outputs', help='输出目录')
     
+    # 批处理命令
+    batch_parser = subparsers.add_parser('batch', help='并行批量处理目录或清单中的DWG和Excel文件对')
+    batch_source = batch_parser.add_mutually_exclusive_group(required=True)
+    batch_source.add_argument('--input-dir', help='输入目录，按文件名中的图号和版本号配对DWG和Excel文件')
+    batch_source.add_argument('--manifest', help='文件对清单(.csv，表头为dwg,excel；或.json)')
+    batch_parser.add_argument('--output', default='outputs', help='输出目录')
+    batch_parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='工作进程数，默认为CPU核数')
+    batch_parser.add_argument('--force', action='store_true', help='重新生成已是最新的报告（同时不使用报告缓存）')
+    batch_parser.add_argument('--confirm-cell', action='store_true', help='配对时读取工艺流程卡C5单元格图号进行确认')
+    batch_parser.add_argument('--save-json', action='store_true', help='额外导出DWG和Excel解析结果JSON')
+    batch_parser.add_argument('--save-raw', action='store_true', help='保存压缩的原始DWG数据(.jsonl.gz)')
+    add_profiling_arguments(batch_parser, subcommand=True)
+    
+    # 监控命令
+    watch_parser = subparsers.add_parser('watch', help='监控文件夹，DWG和Excel文件写入完成后自动生成检验报告')
+    watch_parser.add_argument('--watch-dir', required=True, help='监控目录，按文件名(图号)配对DWG和Excel文件')
+    watch_parser.add_argument('--output', default='outputs', help='输出目录')
+    watch_parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='工作进程数，默认为CPU核数')
+    watch_parser.add_argument('--settle', type=float, default=2.0, help='文件大小和修改时间保持不变多少秒后视为写入完成')
+    watch_parser.add_argument('--poll-interval', type=float, default=2.0, help='轮询间隔（秒）')
+    watch_parser.add_argument('--polling', action='store_true', help='强制使用轮询，不使用文件变化通知')
+    watch_parser.add_argument('--save-json', action='store_true', help='额外导出DWG和Excel解析结果JSON')
+    watch_parser.add_argument('--save-raw', action='store_true', help='保存压缩的原始DWG数据(.jsonl.gz)')
+    
     # 保留的兼容性命令行参数
     parser.add_argument('--dwg', help='DWG文件路径(兼容旧版)')
     parser.add_argument('--excel', help='Excel文件路径(兼容旧版)')
     parser.add_argument('--output', default='outputs', help='输出目录(兼容旧版)')
     parser.add_argument('--convert-dwg', help='将DWG文件转换为DXF格式(兼容旧版)')
+    parser.add_argument('--save-json', action='store_true', help='额外导出DWG和Excel解析结果JSON(兼容旧版)')
+    parser.add_argument('--save-raw', action='store_true', help='保存压缩的原始DWG数据(兼容旧版)')
+    parser.add_argument('--profile-imports', action='store_true', help='结束时输出各模块的导入耗时')
+    add_profiling_arguments(parser)
     
     return parser.parse_args()
 
@@ -65,6 +160,14 @@ def main():
     # 确保输出目录存在
     os.makedirs(args.output, exist_ok=True)
     
+    try:
+        run_command(args)
+    finally:
+        if args.profile_imports:
+            print_import_profile()
+
+def run_command(args):
+    """根据参数分发到对应的子命令"""
     # 处理子命令
     if args.command == 'convert':
         # 处理DWG转DXF命令
@@ -72,6 +175,12 @@ def main():
     elif args.command == 'process':
         # 处理DWG和Excel文件
         process_files_command(args)
+    elif args.command == 'batch':
+        # 批量处理文件对
+        batch_command(args)
+    elif args.command == 'watch':
+        # 监控文件夹
+        watch_command(args)
     elif args.convert_dwg:
         # 兼容性模式：使用--convert-dwg参数
         args.dwg = args.convert_dwg
@@ -92,6 +201,9 @@ def convert_dwg_to_dxf_command(args):
         logger.error(f"DWG文件不存在: {dwg_file}")
         sys.exit(1)
     
+    # 只需调用dwg2dxf，不导入pandas/openpyxl/ezdxf
+    convert_dwg_to_dxf = lazy_import('src.dwg_parser').convert_dwg_to_dxf
+    
     # 创建输出文件路径
     base_name = os.path.splitext(os.path.basename(dwg_file))[0]
     dxf_file = os.path.join(args.output, f"{base_name}.dxf")
@@ -125,59 +237,56 @@ def process_files_command(args):
         logger.error(f"Excel文件不存在: {excel_file}")
         sys.exit(1)
     
-    # 解析DWG文件
-    logger.info(f"解析DWG文件: {args.dwg}")
-    dwg_basename = os.path.splitext(os.path.basename(args.dwg))[0]
-    dwg_output_path = os.path.join(args.output, f"{dwg_basename}_dwg.json")
-    dwg_raw_output_path = os.path.join(args.output, f"{dwg_basename}_dwg_raw_data.json")
-    
-    dwg_data, dwg_raw_data = parse_dwg_file(args.dwg)
-    save_dwg_data_to_json(dwg_data, dwg_output_path)
+    # 定义映射文件和模板文件路径
+    appearance_map_file = APPEARANCE_MAP_FILE
+    template_file = TEMPLATE_FILE
     
-    # 保存原始DWG数据
-    if dwg_raw_data:
-        with open(dwg_raw_output_path, 'w', encoding='utf-8') as f:
-            json.dump(dwg_raw_data, f, ensure_ascii=False, indent=2)
-            logger.info(f"原始DWG数据已保存至: {dwg_raw_output_path}")
+    # 确保外观要求对照表存在
+    if not os.path.exists(appearance_map_file):
+        logger.error(f"外观要求对照表不存在: {appearance_map_file}")
+        sys.exit(1)
     
-    logger.info(f"DWG文件解析完成: {dwg_output_path}")
+    # 确保报告模板文件存在
+    if not os.path.exists(template_file):
+        logger.error(f"报告模板文件不存在: {template_file}")
+        sys.exit(1)
     
-    # 解析Excel文件
-    logger.info(f"解析Excel文件: {args.excel}")
-    excel_basename = os.path.splitext(os.path.basename(args.excel))[0]
-    excel_output_path = os.path.join(args.output, f"{excel_basename}_excel.json")
+    # 按需导入处理流程（解析和报告模块在流程内导入）
+    pipeline = lazy_import('src.pipeline')
+    lazy_import('src.dwg_parser')
+    lazy_import('src.excel_parser')
+    lazy_import('src.report_generator')
     
-    excel_data = parse_excel_file(args.excel)
-    save_excel_data_to_json(excel_data, excel_output_path)
-    logger.info(f"Excel文件解析完成: {excel_output_path}")
+    metrics = lazy_import('src.metrics')
     
-    # 生成检验报告
+    # 解析文件并生成检验报告
     try:
-        # 定义映射文件和模板文件路径
-        appearance_map_file = os.path.join(ROOT_DIR, 'maps', 'appearance_map.json')
-        template_file = os.path.join(ROOT_DIR, 'maps', 'report_map.xlsx')
+        with metrics.recording(trace=bool(args.trace), memory=args.profile_memory) as recorder:
+            try:
+                result = pipeline.process_files(
+                    dwg_file,
+                    excel_file,
+                    args.output,
+                    export_json=args.save_json,
+                    save_raw=args.save_raw,
+                    appearance_map_file=appearance_map_file,
+                    template_file=template_file,
+                    use_cache=not getattr(args, 'no_cache', False),
+                    cache_dir=os.path.join(args.output, REPORT_CACHE_DIRNAME)
+                )
+            finally:
+                if args.trace:
+                    lazy_import('src.tracing').write_trace(recorder.spans, args.trace)
+        if args.profile_memory:
+            print_memory_profile(metrics.memory_summary(recorder.spans, int(args.memory_threshold * 1048576)))
+        report_path = result['report']
         
-        # 确保外观要求对照表存在
-        if not os.path.exists(appearance_map_file):
-            logger.error(f"外观要求对照表不存在: {appearance_map_file}")
-            sys.exit(1)
-        
-        # 确保报告模板文件存在
-        if not os.path.exists(template_file):
-            logger.error(f"报告模板文件不存在: {template_file}")
-            sys.exit(1)
+        logger.info(f"检验报告已生成: {report_path}")
         
-        logger.info("开始生成检验报告")
-        report_path = generate_template_report(
-            dwg_file=dwg_output_path, 
-            excel_file=excel_output_path,
-            appearance_map_file=appearance_map_file,
-            template_file=template_file,
-            output_dir=args.output,
-            original_excel_file=args.excel
-        )
+        for key in ('dwg_json', 'excel_json', 'dwg_raw'):
+            if result[key]:
+                print(f"解析结果已导出: {result[key]}")
         
-        logger.info(f"检验报告已生成: {report_path}")
         print(f"处理完成！检验报告已生成: {report_path}")
         
     except Exception as e:
@@ -185,5 +294,90 @@ def process_files_command(args):
         print(f"生成检验报告时出错: {str(e)}")
         sys.exit(1)
 
+def batch_command(args):
+    """批量处理目录或清单中的DWG和Excel文件对，结果以NDJSON格式逐行输出到标准输出"""
+    batch = lazy_import('src.batch')
+    
+    # 标准输出只用于NDJSON结果
+    batch.redirect_logging_to_stderr()
+    
+    # 获取文件对
+    if args.manifest:
+        if not os.path.exists(args.manifest):
+            logger.error(f"清单文件不存在: {args.manifest}")
+            sys.exit(1)
+        pairs = batch.load_manifest(args.manifest)
+    else:
+        if not os.path.isdir(args.input_dir):
+            logger.error(f"输入目录不存在: {args.input_dir}")
+            sys.exit(1)
+        pairs, unmatched = batch.discover_pairs(args.input_dir, confirm_cell=args.confirm_cell)
+        for dwg_file in unmatched:
+            logger.warning(f"DWG文件 {os.path.basename(dwg_file)} 未找到匹配的Excel文件")
+    
+    logger.info(f"共 {len(pairs)} 个文件对，工作进程数: {args.jobs}")
+    
+    counts = {'success': 0, 'error': 0, 'skipped': 0}
+    over_threshold = 0
+    spans = []
+    start = time.perf_counter()
+    try:
+        for record in batch.run_batch(pairs, args.output, jobs=args.jobs, force=args.force,
+                                      export_json=args.save_json, save_raw=args.save_raw, trace=bool(args.trace),
+                                      profile_memory=args.profile_memory,
+                                      memory_threshold=int(args.memory_threshold * 1048576)):
+            counts[record['status']] += 1
+            if record.get('memory', {}).get('over_threshold'):
+                over_threshold += 1
+            spans.extend(record.get('spans') or ())
+            sys.stdout.write(json.dumps(record, ensure_ascii=False) + '\n')
+            sys.stdout.flush()
+    finally:
+        # 中断时同样保存已完成文件对的跟踪
+        if args.trace:
+            lazy_import('src.tracing').write_trace(spans, args.trace)
+    
+    logger.info(
+        f"批处理完成，成功: {counts['success']}，失败: {counts['error']}，跳过: {counts['skipped']}，"
+        f"耗时: {time.perf_counter() - start:.2f}秒"
+    )
+    if over_threshold:
+        logger.warning(f"{over_threshold} 个文件对的内存超过阈值 {args.memory_threshold:.0f} MB（见结果记录的 memory 字段）")
+    if counts['error']:
+        sys.exit(1)
+
+def watch_command(args):
+    """监控文件夹并自动处理文件对，结果以NDJSON格式逐行输出到标准输出，按Ctrl+C停止"""
+    batch = lazy_import('src.batch')
+    watcher_module = lazy_import('src.watcher')
+    
+    # 标准输出只用于NDJSON结果
+    batch.redirect_logging_to_stderr()
+    
+    if not os.path.isdir(args.watch_dir):
+        logger.error(f"监控目录不存在: {args.watch_dir}")
+        sys.exit(1)
+    
+    def write_record(record):
+        sys.stdout.write(json.dumps(record, ensure_ascii=False) + '\n')
+        sys.stdout.flush()
+    
+    watcher = watcher_module.FolderWatcher(
+        args.watch_dir,
+        args.output,
+        jobs=args.jobs,
+        settle_seconds=args.settle,
+        poll_interval=args.poll_interval,
+        use_polling=args.polling,
+        export_json=args.save_json,
+        save_raw=args.save_raw
+    )
+    logger.info(f"开始监控文件夹: {args.watch_dir}，工作进程数: {args.jobs}")
+    try:
+        watcher.run(write_record)
+    except KeyboardInterrupt:
+        watcher.stop()
+        logger.info("已停止监控")
+
 if __name__ == "__main__":
     main() 
\ No newline at end of file
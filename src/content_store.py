@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+按SHA-256寻址的上传文件内容库
+
+上传的文件以摘要为名保存一份（<内容库>/<摘要前两位>/<摘要>），作业目录中的文件通过硬链接（跨文件系统时复制）取得。
+客户端上传前先提交文件摘要，内容库中已有的文件不必再次上传。
+"""
+
+import os
+import re
+import shutil
+import hashlib
+import logging
+import tempfile
+from typing import BinaryIO, Iterable, List, Tuple
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+_DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+_CHUNK_SIZE = 1024 * 1024
+
+
+def is_digest(value: str) -> bool:
+    """是否为小写十六进制的SHA-256摘要"""
+    return isinstance(value, str) and bool(_DIGEST_RE.match(value))
+
+
+class ContentStore:
+    """上传文件内容库"""
+
+    def __init__(self, root: str):
+        """
+        Args:
+            root: 内容库目录
+        """
+        self.root = root
+
+    def path(self, digest: str) -> str:
+        """摘要对应的文件路径"""
+        if not is_digest(digest):
+            raise ValueError(f"无效的SHA-256摘要: {digest}")
+        return os.path.join(self.root, digest[:2], digest)
+
+    def has(self, digest: str) -> bool:
+        """内容库中是否已有该文件"""
+        return is_digest(digest) and os.path.isfile(self.path(digest))
+
+    def missing(self, digests: Iterable[str]) -> List[str]:
+        """
+        找出内容库中没有的摘要
+
+        Args:
+            digests: 客户端文件的摘要
+
+        Returns:
+            List[str]: 需要上传的摘要（去重，保持顺序）
+        """
+        result = []
+        for digest in dict.fromkeys(digests):
+            if not self.has(digest):
+                result.append(digest)
+        return result
+
+    def add(self, stream: BinaryIO) -> Tuple[str, int]:
+        """
+        边计算摘要边写入临时文件，完成后原子地移动到内容库
+
+        Args:
+            stream: 上传文件的数据流
+
+        Returns:
+            Tuple[str, int]: (摘要, 字节数)
+        """
+        os.makedirs(self.root, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(prefix='.upload-', dir=self.root)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in iter(lambda: stream.read(_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            target = self.path(digest.hexdigest())
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(temp_path, target)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        return digest.hexdigest(), size
+
+    def materialize(self, digest: str, dest: str) -> str:
+        """
+        将内容库中的文件放到目标路径，优先使用硬链接
+
+        Args:
+            digest: 文件摘要
+            dest: 目标路径
+
+        Returns:
+            str: 目标路径
+
+        Raises:
+            FileNotFoundError: 内容库中没有该文件（如已被清理）
+        """
+        source = self.path(digest)
+        if os.path.lexists(dest):
+            os.unlink(dest)
+        try:
+            os.link(source, dest)
+        except FileNotFoundError:
+            raise
+        except OSError:
+            # 跨文件系统或不支持硬链接时复制
+            shutil.copyfile(source, dest)
+        return dest
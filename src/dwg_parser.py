@@ -3,20 +3,23 @@
 
 import os
 import sys
+import gzip
 import json
 import logging
-import subprocess
 import tempfile
 import re
 import traceback
-from typing import Dict, List, Any, Optional
-from ezdxf import options
-from ezdxf.fonts import fonts
+from typing import Dict, List, Any, Optional, Iterator
+
+from src.metrics import run_command
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 原始DWG数据文件后缀（gzip压缩的JSON Lines）
+RAW_DATA_SUFFIX = '_dwg_raw_data.jsonl.gz'
+
 
 def parse_dwg_file(file_path: str) -> tuple[Dict[str, Any], Dict[str, Any]]:
     """
@@ -49,11 +52,6 @@ def parse_dwg_file(file_path: str) -> tuple[Dict[str, Any], Dict[str, Any]]:
         parsed_data = _parse_with_libredwg(file_path)
         if parsed_data:
             logger.info("使用LibreDWG成功解析DWG文件")
-            # 保存原始解析数据用于调试，使用文件名作为前缀
-            debug_output = os.path.join('outputs', f"{base_name}_dwg_raw_data.json")
-            with open(debug_output, 'w', encoding='utf-8') as f:
-                json.dump(parsed_data, f, ensure_ascii=False, indent=2)
-            logger.info(f"原始解析数据已保存至: {debug_output}")
     except Exception as e:
         logger.warning(f"使用LibreDWG解析失败: {e}")
 
@@ -189,7 +187,7 @@ def _parse_with_libredwg(file_path: str) -> Dict[str, Any]:
         cmd = ['dwgread', '-O', 'json', '-o', temp_json, file_path]
         logger.info(f"执行命令: {' '.join(cmd)}")
 
-        result = subprocess.run(cmd, capture_output=True, text=True, check=False)
+        result = run_command('dwgread', cmd, capture_output=True, text=True, check=False)
 
         if result.returncode != 0:
             logger.error(f"dwgread命令执行失败: {result.stderr}")
@@ -243,7 +241,7 @@ def _parse_with_dxf_conversion(file_path: str) -> Dict[str, Any]:
         cmd = ['dwg2dxf', file_path, '-o', temp_dxf]
         logger.info(f"执行命令: {' '.join(cmd)}")
 
-        result = subprocess.run(cmd, capture_output=True, text=True, check=False)
+        result = run_command('dwg2dxf', cmd, capture_output=True, text=True, check=False)
 
         if result.returncode != 0:
             logger.error(f"dwg2dxf命令执行失败: {result.stderr}")
@@ -523,6 +521,82 @@ def save_dwg_data_to_json(dwg_data: Dict[str, Any], output_path: str) -> None:
         print(f"- MTEXT实体数量: {len(dwg_data['mtext'])}")
 
 
+def save_dwg_raw_data(raw_data: Dict[str, Any], output_path: str) -> str:
+    """
+    将原始DWG数据保存为gzip压缩的JSON Lines文件
+
+    每行是一个紧凑的JSON对象：列表类型的顶级键（如OBJECTS）逐个元素写为 {"k": 键, "i": 元素}，
+    其余顶级键写为 {"k": 键, "v": 值}，读取时可逐个对象流式处理
+
+    Args:
+        raw_data: parse_dwg_file 返回的原始DWG数据
+        output_path: 输出文件路径，通常以 RAW_DATA_SUFFIX 结尾
+
+    Returns:
+        str: 输出文件路径
+    """
+    # 确保输出目录存在
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    with gzip.open(output_path, 'wt', encoding='utf-8') as f:
+        for key, value in raw_data.items():
+            if isinstance(value, list) and value:
+                for item in value:
+                    f.write(json.dumps({"k": key, "i": item}, ensure_ascii=False, separators=(',', ':')))
+                    f.write('\n')
+            else:
+                f.write(json.dumps({"k": key, "v": value}, ensure_ascii=False, separators=(',', ':')))
+                f.write('\n')
+
+    logger.info(f"原始DWG数据已保存至: {output_path}")
+    return output_path
+
+
+def iter_dwg_raw_data(file_path: str, section: Optional[str] = None) -> Iterator[tuple]:
+    """
+    流式读取 save_dwg_raw_data 保存的原始DWG数据
+
+    Args:
+        file_path: 原始DWG数据文件路径
+        section: 只读取指定的顶级键（如 'OBJECTS'），默认读取全部
+
+    Yields:
+        tuple: (顶级键, 值或列表元素, 是否为列表元素)
+    """
+    with gzip.open(file_path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if section is not None and record["k"] != section:
+                continue
+            if "i" in record:
+                yield record["k"], record["i"], True
+            else:
+                yield record["k"], record["v"], False
+
+
+def load_dwg_raw_data(file_path: str) -> Dict[str, Any]:
+    """
+    读取 save_dwg_raw_data 保存的原始DWG数据并还原为字典
+
+    Args:
+        file_path: 原始DWG数据文件路径
+
+    Returns:
+        Dict[str, Any]: 原始DWG数据
+    """
+    raw_data = {}
+    for key, value, is_item in iter_dwg_raw_data(file_path):
+        if is_item:
+            raw_data.setdefault(key, []).append(value)
+        else:
+            raw_data[key] = value
+    return raw_data
+
+
 def _is_dimension_text(mtext_obj: Dict[str, Any]) -> bool:
     """
     判断MTEXT是否为尺寸标注相关文本或其他有用的文本
@@ -677,6 +751,10 @@ def configure_font_support(
     Raises:
         RuntimeError: 字体缓存操作失败
     """
+    # ezdxf导入较慢，仅在需要配置字体时导入
+    from ezdxf import options
+    from ezdxf.fonts import fonts
+
     # 设置默认目录
     root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     default_dirs = [os.path.join(root_dir, 'fonts')]
@@ -754,15 +832,12 @@ def convert_dwg_to_dxf(dwg_file_path: str, output_path: str = None) -> str:
         os.makedirs(output_dir, exist_ok=True)
 
     try:
-        # 配置字体支持
-        configure_font_support()
-
-        # 使用dwg2dxf转换
+        # 使用dwg2dxf转换（外部工具，不依赖ezdxf的字体配置）
         logger.info(f"开始将DWG文件 {dwg_file_path} 转换为DXF文件 {output_path}")
         cmd = ['dwg2dxf', dwg_file_path, '-o', output_path]
         logger.info(f"执行命令: {' '.join(cmd)}")
 
-        result = subprocess.run(cmd, capture_output=True, text=True, check=False)
+        result = run_command('dwg2dxf', cmd, capture_output=True, text=True, check=False)
 
         if result.returncode != 0:
             logger.error(f"dwg2dxf命令执行失败: {result.stderr}")
@@ -16,6 +16,9 @@ import traceback
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 字体目录和缓存在每个进程中只需配置一次
+_font_support_configured = False
+
 
 def convert_dxf_to_image(dxf_path: str, output_path: str = None, layout_name: str = 'A3', dpi: int = 300) -> str:
     """
@@ -46,6 +49,13 @@ def convert_dxf_to_image(dxf_path: str, output_path: str = None, layout_name: st
         if output_dir and not os.path.exists(output_dir):
             os.makedirs(output_dir, exist_ok=True)
 
+        # 配置字体支持，供ezdxf渲染文本使用
+        global _font_support_configured
+        if not _font_support_configured:
+            from src.dwg_parser import configure_font_support
+            configure_font_support()
+            _font_support_configured = True
+
         # 加载DXF文件
         doc = ezdxf.readfile(dxf_path)
 
@@ -6,6 +6,8 @@ import json
 import pandas as pd
 from typing import Dict, List, Any, Optional
 
+from src.metrics import CATEGORY_WORKBOOK, span
+
 def parse_excel_file(file_path: str) -> Dict[str, Any]:
     """
     解析工艺流程卡Excel文件，提取工序信息
@@ -27,7 +29,8 @@ def parse_excel_file(file_path: str) -> Dict[str, Any]:
         raise ValueError(f"不支持的文件格式: {file_ext}，仅支持 .xls 或 .xlsx")
     
     # 读取Excel文件中的第一个sheet
-    xlsx = pd.ExcelFile(file_path, engine=engine)
+    with span('load_workbook', CATEGORY_WORKBOOK, file=os.path.basename(file_path)):
+        xlsx = pd.ExcelFile(file_path, engine=engine)
     sheet_names = xlsx.sheet_names
     
     if not sheet_names:
@@ -42,7 +45,8 @@ def parse_excel_file(file_path: str) -> Dict[str, Any]:
     }
     
     # 读取第一个工作表的数据
-    df = pd.read_excel(xlsx, sheet_name=first_sheet_name, header=None)
+    with span('read_sheet', CATEGORY_WORKBOOK, sheet=first_sheet_name):
+        df = pd.read_excel(xlsx, sheet_name=first_sheet_name, header=None)
     
     # 查找工序行（通常是第7行，索引为6）
     process_header_row = None
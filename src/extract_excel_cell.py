@@ -7,6 +7,8 @@ from openpyxl import load_workbook
 import xlrd
 from typing import Dict, Any, Optional, List, Tuple
 
+from src.metrics import CATEGORY_WORKBOOK, span
+
 # 配置日志
 logger = logging.getLogger(__name__)
 
@@ -50,7 +52,8 @@ def extract_cell_value(excel_file: str, cell_coord: str, sheet_index: int = 0) -
     try:
         if file_extension == '.xlsx':
             # 使用openpyxl处理.xlsx文件
-            wb = load_workbook(excel_file, data_only=True)
+            with span('load_workbook', CATEGORY_WORKBOOK, file=os.path.basename(excel_file)):
+                wb = load_workbook(excel_file, data_only=True)
             
             # 获取工作表
             sheets = wb.worksheets
@@ -69,7 +72,8 @@ def extract_cell_value(excel_file: str, cell_coord: str, sheet_index: int = 0) -
         
         elif file_extension == '.xls':
             # 使用xlrd处理.xls文件
-            wb = xlrd.open_workbook(excel_file)
+            with span('load_workbook', CATEGORY_WORKBOOK, file=os.path.basename(excel_file)):
+                wb = xlrd.open_workbook(excel_file)
             
             # 获取工作表
             if sheet_index >= wb.nsheets:
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+上传和输出目录的清理任务
+
+Web作业的目录按作业ID分片存放（<根目录>/<作业ID前两位>/<目录名>），单个目录下的条目数保持在几百以内。
+每个作业目录创建时登记到作业数据库（JobStore.register_dir），记录所属区域、大小和最近访问时间，
+清理时只查询索引，不遍历目录树：
+
+    0. 将所属服务进程已退出的进行中作业标记为失败，不再占用准入控制的名额
+    1. 删除超过保留期限的已结束作业记录及其目录
+    2. 删除超过保留期限未被访问的目录
+    3. 区域总大小超过配额时，按最近访问时间从早到晚删除目录，直到低于配额
+
+进行中作业的目录不会被删除。
+"""
+
+import os
+import time
+import shutil
+import logging
+import threading
+from typing import Dict, Optional
+
+from src.job_store import JobStore
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 存储区域
+AREA_UPLOADS = 'uploads'
+AREA_OUTPUTS = 'outputs'
+AREA_TEMP = 'temp'
+
+# 每次从索引中取出的待清理目录数
+_EVICT_BATCH = 100
+
+
+def shard_path(root: str, job_id: str, name: Optional[str] = None) -> str:
+    """
+    作业目录的分片路径：<root>/<作业ID前两位>/<name>
+
+    Args:
+        root: 根目录
+        job_id: 作业ID（UUID）
+        name: 目录名，默认为作业ID
+
+    Returns:
+        str: 目录路径
+    """
+    return os.path.join(root, job_id[:2], name or job_id)
+
+
+def dir_size(path: str, skip_linked: bool = False) -> int:
+    """
+    统计单个作业目录占用的字节数
+
+    Args:
+        path: 作业目录
+        skip_linked: 是否跳过有多个硬链接的文件。上传目录中的文件是内容库文件的硬链接，
+            其大小已按内容库登记，再次统计会重复计算
+
+    Returns:
+        int: 字节数
+    """
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                stat = os.stat(os.path.join(dirpath, filename))
+            except OSError:
+                continue
+            if skip_linked and stat.st_nlink > 1:
+                continue
+            total += stat.st_size
+    return total
+
+
+class Janitor:
+    """按保留期限和区域配额清理作业目录的后台任务"""
+
+    def __init__(self, job_store: JobStore, retention_seconds: float, quotas: Optional[Dict[str, int]] = None,
+                 interval: float = 600, stale_seconds: Optional[float] = None):
+        """
+        Args:
+            job_store: 作业存储（包含目录索引）
+            retention_seconds: 已结束作业和未被访问目录的保留时间（秒）
+            quotas: 区域 -> 容量上限（字节），为0或未设置的区域只按保留期限清理
+            interval: 后台清理的间隔（秒）
+            stale_seconds: 没有记录所属进程的旧作业超过该时间没有更新时标记为失败（见 JobStore.expire_stale），
+                为None时不检查中断的作业
+        """
+        self.job_store = job_store
+        self.retention_seconds = retention_seconds
+        self.quotas = dict(quotas or {})
+        self.interval = interval
+        self.stale_seconds = stale_seconds
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """启动后台清理线程，已启动时不重复启动"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._loop, name='janitor', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """停止后台清理线程"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _loop(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"清理作业目录时出错: {e}")
+            self._stopped.wait(self.interval)
+
+    def run_once(self) -> Dict[str, int]:
+        """
+        执行一次清理
+
+        Returns:
+            Dict[str, int]: 标记为中断的作业数 stale、删除的作业记录数 jobs、目录数 dirs 和释放的字节数 bytes
+        """
+        stats = {'stale': 0, 'jobs': 0, 'dirs': 0, 'bytes': 0}
+
+        # 服务进程退出时，其进行中的作业不会再更新，不标记为失败就会一直计入排队数和客户端的作业数；
+        # 其他仍在运行的服务进程的作业不受影响
+        if self.stale_seconds:
+            stats['stale'] = self.job_store.expire_stale(self.stale_seconds)
+
+        # 过期的作业记录及其目录
+        for job in self.job_store.purge_finished(self.retention_seconds):
+            stats['jobs'] += 1
+            for entry in self.job_store.get_dirs(job['id']):
+                self._evict(entry, stats)
+            # 登记目录之前创建的作业只记录了输出目录
+            if job['output_folder']:
+                shutil.rmtree(job['output_folder'], ignore_errors=True)
+
+        # 长时间未访问的目录
+        cutoff = time.time() - self.retention_seconds
+        for area in (AREA_UPLOADS, AREA_OUTPUTS, AREA_TEMP):
+            while True:
+                entries = self.job_store.evictable_dirs(area, accessed_before=cutoff, limit=_EVICT_BATCH)
+                for entry in entries:
+                    self._evict(entry, stats)
+                if len(entries) < _EVICT_BATCH:
+                    break
+
+        # 超出配额的区域按最近访问时间淘汰
+        for area, quota in self.quotas.items():
+            if not quota:
+                continue
+            usage = self.job_store.dir_usage(area)
+            while usage > quota:
+                entries = self.job_store.evictable_dirs(area, limit=_EVICT_BATCH)
+                if not entries:
+                    logger.warning(f"{area} 已使用 {usage} 字节，超过配额 {quota} 字节，但没有可以清理的目录")
+                    break
+                for entry in entries:
+                    self._evict(entry, stats)
+                    usage -= entry['size']
+                    if usage <= quota:
+                        break
+
+        if stats['dirs'] or stats['jobs']:
+            logger.info(f"清理完成，删除作业记录: {stats['jobs']}，目录: {stats['dirs']}，释放: {stats['bytes']} 字节")
+        return stats
+
+    def _evict(self, entry: Dict, stats: Dict[str, int]) -> None:
+        """删除目录（或内容库中的单个文件）及其登记记录"""
+        if os.path.isdir(entry['path']):
+            shutil.rmtree(entry['path'], ignore_errors=True)
+        elif os.path.exists(entry['path']):
+            try:
+                os.remove(entry['path'])
+            except OSError as e:
+                logger.warning(f"删除文件失败: {entry['path']}, 错误: {e}")
+        self.job_store.remove_dir(entry['path'])
+        stats['dirs'] += 1
+        stats['bytes'] += entry['size']
@@ -0,0 +1,530 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+
+# psutil 为可选依赖，未安装时用信号0检查进程是否存在
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 作业状态
+ACTIVE_STATUSES = ('pending', 'processing')
+FINISHED_STATUSES = ('completed', 'failed')
+
+# 作业类型
+KIND_BATCH = 'batch'
+KIND_SINGLE = 'single'
+
+# 作业表中可以直接更新的字段
+_JOB_FIELDS = (
+    'kind', 'status', 'start_time', 'end_time', 'total', 'processed', 'success', 'error',
+    'output_folder', 'result_zip', 'message', 'result', 'client', 'owner'
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    start_time REAL,
+    end_time REAL,
+    total INTEGER NOT NULL DEFAULT 0,
+    processed INTEGER NOT NULL DEFAULT 0,
+    success INTEGER NOT NULL DEFAULT 0,
+    error INTEGER NOT NULL DEFAULT 0,
+    output_folder TEXT,
+    result_zip TEXT,
+    message TEXT,
+    log_seq INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_updated ON jobs (status, updated);
+
+CREATE TABLE IF NOT EXISTS job_logs (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    time REAL NOT NULL,
+    level TEXT NOT NULL,
+    message TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS job_files (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS job_dirs (
+    path TEXT PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    area TEXT NOT NULL,
+    size INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_job_dirs_area_accessed ON job_dirs (area, accessed);
+CREATE INDEX IF NOT EXISTS idx_job_dirs_job ON job_dirs (job_id);
+
+CREATE TABLE IF NOT EXISTS metrics (
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    value REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (name, labels)
+) WITHOUT ROWID;
+"""
+
+# 后续版本新增的列，打开旧数据库时补充
+_ADDED_COLUMNS = {
+    'kind': "TEXT NOT NULL DEFAULT 'batch'",
+    'result': 'TEXT',
+    'client': 'TEXT',
+    'owner': 'INTEGER'
+}
+
+
+def _process_alive(pid: int) -> bool:
+    """检查进程是否仍在运行"""
+    if pid == os.getpid():
+        return True
+    if psutil is not None:
+        return psutil.pid_exists(pid)
+    if os.name == 'nt':
+        # Windows上 os.kill 会终止目标进程，不能用于检查；Windows只使用单进程服务，其他进程都是已退出的旧服务
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _format_time(timestamp: Optional[float]) -> Optional[str]:
+    """将时间戳格式化为页面显示的时间"""
+    if not timestamp:
+        return None
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+
+
+class JobStore:
+    """
+    基于SQLite的批处理作业存储
+
+    作业状态在服务重启后保留，并可由多个服务进程共享（WAL模式）。作业记录创建它的服务进程（owner），
+    作业由该进程的调度器处理，进程退出后由 expire_stale() 标记为失败。每个作业只保留最近
+    log_limit 条日志（环形缓冲），已结束的作业超过保留期限后由 purge_finished() 删除。
+    每个线程使用独立的数据库连接；进程fork后子进程重新建立连接，不沿用父进程的连接。
+    """
+
+    def __init__(self, db_file: str, log_limit: int = 200):
+        """
+        Args:
+            db_file: 数据库文件路径
+            log_limit: 每个作业保留的日志条数
+        """
+        self.db_file = db_file
+        self.log_limit = max(1, log_limit)
+        self._local = threading.local()
+        self._pid = os.getpid()
+
+        db_dir = os.path.dirname(db_file)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for name, definition in _ADDED_COLUMNS.items():
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_kind_status_created ON jobs (kind, status, created)")
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        if self._pid != os.getpid():
+            # fork出的子进程不能使用父进程打开的连接
+            self._local = threading.local()
+            self._pid = os.getpid()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row) -> Dict[str, Any]:
+        """将数据库行转换为作业字典，并补充页面显示用的字段；log_seq 为最新一条日志的序号"""
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        total = job['total'] or 0
+        job['created_at'] = job['created']
+        job['created'] = _format_time(job['created'])
+        job['completed'] = _format_time(job['end_time']) if job['status'] in FINISHED_STATUSES else None
+        job['progress'] = int(job['processed'] * 100 / total) if total else (100 if job['status'] == 'completed' else 0)
+        job['total_files'] = total
+        job['processed_files'] = job['processed']
+        job['failed_files'] = job['error']
+        # 有成功生成的报告时即可下载报告包
+        job['zip_file'] = f"batch_{job['id']}_reports.zip" if job['success'] else None
+        if job['start_time'] and job['end_time']:
+            job['duration'] = job['end_time'] - job['start_time']
+        return job
+
+    def create_job(self, job_id: str, **fields) -> None:
+        """
+        创建作业
+
+        Args:
+            job_id: 作业ID
+            **fields: 初始字段，未指定的类型为 batch、状态为 pending、所属进程为当前进程
+        """
+        now = time.time()
+        values = {'kind': KIND_BATCH, 'status': 'pending', 'start_time': now, 'owner': os.getpid()}
+        values.update(fields)
+        self._check_fields(values)
+        values = self._encode(values)
+        columns = ['id', 'created', 'updated'] + list(values)
+        placeholders = ', '.join('?' for _ in columns)
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT INTO jobs ({', '.join(columns)}) VALUES ({placeholders})",
+                [job_id, now, now] + list(values.values())
+            )
+
+    def update_job(self, job_id: str, **fields) -> None:
+        """
+        更新作业字段，result 可以是任意可序列化为JSON的对象
+
+        已结束的作业不会回到进行中状态：status 为 pending/processing 时，只更新仍在进行中的作业。
+        """
+        if not fields:
+            return
+        self._check_fields(fields)
+        reactivate = fields.get('status') in ACTIVE_STATUSES
+        fields = self._encode(fields)
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        sql = f"UPDATE jobs SET {assignments}, updated = ? WHERE id = ?"
+        params = list(fields.values()) + [time.time(), job_id]
+        if reactivate:
+            sql += f" AND status IN ({', '.join('?' for _ in ACTIVE_STATUSES)})"
+            params += list(ACTIVE_STATUSES)
+        with self._connect() as conn:
+            conn.execute(sql, params)
+
+    def increment(self, job_id: str, **deltas: int) -> None:
+        """原子地增加作业计数（processed、success、error 等）"""
+        if not deltas:
+            return
+        self._check_fields(deltas)
+        assignments = ', '.join(f"{name} = {name} + ?" for name in deltas)
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE jobs SET {assignments}, updated = ? WHERE id = ?",
+                list(deltas.values()) + [time.time(), job_id]
+            )
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """获取作业，不存在时返回None"""
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def list_jobs(self, statuses: Iterable[str], limit: int = 20, offset: int = 0,
+                  kind: str = KIND_BATCH) -> List[Dict[str, Any]]:
+        """
+        按创建时间倒序列出指定类型和状态的作业
+
+        Args:
+            statuses: 状态列表
+            limit: 每页数量
+            offset: 跳过的数量
+            kind: 作业类型
+
+        Returns:
+            List[Dict[str, Any]]: 作业列表
+        """
+        statuses = list(statuses)
+        placeholders = ', '.join('?' for _ in statuses)
+        rows = self._connect().execute(
+            f"SELECT * FROM jobs WHERE kind = ? AND status IN ({placeholders}) ORDER BY created DESC LIMIT ? OFFSET ?",
+            [kind] + statuses + [limit, offset]
+        ).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def count_jobs(self, statuses: Iterable[str], kind: str = KIND_BATCH) -> int:
+        """统计指定类型和状态的作业数"""
+        statuses = list(statuses)
+        placeholders = ', '.join('?' for _ in statuses)
+        row = self._connect().execute(
+            f"SELECT COUNT(*) FROM jobs WHERE kind = ? AND status IN ({placeholders})", [kind] + statuses
+        ).fetchone()
+        return row[0]
+
+    def count_active(self, kind: Optional[str] = None, client: Optional[str] = None) -> int:
+        """
+        统计进行中（排队或处理中）的作业数
+
+        Args:
+            kind: 只统计指定类型的作业（可选）
+            client: 只统计指定客户端提交的作业（可选）
+        """
+        sql = f"SELECT COUNT(*) FROM jobs WHERE status IN ({', '.join('?' for _ in ACTIVE_STATUSES)})"
+        params: List[Any] = list(ACTIVE_STATUSES)
+        if kind is not None:
+            sql += " AND kind = ?"
+            params.append(kind)
+        if client is not None:
+            sql += " AND client = ?"
+            params.append(client)
+        return self._connect().execute(sql, params).fetchone()[0]
+
+    def queue_depth(self, kind: Optional[str] = None) -> int:
+        """
+        进行中作业尚未处理完的文件对总数，所有服务进程共享
+
+        Args:
+            kind: 只统计指定类型的作业（可选）
+        """
+        sql = (
+            f"SELECT COALESCE(SUM(MAX(total - processed, 0)), 0) FROM jobs "
+            f"WHERE status IN ({', '.join('?' for _ in ACTIVE_STATUSES)})"
+        )
+        params: List[Any] = list(ACTIVE_STATUSES)
+        if kind is not None:
+            sql += " AND kind = ?"
+            params.append(kind)
+        return self._connect().execute(sql, params).fetchone()[0]
+
+    def append_log(self, job_id: str, message: str, level: str = 'info') -> int:
+        """
+        追加一条作业日志，超出 log_limit 的最早日志被删除
+
+        Returns:
+            int: 日志序号（从1开始递增）
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET log_seq = log_seq + 1, updated = ? WHERE id = ?", (now, job_id))
+            row = conn.execute("SELECT log_seq FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return 0
+            seq = row[0]
+            conn.execute(
+                "INSERT INTO job_logs (job_id, seq, time, level, message) VALUES (?, ?, ?, ?, ?)",
+                (job_id, seq, now, level, message)
+            )
+            conn.execute("DELETE FROM job_logs WHERE job_id = ? AND seq <= ?", (job_id, seq - self.log_limit))
+        return seq
+
+    def get_logs(self, job_id: str, since: int = 0) -> List[Dict[str, Any]]:
+        """
+        获取作业日志
+
+        Args:
+            job_id: 作业ID
+            since: 只返回序号大于 since 的日志
+
+        Returns:
+            List[Dict[str, Any]]: 按序号排列的日志，包含 seq、time、level、message
+        """
+        rows = self._connect().execute(
+            "SELECT seq, time, level, message FROM job_logs WHERE job_id = ? AND seq > ? ORDER BY seq",
+            (job_id, since)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def add_file(self, job_id: str, path: str) -> None:
+        """记录作业生成的结果文件"""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO job_files (job_id, seq, path) "
+                "SELECT ?, COALESCE(MAX(seq), 0) + 1, ? FROM job_files WHERE job_id = ?",
+                (job_id, path, job_id)
+            )
+
+    def get_files(self, job_id: str) -> List[str]:
+        """按生成顺序获取作业的结果文件"""
+        rows = self._connect().execute(
+            "SELECT path FROM job_files WHERE job_id = ? ORDER BY seq", (job_id,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def register_dir(self, job_id: str, area: str, path: str, size: int = 0) -> None:
+        """
+        登记作业使用的目录，供清理任务按索引查找而无需遍历目录树
+
+        Args:
+            job_id: 作业ID
+            area: 目录所属的存储区域（如 uploads、outputs、temp），按区域统计容量
+            path: 目录路径
+            size: 目录占用的字节数，目录内容写完后可用 set_dir_size() 更新
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO job_dirs (path, job_id, area, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                (path, job_id, area, size, now, now)
+            )
+            conn.execute("UPDATE job_dirs SET size = ?, accessed = ? WHERE path = ?", (size, now, path))
+
+    def set_dir_size(self, path: str, size: int) -> None:
+        """更新已登记目录占用的字节数"""
+        with self._connect() as conn:
+            conn.execute("UPDATE job_dirs SET size = ? WHERE path = ?", (size, path))
+
+    def touch_dirs(self, job_id: str) -> None:
+        """记录作业目录的最近访问时间（如下载报告时），容量超限时最久未访问的目录先被清理"""
+        with self._connect() as conn:
+            conn.execute("UPDATE job_dirs SET accessed = ? WHERE job_id = ?", (time.time(), job_id))
+
+    def remove_dir(self, path: str) -> None:
+        """删除目录的登记记录"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM job_dirs WHERE path = ?", (path,))
+
+    def get_dirs(self, job_id: str) -> List[Dict[str, Any]]:
+        """获取作业登记的目录"""
+        rows = self._connect().execute("SELECT * FROM job_dirs WHERE job_id = ?", (job_id,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def dir_usage(self, area: str) -> int:
+        """区域内已登记目录占用的总字节数"""
+        row = self._connect().execute("SELECT COALESCE(SUM(size), 0) FROM job_dirs WHERE area = ?", (area,)).fetchone()
+        return row[0]
+
+    def evictable_dirs(self, area: str, accessed_before: Optional[float] = None,
+                       limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        按最近访问时间从早到晚列出可以清理的目录，进行中作业的目录除外
+
+        Args:
+            area: 存储区域
+            accessed_before: 只列出在此时间之前最后访问的目录（可选）
+            limit: 最多返回的条数
+
+        Returns:
+            List[Dict[str, Any]]: 目录记录，包含 path、job_id、area、size、created、accessed
+        """
+        placeholders = ', '.join('?' for _ in ACTIVE_STATUSES)
+        sql = (
+            f"SELECT d.* FROM job_dirs d LEFT JOIN jobs j ON j.id = d.job_id "
+            f"WHERE d.area = ? AND (j.status IS NULL OR j.status NOT IN ({placeholders}))"
+        )
+        params: List[Any] = [area] + list(ACTIVE_STATUSES)
+        if accessed_before is not None:
+            sql += " AND d.accessed < ?"
+            params.append(accessed_before)
+        sql += " ORDER BY d.accessed LIMIT ?"
+        params.append(limit)
+        return [dict(row) for row in self._connect().execute(sql, params).fetchall()]
+
+    def increment_metrics(self, samples: Iterable[Tuple[str, str, float]]) -> None:
+        """
+        累加计数器和直方图（见 metrics 模块），所有服务进程共享同一份累计值
+
+        Args:
+            samples: (指标名, 标签, 增量)列表
+        """
+        totals: Dict[Tuple[str, str], float] = {}
+        for name, labels, amount in samples:
+            totals[(name, labels)] = totals.get((name, labels), 0.0) + amount
+        if not totals:
+            return
+        with self._connect() as conn:
+            conn.executemany("INSERT OR IGNORE INTO metrics (name, labels, value) VALUES (?, ?, 0)", list(totals))
+            conn.executemany(
+                "UPDATE metrics SET value = value + ? WHERE name = ? AND labels = ?",
+                [(amount, name, labels) for (name, labels), amount in totals.items()]
+            )
+
+    def get_metrics(self) -> List[Tuple[str, str, float]]:
+        """获取所有指标的累计值，返回(指标名, 标签, 值)列表"""
+        rows = self._connect().execute("SELECT name, labels, value FROM metrics").fetchall()
+        return [tuple(row) for row in rows]
+
+    def expire_stale(self, max_idle_seconds: float) -> int:
+        """
+        将所属服务进程已退出的进行中作业标记为失败（进程退出时其排队和处理中的文件对随之丢失）
+
+        所属进程仍在运行的作业无论多久没有更新都不处理（大文件对或排在其他作业之后的作业）。
+        旧版本创建的作业没有记录所属进程，超过 max_idle_seconds 没有更新时标记为失败。
+
+        Args:
+            max_idle_seconds: 没有记录所属进程的作业的最长空闲时间（秒）
+
+        Returns:
+            int: 标记的作业数
+        """
+        now = time.time()
+        placeholders = ', '.join('?' for _ in ACTIVE_STATUSES)
+        rows = self._connect().execute(
+            f"SELECT id, owner, updated FROM jobs WHERE status IN ({placeholders})", list(ACTIVE_STATUSES)
+        ).fetchall()
+        stale = [
+            row['id'] for row in rows
+            if (not _process_alive(row['owner']) if row['owner'] else row['updated'] < now - max_idle_seconds)
+        ]
+        if not stale:
+            return 0
+
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"UPDATE jobs SET status = 'failed', end_time = ?, updated = ?, message = ? "
+                f"WHERE id IN ({', '.join('?' for _ in stale)}) AND status IN ({placeholders})",
+                [now, now, '处理作业的服务进程已退出，作业已中断'] + stale + list(ACTIVE_STATUSES)
+            )
+        if cursor.rowcount:
+            logger.warning(f"已将 {cursor.rowcount} 个中断的作业标记为失败")
+        return cursor.rowcount
+
+    def purge_finished(self, max_age_seconds: float) -> List[Dict[str, Any]]:
+        """
+        删除结束时间超过保留期限的作业及其日志和结果文件记录
+
+        Returns:
+            List[Dict[str, Any]]: 被删除的作业，调用方可据此清理输出文件
+        """
+        cutoff = time.time() - max_age_seconds
+        placeholders = ', '.join('?' for _ in FINISHED_STATUSES)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM jobs WHERE status IN ({placeholders}) AND updated < ?",
+                list(FINISHED_STATUSES) + [cutoff]
+            ).fetchall()
+            for row in rows:
+                conn.execute("DELETE FROM job_logs WHERE job_id = ?", (row['id'],))
+                conn.execute("DELETE FROM job_files WHERE job_id = ?", (row['id'],))
+                conn.execute("DELETE FROM jobs WHERE id = ?", (row['id'],))
+        if rows:
+            logger.info(f"已删除 {len(rows)} 个过期的作业记录")
+        return [self._row_to_job(row) for row in rows]
+
+    @staticmethod
+    def _encode(fields: Dict[str, Any]) -> Dict[str, Any]:
+        """将 result 序列化为JSON文本"""
+        if fields.get('result') is not None:
+            fields = dict(fields, result=json.dumps(fields['result'], ensure_ascii=False))
+        return fields
+
+    @staticmethod
+    def _check_fields(fields: Dict[str, Any]) -> None:
+        """字段名会拼接到SQL中，只允许已知字段"""
+        unknown = [name for name in fields if name not in _JOB_FIELDS]
+        if unknown:
+            raise ValueError(f"未知的作业字段: {', '.join(unknown)}")
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 后台导出线程，JSON导出不阻塞报告生成
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='json-export')
+
+
+def export_json(data: Any, output_path: str) -> str:
+    """
+    将解析结果导出为JSON文件
+
+    Args:
+        data: 要导出的数据
+        output_path: 输出JSON文件路径
+
+    Returns:
+        str: 输出JSON文件路径
+    """
+    # 确保输出目录存在
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+    logger.info(f"JSON数据已导出: {output_path}")
+    return output_path
+
+
+def _log_export_error(future: Future) -> None:
+    """记录后台导出失败的原因"""
+    error = future.exception()
+    if error is not None:
+        logger.error(f"导出JSON文件时出错: {error}")
+
+
+def export_json_async(data: Any, output_path: str) -> Future:
+    """
+    在后台线程中导出JSON文件
+
+    调用方在导出完成前不得再修改 data。
+
+    Args:
+        data: 要导出的数据
+        output_path: 输出JSON文件路径
+
+    Returns:
+        Future: 导出任务，结果为输出JSON文件路径
+    """
+    future = _executor.submit(export_json, data, output_path)
+    future.add_done_callback(_log_export_error)
+    return future
@@ -16,7 +16,7 @@ sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
 
 # 导入自定义模块
 from excel_parser import parse_excel_file, save_excel_data_to_json
-from dwg_parser import parse_dwg_file, save_dwg_data_to_json
+from dwg_parser import parse_dwg_file, save_dwg_data_to_json, save_dwg_raw_data, RAW_DATA_SUFFIX
 
 # 确保日志目录存在
 logs_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'logs')
@@ -53,7 +53,7 @@ def load_appearance_map(file_path: str = 'maps/appearance_map.json') -> Dict[str
         logger.error(traceback.format_exc())
         return {}
 
-def process_files(dwg_file: str, excel_file: str, output_dir: str = 'outputs') -> Dict[str, str]:
+def process_files(dwg_file: str, excel_file: str, output_dir: str = 'outputs', save_raw: bool = False) -> Dict[str, str]:
     """
     处理DWG和Excel文件，生成JSON输出
     
@@ -61,6 +61,7 @@ def process_files(dwg_file: str, excel_file: str, output_dir: str = 'outputs') -
         dwg_file: DWG文件路径
         excel_file: Excel文件路径
         output_dir: 输出目录
+        save_raw: 是否保存压缩的原始DWG数据
         
     Returns:
         Dict[str, str]: 包含输出文件路径的字典
@@ -83,12 +84,10 @@ def process_files(dwg_file: str, excel_file: str, output_dir: str = 'outputs') -
         dwg_data, dwg_raw_data = parse_dwg_file(dwg_file)
         save_dwg_data_to_json(dwg_data, output_files["dwg_data"])
         
-        # 保存原始DWG数据
-        if dwg_raw_data:
-            raw_data_path = os.path.join(output_dir, f"{base_name}_dwg_raw_data.json")
-            with open(raw_data_path, 'w', encoding='utf-8') as f:
-                json.dump(dwg_raw_data, f, ensure_ascii=False, indent=2)
-                logger.info(f"原始DWG数据已保存至: {raw_data_path}")
+        # 按需保存压缩的原始DWG数据
+        if save_raw and dwg_raw_data:
+            raw_data_path = os.path.join(output_dir, f"{base_name}{RAW_DATA_SUFFIX}")
+            output_files["dwg_raw_data"] = save_dwg_raw_data(dwg_raw_data, raw_data_path)
     except Exception as e:
         logger.error(f"解析DWG文件时出错: {e}")
         logger.error(traceback.format_exc())
@@ -139,6 +138,7 @@ def main():
     parser.add_argument('--dwg', required=True, help='输入DWG文件路径')
     parser.add_argument('--excel', required=True, help='输入Excel文件路径')
     parser.add_argument('--output', default='outputs', help='输出目录路径')
+    parser.add_argument('--save-raw', action='store_true', help='保存压缩的原始DWG数据(.jsonl.gz)')
     
     args = parser.parse_args()
     
@@ -152,7 +152,7 @@ def main():
         return 1
     
     try:
-        output_files = process_files(args.dwg, args.excel, args.output)
+        output_files = process_files(args.dwg, args.excel, args.output, save_raw=args.save_raw)
         logger.info("处理完成！输出文件:")
         for file_type, file_path in output_files.items():
             logger.info(f"- {file_type}: {file_path}")
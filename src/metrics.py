@@ -0,0 +1,461 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+处理耗时的度量
+
+工作进程中，pipeline 的每个阶段、报告的填写和保存以及每次外部命令调用（dwgread、dwg2dxf）
+记录为一个计时段，随文件对的结果记录（spans 字段）返回。Web进程收到结果后将其换算为直方图和计数器的增量，
+累加到作业数据库中（多个服务进程共享，重启后保留），由 /metrics 以Prometheus文本格式输出：
+
+    cadtoexcel_stage_duration_seconds{stage}            各阶段耗时
+    cadtoexcel_subprocess_duration_seconds{command}     外部命令耗时
+    cadtoexcel_subprocess_runs_total{command,outcome}   外部命令调用次数（outcome 为 ok 或 failed）
+    cadtoexcel_pair_duration_seconds{kind}              文件对处理总耗时
+    cadtoexcel_pairs_total{kind,status}                 处理的文件对数（status 为 success、cached 或 error）
+
+计时段只在 recording() 范围内（及 pipeline 为各阶段开启的线程中）收集，未开启时 span() 几乎没有开销。
+每个计时段同时记录开始时间、进程和线程，开启跟踪时（recording(trace=True)）还记录细分步骤和工作簿读写，
+可导出为Chrome trace-event JSON（见 tracing 模块）。
+
+开启内存分析时（recording(memory=True)），pipeline 的各阶段依次执行，每个阶段记录 tracemalloc 峰值
+（阶段内相对开始时增加的Python内存峰值）和进程RSS的变化，用于估计每台主机可以同时运行的工作进程数。
+"""
+
+import os
+import re
+import time
+import logging
+import threading
+import subprocess
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 计时段类别
+CATEGORY_STAGE = 'stage'
+CATEGORY_SUBPROCESS = 'subprocess'
+CATEGORY_DETAIL = 'detail'
+CATEGORY_WORKBOOK = 'workbook'
+
+# 只在开启跟踪时记录的类别，不计入指标
+TRACE_CATEGORIES = (CATEGORY_DETAIL, CATEGORY_WORKBOOK)
+
+# 直方图的默认分桶上限（秒）
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# (指标名, 标签, 增量)，标签为Prometheus格式的字符串，如 stage="report",le="0.5"
+Sample = Tuple[str, str, float]
+
+_local = threading.local()
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def rss_bytes() -> Optional[int]:
+    """当前进程的常驻内存（字节），优先使用psutil，否则读取 /proc/self/statm，都不可用时返回None"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class Recorder:
+    """收集一次处理过程中的计时段，可被多个阶段线程同时写入"""
+
+    def __init__(self, trace: bool = False, memory: bool = False):
+        """
+        Args:
+            trace: 是否同时记录只用于跟踪的细分步骤和工作簿读写
+            memory: 是否记录各阶段的内存峰值和RSS变化（需要已开启 tracemalloc）
+        """
+        self.trace = trace
+        self.memory = memory
+        self.spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def wants(self, category: str) -> bool:
+        """是否记录该类别的计时段"""
+        return self.trace or category not in TRACE_CATEGORIES
+
+    def add(self, name: str, category: str, seconds: float, ok: bool = True, start: Optional[float] = None,
+            args: Optional[Dict[str, Any]] = None, memory: Optional[Dict[str, Optional[int]]] = None) -> None:
+        """
+        记录一个计时段
+
+        Args:
+            name: 名称
+            category: 类别
+            seconds: 耗时（秒）
+            ok: 是否成功
+            start: 开始时间（time.time()），默认按结束于当前时刻推算
+            args: 附加信息（如文件名），写入跟踪文件
+            memory: 内存峰值 peak 和RSS变化 rss_delta（字节）
+        """
+        if not self.wants(category):
+            return
+        thread = threading.current_thread()
+        item = {
+            'name': name,
+            'category': category,
+            'seconds': seconds,
+            'ok': ok,
+            'start': start if start is not None else time.time() - seconds,
+            'pid': os.getpid(),
+            'tid': thread.ident,
+            'thread': thread.name
+        }
+        if args:
+            item['args'] = args
+        if memory is not None:
+            item['memory'] = memory
+        with self._lock:
+            self.spans.append(item)
+
+
+def current() -> Optional[Recorder]:
+    """当前线程正在使用的收集器，未开启收集时返回None"""
+    return getattr(_local, 'recorder', None)
+
+
+@contextmanager
+def bind(recorder: Optional[Recorder]) -> Iterator[Optional[Recorder]]:
+    """在当前线程中使用指定的收集器（用于将收集器传递到阶段线程），为None时不收集"""
+    previous = current()
+    _local.recorder = recorder
+    try:
+        yield recorder
+    finally:
+        _local.recorder = previous
+
+
+@contextmanager
+def recording(trace: bool = False, memory: bool = False) -> Iterator[Recorder]:
+    """
+    在当前线程中开启计时段收集，返回新的收集器
+
+    Args:
+        trace: 是否同时记录细分步骤和工作簿读写
+        memory: 是否记录各阶段的内存，tracemalloc 未开启时在此范围内开启
+    """
+    started = memory and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        with bind(Recorder(trace, memory)) as recorder:
+            yield recorder
+    finally:
+        if started:
+            tracemalloc.stop()
+
+
+def _reset_peak() -> int:
+    """
+    重置 tracemalloc 的峰值
+
+    Returns:
+        int: 计算峰值增量的基准（重置时已跟踪的内存）
+    """
+    if hasattr(tracemalloc, 'reset_peak'):
+        traced = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        return traced
+    # Python 3.9 之前没有 reset_peak：清除已有的跟踪记录，当前值和峰值一起归零，此后的峰值即为增量
+    tracemalloc.clear_traces()
+    return 0
+
+
+@contextmanager
+def span(name: str, category: str = CATEGORY_STAGE, measure_memory: bool = False, **args) -> Iterator[None]:
+    """
+    记录代码块的耗时，代码块抛出异常时记录为失败
+
+    Args:
+        name: 计时段名称（阶段名或命令名）
+        category: 计时段类别
+        measure_memory: 收集器开启内存分析时是否记录内存；tracemalloc 的峰值是进程全局的，
+            只应用于不嵌套、不并发的代码块（如依次执行的 pipeline 阶段）
+        **args: 附加信息，写入跟踪文件
+    """
+    recorder = current()
+    if recorder is None or not recorder.wants(category):
+        yield
+        return
+    measure_memory = measure_memory and recorder.memory and tracemalloc.is_tracing()
+    if measure_memory:
+        traced_before = _reset_peak()
+        rss_before = rss_bytes()
+    wall_start = time.time()
+    start = time.perf_counter()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        seconds = time.perf_counter() - start
+        memory = None
+        if measure_memory:
+            rss_after = rss_bytes()
+            memory = {
+                'peak': max(0, tracemalloc.get_traced_memory()[1] - traced_before),
+                'rss_delta': rss_after - rss_before if rss_before is not None and rss_after is not None else None
+            }
+        recorder.add(name, category, seconds, ok, start=wall_start, args=args, memory=memory)
+
+
+def add_span(name: str, seconds: float, category: str = CATEGORY_STAGE, ok: bool = True) -> None:
+    """记录一个已经结束的计时段（代码块不便用 span() 包裹时使用），未开启收集时忽略"""
+    recorder = current()
+    if recorder is not None:
+        recorder.add(name, category, seconds, ok)
+
+
+def run_command(name: str, cmd: Sequence[str], **kwargs) -> subprocess.CompletedProcess:
+    """
+    执行外部命令并记录耗时，返回码不为0或命令无法启动时记录为失败
+
+    Args:
+        name: 命令名（指标中的 command 标签）
+        cmd: 命令及参数
+        **kwargs: 传给 subprocess.run 的参数
+
+    Returns:
+        subprocess.CompletedProcess: 命令执行结果
+    """
+    recorder = current()
+    wall_start = time.time()
+    start = time.perf_counter()
+    returncode = None
+    try:
+        result = subprocess.run(cmd, **kwargs)
+        returncode = result.returncode
+        return result
+    finally:
+        if recorder is not None:
+            recorder.add(name, CATEGORY_SUBPROCESS, time.perf_counter() - start, returncode == 0, start=wall_start,
+                         args={'cmd': ' '.join(str(part) for part in cmd), 'returncode': returncode})
+
+
+def memory_summary(spans: Iterable[Dict[str, Any]], threshold: int = 0) -> Dict[str, Any]:
+    """
+    汇总一个文件对各阶段的内存
+
+    Args:
+        spans: 文件对的计时段
+        threshold: 内存阈值（字节），阶段峰值或RSS增长超过该值时标记 over_threshold，0表示不标记
+
+    Returns:
+        Dict[str, Any]: 各阶段的 peak 和 rss_delta（stages）、最大阶段峰值 peak、RSS总增长 rss_delta 以及 over_threshold
+    """
+    stages = {item['name']: item['memory'] for item in spans if item.get('memory')}
+    peak = max((memory['peak'] for memory in stages.values()), default=0)
+    rss_delta = sum(memory['rss_delta'] or 0 for memory in stages.values())
+    return {
+        'stages': stages,
+        'peak': peak,
+        'rss_delta': rss_delta,
+        'over_threshold': bool(threshold) and max(peak, rss_delta) > threshold
+    }
+
+
+def summarize(spans: Iterable[Dict[str, Any]]) -> Dict[str, float]:
+    """按名称汇总阶段和外部命令的耗时（秒），同名计时段（如多次调用的命令）相加"""
+    totals: Dict[str, float] = {}
+    for item in spans:
+        if item['category'] in TRACE_CATEGORIES:
+            continue
+        totals[item['name']] = totals.get(item['name'], 0.0) + item['seconds']
+    return totals
+
+
+def merge_timings(timings: Optional[Dict[str, Dict[str, float]]],
+                  spans: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """
+    将一个文件对的计时段合并到作业的耗时统计中
+
+    Args:
+        timings: 作业已有的统计，名称 -> {count, total, max}
+        spans: 文件对的计时段
+
+    Returns:
+        Dict[str, Dict[str, float]]: 合并后的统计
+    """
+    timings = dict(timings or {})
+    for name, seconds in summarize(spans).items():
+        entry = dict(timings.get(name) or {'count': 0, 'total': 0.0, 'max': 0.0})
+        entry['count'] += 1
+        entry['total'] += seconds
+        entry['max'] = max(entry['max'], seconds)
+        timings[name] = entry
+    return timings
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames: Sequence[str], labels: Dict[str, Any]) -> str:
+    return ','.join(f'{name}="{_escape(labels.get(name, ""))}"' for name in labelnames)
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """计数器"""
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def samples(self, amount: float = 1, **labels) -> List[Sample]:
+        """增加 amount 对应的增量"""
+        return [(self.name, _format_labels(self.labelnames, labels), amount)]
+
+    def sample_names(self) -> Tuple[str, ...]:
+        return (self.name,)
+
+
+class Histogram:
+    """直方图，分桶计数为累计值（le 为上限）"""
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def samples(self, value: float, **labels) -> List[Sample]:
+        """记录一次观测值对应的增量"""
+        base = _format_labels(self.labelnames, labels)
+        prefix = f"{base}," if base else ''
+        # 所有分桶都输出（未命中的增量为0），保证每个分桶的序列都存在
+        result = [
+            (f"{self.name}_bucket", f'{prefix}le="{_format_value(bound)}"', 1 if value <= bound else 0)
+            for bound in self.buckets
+        ]
+        result.append((f"{self.name}_sum", base, value))
+        result.append((f"{self.name}_count", base, 1))
+        return result
+
+    def sample_names(self) -> Tuple[str, ...]:
+        return (f"{self.name}_bucket", f"{self.name}_sum", f"{self.name}_count")
+
+
+class Gauge:
+    """瞬时值，输出时计算，不累加"""
+    type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def samples(self, value: float, **labels) -> List[Sample]:
+        return [(self.name, _format_labels(self.labelnames, labels), value)]
+
+    def sample_names(self) -> Tuple[str, ...]:
+        return (self.name,)
+
+
+STAGE_SECONDS = Histogram('cadtoexcel_stage_duration_seconds', '处理阶段耗时（秒）', ('stage',))
+SUBPROCESS_SECONDS = Histogram('cadtoexcel_subprocess_duration_seconds', '外部命令耗时（秒）', ('command',))
+SUBPROCESS_RUNS = Counter('cadtoexcel_subprocess_runs_total', '外部命令调用次数', ('command', 'outcome'))
+PAIR_SECONDS = Histogram('cadtoexcel_pair_duration_seconds', '文件对处理总耗时（秒）', ('kind',))
+PAIRS = Counter('cadtoexcel_pairs_total', '处理的文件对数', ('kind', 'status'))
+STAGE_PEAK_MEMORY = Histogram(
+    'cadtoexcel_stage_peak_memory_bytes', '开启内存分析时各阶段的tracemalloc峰值（字节）', ('stage',),
+    buckets=tuple(2 ** power * 1024 * 1024 for power in range(0, 13))
+)
+QUEUED_PAIRS = Gauge('cadtoexcel_queued_pairs', '进行中作业尚未处理完的文件对数')
+ACTIVE_JOBS = Gauge('cadtoexcel_active_jobs', '进行中的作业数', ('kind',))
+
+METRICS = (
+    STAGE_SECONDS, SUBPROCESS_SECONDS, SUBPROCESS_RUNS, PAIR_SECONDS, PAIRS, STAGE_PEAK_MEMORY, QUEUED_PAIRS, ACTIVE_JOBS
+)
+
+
+def record_samples(record: Optional[Dict[str, Any]], kind: str) -> List[Sample]:
+    """
+    将文件对的结果记录换算为指标增量
+
+    Args:
+        record: process_pair 返回的结果记录，工作进程异常退出时为None
+        kind: 作业类型（batch 或 single）
+
+    Returns:
+        List[Sample]: 指标增量
+    """
+    if record is None:
+        return PAIRS.samples(kind=kind, status='error')
+
+    samples: List[Sample] = []
+    for item in record.get('spans') or ():
+        if item['category'] == CATEGORY_SUBPROCESS:
+            samples += SUBPROCESS_SECONDS.samples(item['seconds'], command=item['name'])
+            samples += SUBPROCESS_RUNS.samples(command=item['name'], outcome='ok' if item['ok'] else 'failed')
+        elif item['category'] == CATEGORY_STAGE:
+            samples += STAGE_SECONDS.samples(item['seconds'], stage=item['name'])
+            if item.get('memory'):
+                samples += STAGE_PEAK_MEMORY.samples(item['memory']['peak'], stage=item['name'])
+
+    if record['status'] == 'success':
+        status = 'cached' if record.get('cached') else 'success'
+    else:
+        status = record['status']
+    samples += PAIRS.samples(kind=kind, status=status)
+    samples += PAIR_SECONDS.samples(record.get('duration', 0.0), kind=kind)
+    return samples
+
+
+_LE_RE = re.compile(r'(?:^|,)le="([^"]*)"$')
+
+
+def _sort_key(sample: Sample) -> Tuple[str, str, float]:
+    name, labels, _ = sample
+    match = _LE_RE.search(labels)
+    if not match:
+        return name, labels, 0.0
+    bound = match.group(1)
+    return name, labels[:match.start()], float('inf') if bound == '+Inf' else float(bound)
+
+
+def render(samples: Iterable[Sample]) -> str:
+    """
+    以Prometheus文本格式（0.0.4）输出指标
+
+    Args:
+        samples: 累计值（作业数据库中的直方图和计数器）以及输出时计算的瞬时值
+
+    Returns:
+        str: 指标文本
+    """
+    by_name: Dict[str, List[Sample]] = {}
+    for sample in samples:
+        by_name.setdefault(sample[0], []).append(sample)
+
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for name in metric.sample_names():
+            for sample_name, labels, value in sorted(by_name.get(name, ()), key=_sort_key):
+                lines.append(f"{sample_name}{{{labels}}} {_format_value(value)}" if labels
+                             else f"{sample_name} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
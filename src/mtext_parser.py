@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, List, Optional, Tuple
+
+# 词法单元类型
+TOKEN_TEXT = 'text'  # 普通文本
+TOKEN_SYMBOL = 'symbol'  # %%c / %%p / %%d 等特殊符号
+TOKEN_STACK = 'stack'  # \S上^下; 堆叠文本（公差）
+TOKEN_BREAK = 'break'  # \P 换行 / \~ 不间断空格
+
+# 特殊符号（%%x）
+SYMBOL_DIAMETER = 'φ'
+SYMBOL_PLUS_MINUS = '±'
+SYMBOL_DEGREE = '°'
+_PERCENT_SYMBOLS = {
+    'c': SYMBOL_DIAMETER,
+    'p': SYMBOL_PLUS_MINUS,
+    'd': SYMBOL_DEGREE,
+}
+
+# 带参数（以分号结束）的格式控制码，如 \A1; \H0.7x; \fSimSun|b0;
+_CODES_WITH_ARGS = set('ACcFfHQTWp')
+# 无参数的格式控制码，如 \L \O \K
+_CODES_WITHOUT_ARGS = set('LlOoKkX')
+
+# 未标注公差时使用的默认公差
+DEFAULT_TOLERANCE = '0.2'
+
+# 缓存的不同文本数量上限，标题栏文本在每张图纸中重复出现
+CACHE_SIZE = 4096
+
+
+@dataclass(frozen=True)
+class MTextDimension:
+    """MTEXT文本解析结果，数值均保留原始字符串以免丢失精度"""
+    text: str  # 去除格式控制后的纯文本
+    nominal: Optional[str] = None  # 名义尺寸
+    is_diameter: bool = False  # 是否为直径标注
+    upper_tolerance: Optional[str] = None  # 上偏差（名义尺寸 + 上偏差 = 上限）
+    lower_tolerance: Optional[str] = None  # 下偏差（名义尺寸 - 下偏差 = 下限）
+    display: str = ''  # 用于检验报告的显示文本
+
+
+def tokenize_mtext(text: str) -> List[Tuple[str, Any]]:
+    """
+    单次扫描将MTEXT原始文本切分为词法单元
+
+    Args:
+        text: 原始CAD文本，如 \\A1;96-%%c4.6{\\H0.7x;\\S+0.1^ 0;}
+
+    Returns:
+        List[Tuple[str, Any]]: (类型, 值) 列表，花括号分组和格式控制码不产生词法单元
+    """
+    tokens = []
+    buffer = []
+    i = 0
+    n = len(text)
+
+    def flush():
+        if buffer:
+            tokens.append((TOKEN_TEXT, ''.join(buffer)))
+            buffer.clear()
+
+    while i < n:
+        ch = text[i]
+
+        if ch == '\\' and i + 1 < n:
+            code = text[i + 1]
+            if code in '\\{}':
+                # 转义字符
+                buffer.append(code)
+                i += 2
+            elif code == 'P' or code == 'N' or code == '~':
+                flush()
+                tokens.append((TOKEN_BREAK, ' '))
+                i += 2
+            elif code == 'S':
+                end = text.find(';', i + 2)
+                if end < 0:
+                    end = n
+                flush()
+                tokens.append((TOKEN_STACK, _split_stack(text[i + 2:end])))
+                i = end + 1
+            elif code == 'U' and text.startswith('+', i + 2) and i + 7 <= n:
+                # Unicode转义，如 \U+2205
+                try:
+                    buffer.append(chr(int(text[i + 3:i + 7], 16)))
+                    i += 7
+                except ValueError:
+                    i += 2
+            elif code in _CODES_WITH_ARGS:
+                end = text.find(';', i + 2)
+                # 缺少结束分号时只丢弃控制码本身，保留后续文本
+                i = end + 1 if end >= 0 else i + 2
+            elif code in _CODES_WITHOUT_ARGS:
+                i += 2
+            else:
+                # 未知控制码，按普通字符处理
+                buffer.append(code)
+                i += 2
+        elif ch == '%' and text.startswith('%%', i) and i + 2 < n:
+            symbol = text[i + 2].lower()
+            if symbol in _PERCENT_SYMBOLS:
+                flush()
+                tokens.append((TOKEN_SYMBOL, _PERCENT_SYMBOLS[symbol]))
+            elif symbol == '%':
+                buffer.append('%')
+            else:
+                buffer.append(text[i:i + 3])
+            i += 3
+        elif ch == '{' or ch == '}':
+            # 花括号只限定格式作用域，嵌套分组的内容照常输出
+            i += 1
+        else:
+            buffer.append(ch)
+            i += 1
+
+    flush()
+    return tokens
+
+
+def _split_stack(content: str) -> Tuple[str, str, str]:
+    """
+    拆分堆叠文本，如 "+0.1^ 0" -> ("+0.1", "^", "0")
+
+    Args:
+        content: \\S 与 ; 之间的内容
+
+    Returns:
+        Tuple[str, str, str]: (上部, 分隔符, 下部)，无分隔符时分隔符和下部为空
+    """
+    for idx, ch in enumerate(content):
+        if ch in '^/#':
+            return content[:idx].strip(), ch, content[idx + 1:].strip()
+    return content.strip(), '', ''
+
+
+def _leading_number(text: str, start: int = 0) -> Tuple[Optional[str], int]:
+    """
+    读取从start开始的数字（整数或小数）
+
+    Returns:
+        Tuple[Optional[str], int]: (数字字符串, 数字结束位置)，没有数字时返回 (None, start)
+    """
+    n = len(text)
+    end = start
+    while end < n and text[end].isdecimal():
+        end += 1
+    if end == start:
+        return None, start
+    if end + 1 < n and text[end] == '.' and text[end + 1].isdecimal():
+        end += 1
+        while end < n and text[end].isdecimal():
+            end += 1
+    return text[start:end], end
+
+
+def _find_number(text: str) -> Tuple[Optional[str], int]:
+    """查找文本中的第一个数字，返回 (数字字符串, 数字结束位置)"""
+    for idx, ch in enumerate(text):
+        if ch.isdecimal():
+            return _leading_number(text, idx)
+    return None, -1
+
+
+def _trailing_number(text: str) -> Optional[str]:
+    """读取文本末尾的数字（忽略尾部空白），用于确定公差所属的名义尺寸"""
+    end = len(text.rstrip())
+    start = end
+    while start > 0 and (text[start - 1].isdecimal() or text[start - 1] == '.'):
+        start -= 1
+    number, _ = _leading_number(text[start:end].lstrip('.'))
+    return number
+
+
+def _normalize_upper(value: str) -> str:
+    """上偏差去掉正号"""
+    return value[1:] if value.startswith('+') else value
+
+
+def _normalize_lower(value: str) -> str:
+    """下偏差统一为"名义尺寸减去该值"的形式"""
+    if value.startswith('-'):
+        return value[1:]
+    if value.startswith('+'):
+        return '-' + value[1:]
+    return value
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_mtext(text: str) -> MTextDimension:
+    """
+    解析MTEXT原始文本，提取名义尺寸、直径标记和上下偏差
+
+    结果按原始文本缓存，相同文本只解析一次。
+
+    Args:
+        text: 原始CAD文本，如 \\A1;96-%%c4.6{\\H0.7x;\\S+0.1^ 0;}
+
+    Returns:
+        MTextDimension: 解析结果，如 display 为 φ4.6±(0.1, 0)
+    """
+    if not text:
+        return MTextDimension(text='')
+
+    pieces = []
+    diameter = None
+    stack_nominal = None
+    stack_tolerance = None
+    symmetric_tolerance = None
+    # 状态：上一个词法单元为 φ 或 ± 时，等待紧随其后的数字
+    expecting = None
+
+    for kind, value in tokenize_mtext(text):
+        if kind == TOKEN_TEXT:
+            if expecting is not None:
+                number, _ = _leading_number(value.lstrip())
+                if number is not None:
+                    if expecting == SYMBOL_DIAMETER and diameter is None:
+                        diameter = number
+                    elif expecting == SYMBOL_PLUS_MINUS and symmetric_tolerance is None:
+                        symmetric_tolerance = number
+                expecting = None
+            pieces.append(value)
+        elif kind == TOKEN_SYMBOL:
+            expecting = value
+            pieces.append(value)
+        elif kind == TOKEN_STACK:
+            expecting = None
+            upper, separator, lower = value
+            if separator == '^' and upper and lower:
+                upper, lower = _normalize_upper(upper), _normalize_lower(lower)
+                if stack_tolerance is None:
+                    stack_nominal = _trailing_number(''.join(pieces))
+                    stack_tolerance = (upper, lower)
+                pieces.append(f"±({upper}, {lower})")
+            elif separator:
+                pieces.append(f"{upper}/{lower}")
+            else:
+                pieces.append(upper)
+        else:
+            expecting = None
+            pieces.append(value)
+
+    cleaned = ''.join(pieces)
+
+    if stack_tolerance is not None:
+        upper_tolerance, lower_tolerance = stack_tolerance
+    elif symmetric_tolerance is not None:
+        upper_tolerance = lower_tolerance = symmetric_tolerance
+    else:
+        upper_tolerance = lower_tolerance = None
+
+    # 直径标注：只保留直径及公差
+    if diameter is not None:
+        if stack_tolerance is not None:
+            display = f"φ{diameter}±({upper_tolerance}, {lower_tolerance})"
+        elif symmetric_tolerance is not None:
+            display = f"φ{diameter}±{symmetric_tolerance}"
+        else:
+            display = f"φ{diameter}±{DEFAULT_TOLERANCE}"
+        return MTextDimension(
+            text=cleaned,
+            nominal=diameter,
+            is_diameter=True,
+            upper_tolerance=upper_tolerance,
+            lower_tolerance=lower_tolerance,
+            display=display
+        )
+
+    # 普通尺寸：未标注公差时在第一个数字后添加默认公差
+    nominal, number_end = _find_number(cleaned)
+    if stack_tolerance is not None:
+        nominal = stack_nominal
+    if nominal is not None and SYMBOL_PLUS_MINUS not in cleaned:
+        display = f"{cleaned[:number_end]}±{DEFAULT_TOLERANCE}{cleaned[number_end:]}"
+    else:
+        display = cleaned
+
+    return MTextDimension(
+        text=cleaned,
+        nominal=nominal,
+        upper_tolerance=upper_tolerance,
+        lower_tolerance=lower_tolerance,
+        display=display
+    )
@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+DWG图纸与工艺流程卡Excel文件配对
+
+文件名中的图号和版本号被规范化为键（全角转半角、统一大小写、去掉分隔符、版本号去掉前导零），
+通过字典索引查找，配对耗时与文件数成线性关系。查找顺序：
+
+    1. 文件名（不含扩展名，不区分大小写）完全相同
+    2. 图号和版本号都相同
+    3. 图号相同，且至少一方没有版本号（双方版本号不同时不配对）
+
+第1、2级有多个候选时依次优先：未被其他DWG使用、文件名更短、文件名排序靠前，结果与输入顺序无关。
+第3级有多个候选时（如 1234.dwg 与 1234-1.xls、1234-2.xls）无法确定对应的版本，DWG不配对并记录警告。
+可选地读取工艺流程卡C5单元格中的图号进行确认：图号不一致的候选被排除，第3级的多个候选中
+C5版本号与DWG版本号相同的唯一候选被采用，文件名无法配对的DWG再按C5图号配对。
+"""
+
+import os
+import re
+import logging
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, List, Callable, Iterable, Optional, Tuple
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 工艺流程卡中图号所在单元格（第5行第3列）
+DRAWING_NO_CELL = 'C5'
+_DRAWING_NO_ROW = 5
+_DRAWING_NO_COL = 3
+
+# 图号：由 - _ . 连接的字母数字段
+_TOKEN_RE = re.compile(r'[A-Z0-9]+(?:[-_.][A-Z0-9]+)*')
+# 图号末尾的版本号：-03、-A、_REV03、.VER2、-V2
+_REVISION_SUFFIX_RE = re.compile(
+    r'^(?P<base>.*?[0-9].*?)'
+    r'(?:(?:[-_.]?(?:REV|VER)|[-_.]V)[-_.]?(?P<rev>[A-Z0-9]{1,3})|[-_.](?P<short>[0-9]{1,2}|[A-Z]))$'
+)
+# 图号之后单独书写的版本号：" REV 03"、"(03)"
+_TRAILING_REVISION_RE = re.compile(
+    r'^\s*(?:(?:REV|VER|V)[-_. ]*(?P<rev>[A-Z0-9]{1,3})|[(\[](?P<paren>[A-Z0-9]{1,3})[)\]])(?![A-Z0-9])'
+)
+_SEPARATORS_RE = re.compile(r'[-_.]')
+
+
+@dataclass(frozen=True)
+class DrawingKey:
+    """规范化的图号和版本号"""
+    base: str
+    revision: str = ''
+
+    @property
+    def full(self) -> str:
+        """图号和版本号组成的完整键"""
+        return f"{self.base}#{self.revision}"
+
+
+def parse_drawing_number(text: str) -> Optional[DrawingKey]:
+    """
+    从文件名或单元格文本中解析图号和版本号
+
+    取第一个包含数字的字母数字段作为图号，例如：
+        "81206851-03"          -> 81206851 / 3
+        "81206851_REV03工艺卡" -> 81206851 / 3
+        "QC 81206851 (A)"      -> 81206851 / A
+        "图号：20-1234-5678"   -> 2012345678 / 无
+
+    Args:
+        text: 文件名（不含扩展名）或单元格文本
+
+    Returns:
+        Optional[DrawingKey]: 规范化的键，文本中没有图号时返回None
+    """
+    if not text:
+        return None
+    text = unicodedata.normalize('NFKC', str(text)).upper()
+
+    for match in _TOKEN_RE.finditer(text):
+        token = match.group(0)
+        if not any(char.isdigit() for char in token):
+            continue
+
+        revision_match = _REVISION_SUFFIX_RE.match(token)
+        if revision_match:
+            base = revision_match.group('base')
+            revision = revision_match.group('rev') or revision_match.group('short')
+        else:
+            base = token
+            revision = ''
+            trailing = _TRAILING_REVISION_RE.match(text[match.end():])
+            if trailing:
+                revision = trailing.group('rev') or trailing.group('paren')
+
+        if revision:
+            revision = revision.lstrip('0') or '0'
+        return DrawingKey(_SEPARATORS_RE.sub('', base), revision)
+    return None
+
+
+def read_drawing_number(excel_file: str) -> str:
+    """
+    只读取工艺流程卡C5单元格中的图号，不加载整个工作簿
+
+    .xlsx 以只读流式方式读取前5行，.xls 按需加载第一个工作表
+
+    Args:
+        excel_file: Excel文件路径
+
+    Returns:
+        str: 图号文本，读取失败时返回空字符串
+    """
+    try:
+        if excel_file.lower().endswith('.xlsx'):
+            from openpyxl import load_workbook
+            wb = load_workbook(excel_file, read_only=True, data_only=True)
+            try:
+                ws = wb.worksheets[0]
+                for row in ws.iter_rows(min_row=_DRAWING_NO_ROW, max_row=_DRAWING_NO_ROW,
+                                        min_col=_DRAWING_NO_COL, max_col=_DRAWING_NO_COL, values_only=True):
+                    return str(row[0]).strip() if row and row[0] is not None else ''
+            finally:
+                wb.close()
+        else:
+            import xlrd
+            wb = xlrd.open_workbook(excel_file, on_demand=True)
+            try:
+                ws = wb.sheet_by_index(0)
+                if ws.nrows >= _DRAWING_NO_ROW and ws.ncols >= _DRAWING_NO_COL:
+                    return str(ws.cell_value(_DRAWING_NO_ROW - 1, _DRAWING_NO_COL - 1)).strip()
+            finally:
+                wb.release_resources()
+    except Exception as e:
+        logger.warning(f"读取 {os.path.basename(excel_file)} 的{DRAWING_NO_CELL}单元格图号失败: {e}")
+    return ''
+
+
+def _stem(path: str) -> str:
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _build_index(paths: Iterable[str], key_func: Callable[[str], Optional[str]]) -> Dict[str, List[str]]:
+    """按键建立索引，键为None的文件不加入"""
+    index: Dict[str, List[str]] = {}
+    for path in paths:
+        key = key_func(path)
+        if key is not None:
+            index.setdefault(key, []).append(path)
+    return index
+
+
+def pair_files(dwg_files: Iterable[str], excel_files: Iterable[str], confirm_cell: bool = False,
+               cell_reader: Callable[[str], str] = read_drawing_number) -> Tuple[List[Tuple[str, str]], List[str]]:
+    """
+    为DWG文件查找对应的工艺流程卡Excel文件
+
+    Args:
+        dwg_files: DWG文件路径列表
+        excel_files: Excel文件路径列表
+        confirm_cell: 是否读取Excel的C5单元格图号进行确认，并按C5图号配对文件名无法配对的DWG
+        cell_reader: 读取Excel图号的函数（默认读取C5单元格）
+
+    Returns:
+        Tuple[List[Tuple[str, str]], List[str]]: (按DWG文件名排序的(DWG路径, Excel路径)列表, 未匹配的DWG路径列表)
+    """
+    dwg_files = sorted(set(dwg_files), key=lambda path: (_stem(path).upper(), path))
+    excel_files = sorted(set(excel_files), key=lambda path: (len(_stem(path)), _stem(path).upper(), path))
+
+    keys = {path: parse_drawing_number(_stem(path)) for path in list(dwg_files) + excel_files}
+    by_stem = _build_index(excel_files, lambda path: _stem(path).upper())
+    by_full = _build_index(excel_files, lambda path: keys[path].full if keys[path] else None)
+    by_base = _build_index(excel_files, lambda path: keys[path].base if keys[path] else None)
+
+    cell_keys: Dict[str, Optional[DrawingKey]] = {}
+
+    def cell_key(excel_file: str) -> Optional[DrawingKey]:
+        if excel_file not in cell_keys:
+            cell_keys[excel_file] = parse_drawing_number(cell_reader(excel_file))
+        return cell_keys[excel_file]
+
+    def confirmed(dwg_key: Optional[DrawingKey], excel_file: str) -> bool:
+        if not confirm_cell or dwg_key is None:
+            return True
+        key = cell_key(excel_file)
+        if key is None or key.base == dwg_key.base:
+            return True
+        logger.warning(f"{os.path.basename(excel_file)} 的{DRAWING_NO_CELL}图号与文件名不一致，不作为候选")
+        return False
+
+    def resolve_base_only(dwg_file: str, key: DrawingKey, candidates: List[str]) -> List[str]:
+        # 只按图号匹配到多个候选时无法判断对应哪个版本：开启C5确认时取C5版本号与DWG相同的唯一候选，否则不配对
+        if len(candidates) <= 1:
+            return candidates
+        if confirm_cell and key.revision:
+            same_revision = [path for path in candidates if cell_key(path) and cell_key(path).revision == key.revision]
+            if len(same_revision) == 1:
+                return same_revision
+        names = ', '.join(os.path.basename(path) for path in candidates)
+        logger.warning(f"DWG文件 {os.path.basename(dwg_file)} 只按图号匹配到多个Excel文件（{names}），无法确定版本，不配对")
+        return []
+
+    used = set()
+
+    def choose(candidates: List[str], dwg_key: Optional[DrawingKey]) -> Optional[str]:
+        # 候选已按文件名长度和名称排序，优先选择未被使用的
+        candidates = [path for path in candidates if confirmed(dwg_key, path)]
+        unused = [path for path in candidates if path not in used]
+        return (unused or candidates or [None])[0]
+
+    pairs = []
+    unmatched = []
+    for dwg_file in dwg_files:
+        key = keys[dwg_file]
+        excel_file = choose(by_stem.get(_stem(dwg_file).upper(), []), key)
+        if excel_file is None and key is not None:
+            excel_file = choose(by_full.get(key.full, []), key)
+        if excel_file is None and key is not None:
+            # 仅在至少一方没有版本号时按图号配对
+            candidates = [path for path in by_base.get(key.base, [])
+                          if (not key.revision or not keys[path].revision) and confirmed(key, path)]
+            excel_file = choose(resolve_base_only(dwg_file, key, candidates), key)
+
+        if excel_file is None:
+            unmatched.append(dwg_file)
+        else:
+            used.add(excel_file)
+            pairs.append((dwg_file, excel_file))
+
+    # 按C5单元格图号配对文件名无法配对的DWG
+    if confirm_cell and unmatched:
+        remaining = [path for path in excel_files if path not in used]
+        by_cell = _build_index(remaining, lambda path: cell_key(path).full if cell_key(path) else None)
+        by_cell_base = _build_index(remaining, lambda path: cell_key(path).base if cell_key(path) else None)
+        still_unmatched = []
+        for dwg_file in unmatched:
+            key = keys[dwg_file]
+            candidates = []
+            if key is not None:
+                candidates = [path for path in by_cell.get(key.full, []) if path not in used]
+                if not candidates:
+                    candidates = resolve_base_only(dwg_file, key, [
+                        path for path in by_cell_base.get(key.base, [])
+                        if path not in used and (not key.revision or not cell_key(path).revision)
+                    ])
+            if candidates:
+                used.add(candidates[0])
+                pairs.append((dwg_file, candidates[0]))
+            else:
+                still_unmatched.append(dwg_file)
+        unmatched = still_unmatched
+        pairs.sort(key=lambda pair: (_stem(pair[0]).upper(), pair[0]))
+
+    return pairs, unmatched
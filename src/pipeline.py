@@ -0,0 +1,333 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import shutil
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Dict, List, Any, Callable, Optional, Tuple
+
+from src import metrics
+from src.settings import APPEARANCE_MAP_FILE, TEMPLATE_FILE, REPORT_CACHE, REPORT_CACHE_DIR
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+def preload() -> None:
+    """
+    预先导入解析和报告模块并加载对照表和报告模板
+
+    在工作进程启动时调用，使第一个任务不必承担导入开销
+    """
+    import ezdxf
+    import openpyxl
+    from src import dwg_parser, excel_parser, report_generator
+
+    report_generator.load_json_file(APPEARANCE_MAP_FILE)
+    openpyxl.load_workbook(TEMPLATE_FILE)
+    logger.info(f"工作进程 {os.getpid()} 预加载完成")
+
+
+def warm_up() -> None:
+    """工作进程初始化时调用 preload()，预加载失败不影响进程池，具体错误在处理文件对时记录"""
+    try:
+        preload()
+    except Exception as e:
+        logger.warning(f"工作进程预加载失败: {e}")
+
+
+def get_report_path(dwg_file: str, output_dir: str) -> str:
+    """
+    获取DWG文件对应的检验报告路径
+
+    Args:
+        dwg_file: DWG文件路径
+        output_dir: 输出目录
+
+    Returns:
+        str: 报告文件路径 <output_dir>/<DWG文件名>-QC.xlsx
+    """
+    base_name = os.path.splitext(os.path.basename(dwg_file))[0]
+    return os.path.join(output_dir, f"{base_name}-QC.xlsx")
+
+
+@dataclass
+class Stage:
+    """
+    处理流程中的一个阶段
+
+    func 以依赖阶段的结果作为同名关键字参数调用；artifacts 从阶段结果中取出生成的文件路径
+    """
+    name: str
+    func: Callable[..., Any]
+    deps: Tuple[str, ...] = ()
+    artifacts: Optional[Callable[[Any], List[Optional[str]]]] = None
+
+
+@dataclass
+class StageResult:
+    """阶段执行结果"""
+    name: str
+    value: Any = None
+    artifacts: List[str] = field(default_factory=list)
+    duration: float = 0.0
+
+
+def _order_stages(stages: List[Stage]) -> List[Stage]:
+    """检查依赖关系并按拓扑顺序排列阶段，存在未知依赖或循环依赖时抛出ValueError"""
+    by_name = {stage.name: stage for stage in stages}
+    if len(by_name) != len(stages):
+        raise ValueError("阶段名称重复")
+    for stage in stages:
+        unknown = [dep for dep in stage.deps if dep not in by_name]
+        if unknown:
+            raise ValueError(f"阶段 {stage.name} 依赖未知阶段: {', '.join(unknown)}")
+
+    ordered = []
+    done = set()
+    remaining = list(stages)
+    while remaining:
+        ready = [stage for stage in remaining if all(dep in done for dep in stage.deps)]
+        if not ready:
+            raise ValueError(f"阶段之间存在循环依赖: {', '.join(stage.name for stage in remaining)}")
+        for stage in ready:
+            ordered.append(stage)
+            done.add(stage.name)
+            remaining.remove(stage)
+    return ordered
+
+
+def _run_stage(stage: Stage, inputs: Dict[str, Any], recorder: Optional[metrics.Recorder] = None) -> StageResult:
+    """执行单个阶段并记录耗时和生成的文件，调用线程开启了计时段收集时，阶段线程使用同一个收集器"""
+    start = time.perf_counter()
+    with metrics.bind(recorder), metrics.span(stage.name, measure_memory=True):
+        value = stage.func(**inputs)
+    result = StageResult(stage.name, value, duration=time.perf_counter() - start)
+    if stage.artifacts:
+        result.artifacts = [path for path in stage.artifacts(value) if path]
+    logger.info(f"阶段 {stage.name} 完成，耗时 {result.duration:.2f}秒")
+    return result
+
+
+def run_stages(stages: List[Stage], max_workers: Optional[int] = None) -> Dict[str, StageResult]:
+    """
+    按依赖关系执行各阶段，相互独立的阶段在线程中并发执行
+
+    解析DWG和DXF转换等待外部命令，Excel解析和报告填充互不阻塞，因此使用线程即可；
+    多个文件对之间的并行由 batch 模块的进程池负责。
+    开启内存分析时（见 metrics.recording）各阶段依次执行，每个阶段的内存峰值互不干扰。
+
+    Args:
+        stages: 阶段列表
+        max_workers: 最大并发阶段数，默认为阶段数
+
+    Returns:
+        Dict[str, StageResult]: 阶段名称 -> 执行结果
+
+    Raises:
+        ValueError: 阶段依赖关系无效
+        Exception: 任一阶段出错时，等待已开始的阶段结束后抛出该阶段的异常，未开始的阶段不再执行
+    """
+    pending = _order_stages(stages)
+    results: Dict[str, StageResult] = {}
+    running = {}
+    recorder = metrics.current()
+    if recorder is not None and recorder.memory:
+        max_workers = 1
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(stages) or 1, thread_name_prefix='stage') as executor:
+        while pending or running:
+            for stage in [s for s in pending if all(dep in results for dep in s.deps)]:
+                pending.remove(stage)
+                inputs = {dep: results[dep].value for dep in stage.deps}
+                running[executor.submit(_run_stage, stage, inputs, recorder)] = stage
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                error = future.exception()
+                if error is not None:
+                    logger.error(f"阶段 {stage.name} 出错: {error}")
+                    wait(running)
+                    raise error
+                results[stage.name] = future.result()
+
+    return results
+
+
+def process_files(dwg_file: str, excel_file: str, output_dir: str, export_json: bool = False,
+                  save_raw: bool = False, appearance_map_file: Optional[str] = None,
+                  template_file: Optional[str] = None, use_cache: bool = True,
+                  cache_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    处理一对DWG和Excel文件：解析DWG、解析Excel、导出图纸图像并生成检验报告
+
+    各阶段及其依赖：
+
+        dwg_parse ────────────────────────────┐
+        excel_parse ──────────────────────────┼──> report
+        dxf_convert ──> image_export ─────────┘
+
+    前三个阶段同时开始，总耗时约为最长路径而非各阶段之和。
+    所有文件先写入输出目录下的独立工作目录，全部成功后再原子地移动到输出目录（报告最后移动），
+    同名图纸并行处理时互不覆盖；处理失败时输出目录保持不变。
+    解析和报告模块在调用时才导入，导入本模块本身很轻量。
+    同一对文件（以及相同的对照表、模板和代码）已生成过报告时，直接从报告缓存复制，不再解析（见 report_cache）
+
+    Args:
+        dwg_file: DWG文件路径
+        excel_file: Excel文件路径
+        output_dir: 输出目录
+        export_json: 是否在后台导出DWG和Excel解析结果JSON
+        save_raw: 是否保存压缩的原始DWG数据
+        appearance_map_file: 外观要求对照表文件路径，默认使用 settings.APPEARANCE_MAP_FILE
+        template_file: 报告模板文件路径，默认使用 settings.TEMPLATE_FILE
+        use_cache: 是否使用报告缓存（settings.REPORT_CACHE 关闭时不使用）；需要导出JSON、原始数据或开启内存分析时总是完整处理
+        cache_dir: 报告缓存目录，默认使用 settings.REPORT_CACHE_DIR（Web服务的缓存）
+
+    Returns:
+        Dict[str, Any]: 包含 report、dwg_json、excel_json、dwg_raw、dxf、image 路径（未生成时为None）、
+            各阶段耗时 timings（秒）、各阶段生成的文件 artifacts 以及是否来自缓存 cached 的字典
+    """
+    from src.workspace import Workspace
+
+    dwg_basename = os.path.splitext(os.path.basename(dwg_file))[0]
+
+    # 开启内存分析时同样完整处理，否则缓存命中的文件对没有任何阶段的内存记录
+    recorder = metrics.current()
+    profiling_memory = recorder is not None and recorder.memory
+
+    cache = None
+    cache_key = None
+    if use_cache and REPORT_CACHE and not export_json and not save_raw and not profiling_memory:
+        from src.report_cache import ReportCache
+
+        start = time.perf_counter()
+        cache = ReportCache(cache_dir or REPORT_CACHE_DIR, appearance_map_file, template_file)
+        cache_key = cache.key(dwg_file, excel_file)
+        cached_report = cache.get(cache_key)
+        if cached_report:
+            with metrics.span("cache"), Workspace(output_dir, dwg_basename) as workspace:
+                report_path = os.path.join(workspace.path, f"{dwg_basename}-QC.xlsx")
+                shutil.copyfile(cached_report, report_path)
+                report_path = workspace.publish()[report_path]
+            logger.info(f"使用缓存的检验报告: {report_path}")
+            return {
+                "report": report_path,
+                "dwg_json": None,
+                "excel_json": None,
+                "dwg_raw": None,
+                "dxf": None,
+                "image": None,
+                "timings": {"cache": time.perf_counter() - start},
+                "artifacts": {"cache": [report_path]},
+                "cached": True
+            }
+
+    from src import dwg_parser
+    from src.excel_parser import parse_excel_file
+    from src.report_generator import export_drawing_image, generate_report_from_data
+    from src.json_export import export_json_async
+
+    excel_basename = os.path.splitext(os.path.basename(excel_file))[0]
+    export_futures = []
+    workspace = Workspace(output_dir, dwg_basename)
+    work_dir = workspace.path
+
+    def parse_dwg():
+        logger.info(f"解析DWG文件: {dwg_file}")
+        dwg_data, dwg_raw_data = dwg_parser.parse_dwg_file(dwg_file)
+        paths = {"dwg_json": None, "dwg_raw": None}
+
+        if export_json:
+            paths["dwg_json"] = os.path.join(work_dir, f"{dwg_basename}_dwg.json")
+            export_futures.append(export_json_async(dwg_data, paths["dwg_json"]))
+
+        # 按需保存压缩的原始DWG数据
+        if save_raw:
+            if dwg_raw_data:
+                raw_path = os.path.join(work_dir, f"{dwg_basename}{dwg_parser.RAW_DATA_SUFFIX}")
+                paths["dwg_raw"] = dwg_parser.save_dwg_raw_data(dwg_raw_data, raw_path)
+            else:
+                logger.warning("原始DWG数据为空，跳过保存")
+        return dwg_data, paths
+
+    def parse_excel():
+        logger.info(f"解析Excel文件: {excel_file}")
+        excel_data = parse_excel_file(excel_file)
+        excel_json = None
+        if export_json:
+            excel_json = os.path.join(work_dir, f"{excel_basename}_excel.json")
+            export_futures.append(export_json_async(excel_data, excel_json))
+        return excel_data, excel_json
+
+    def convert_dxf():
+        # 总是转换到本次处理的工作目录：输出目录中的同名DXF可能来自另一对同名的文件
+        return dwg_parser.convert_dwg_to_dxf(dwg_file, os.path.join(work_dir, f"{dwg_basename}.dxf"))
+
+    def export_image(dxf_convert):
+        # DWG无法转换时同样无法导出图像
+        if not dxf_convert:
+            return None
+        return export_drawing_image(dwg_file, work_dir)
+
+    def fill_report(dwg_parse, excel_parse, image_export):
+        logger.info("开始生成检验报告")
+        return generate_report_from_data(
+            dwg_parse[0],
+            excel_parse[0],
+            appearance_map_file or APPEARANCE_MAP_FILE,
+            template_file or TEMPLATE_FILE,
+            work_dir,
+            original_excel_file=excel_file,
+            render_drawing=False,
+            drawing_image=image_export
+        )
+
+    stages = [
+        Stage("dwg_parse", parse_dwg, artifacts=lambda value: list(value[1].values())),
+        Stage("excel_parse", parse_excel, artifacts=lambda value: [value[1]]),
+        Stage("dxf_convert", convert_dxf, artifacts=lambda value: [value]),
+        Stage("image_export", export_image, deps=("dxf_convert",), artifacts=lambda value: [value]),
+        Stage("report", fill_report, deps=("dwg_parse", "excel_parse", "image_export"),
+              artifacts=lambda value: [value]),
+    ]
+    with workspace:
+        try:
+            stage_results = run_stages(stages)
+        finally:
+            # 等待后台JSON导出完成
+            wait(export_futures)
+        for future in export_futures:
+            future.result()
+
+        # 报告最后发布：报告出现即说明同一次处理的其他文件都已就位
+        published = workspace.publish(last=[stage_results["report"].value])
+
+    def final(path):
+        return published.get(os.path.abspath(path), path) if path else path
+
+    dwg_paths = stage_results["dwg_parse"].value[1]
+    result = {
+        "report": final(stage_results["report"].value),
+        "dwg_json": final(dwg_paths["dwg_json"]),
+        "excel_json": final(stage_results["excel_parse"].value[1]),
+        "dwg_raw": final(dwg_paths["dwg_raw"]),
+        "dxf": final(stage_results["dxf_convert"].value),
+        "image": final(stage_results["image_export"].value),
+        "timings": {name: stage.duration for name, stage in stage_results.items()},
+        "artifacts": {name: [final(path) for path in stage.artifacts] for name, stage in stage_results.items()},
+        "cached": False
+    }
+
+    if cache is not None and result["report"]:
+        try:
+            cache.put(cache_key, result["report"])
+        except OSError as e:
+            logger.warning(f"保存报告缓存失败: {e}")
+
+    logger.info(f"检验报告已生成: {result['report']}")
+    return result
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+按内容寻址的检验报告缓存
+
+缓存键由DWG文件、Excel文件、外观要求对照表、厚度对照表、报告模板的SHA-256以及代码版本组成，
+同一对文件再次提交时直接复制已生成的报告，不再解析和填写。
+
+缓存目录结构为 <缓存目录>/<对照表和代码指纹>/<键前两位>/<键>.xlsx。对照表、模板或代码任何一个变化时指纹随之变化，
+旧指纹下的缓存全部失效并在下一次写入时整体删除，无需逐个检查。
+缓存总大小超过上限时，写入后按最近使用时间（命中时更新报告的修改时间）从早到晚删除报告。
+"""
+
+import os
+import shutil
+import hashlib
+import logging
+import tempfile
+import importlib.util
+from typing import Dict, Optional, Tuple
+
+from src.settings import APPEARANCE_MAP_FILE, TEMPLATE_FILE, THICKNESS_MAP_FILE, REPORT_CACHE_MAX_BYTES
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 影响报告内容的模块，源文件变化时缓存失效
+CODE_MODULES = (
+    'src.pipeline',
+    'src.dwg_parser',
+    'src.excel_parser',
+    'src.report_generator',
+    'src.mtext_parser',
+    'src.extract_excel_cell',
+)
+
+_CHUNK_SIZE = 1024 * 1024
+
+# 文件路径 -> ((大小, 修改时间), SHA-256)，对照表和模板在进程内只计算一次
+_digest_cache: Dict[str, Tuple[Tuple[int, int], str]] = {}
+_code_version: Optional[str] = None
+
+
+def file_digest(path: str) -> str:
+    """
+    计算文件的SHA-256，文件大小和修改时间不变时使用进程内缓存的结果
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        str: 十六进制摘要
+    """
+    stat = os.stat(path)
+    signature = (stat.st_size, stat.st_mtime_ns)
+    cached = _digest_cache.get(path)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    _digest_cache[path] = (signature, digest.hexdigest())
+    return digest.hexdigest()
+
+
+def code_version() -> str:
+    """影响报告内容的模块源文件的摘要，只定位文件不导入模块"""
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.sha256()
+        for name in CODE_MODULES:
+            spec = importlib.util.find_spec(name)
+            origin = spec.origin if spec else None
+            digest.update(name.encode('utf-8'))
+            if origin and os.path.isfile(origin):
+                digest.update(file_digest(origin).encode('ascii'))
+        _code_version = digest.hexdigest()
+    return _code_version
+
+
+class ReportCache:
+    """检验报告缓存"""
+
+    def __init__(self, cache_dir: str, appearance_map_file: Optional[str] = None,
+                 template_file: Optional[str] = None, max_bytes: Optional[int] = None):
+        """
+        Args:
+            cache_dir: 缓存目录
+            appearance_map_file: 外观要求对照表文件路径，默认使用 settings.APPEARANCE_MAP_FILE
+            template_file: 报告模板文件路径，默认使用 settings.TEMPLATE_FILE
+            max_bytes: 缓存容量上限（字节），默认使用 settings.REPORT_CACHE_MAX_BYTES，0表示不限制
+        """
+        self.cache_dir = cache_dir
+        self.appearance_map_file = appearance_map_file or APPEARANCE_MAP_FILE
+        self.template_file = template_file or TEMPLATE_FILE
+        self.max_bytes = REPORT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+
+    def fingerprint(self) -> str:
+        """对照表、模板和代码版本的指纹"""
+        digest = hashlib.sha256(code_version().encode('ascii'))
+        for path in (self.appearance_map_file, THICKNESS_MAP_FILE, self.template_file):
+            digest.update(file_digest(path).encode('ascii') if os.path.isfile(path) else b'-')
+        return digest.hexdigest()[:16]
+
+    def key(self, dwg_file: str, excel_file: str) -> str:
+        """文件对的缓存键（同时包含指纹）"""
+        fingerprint = self.fingerprint()
+        digest = hashlib.sha256(fingerprint.encode('ascii'))
+        digest.update(file_digest(dwg_file).encode('ascii'))
+        digest.update(file_digest(excel_file).encode('ascii'))
+        return f"{fingerprint}/{digest.hexdigest()}"
+
+    def _path(self, key: str) -> str:
+        fingerprint, name = key.split('/')
+        return os.path.join(self.cache_dir, fingerprint, name[:2], f"{name}.xlsx")
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        查找缓存的报告，命中时更新报告的修改时间，容量超限时最近使用的报告最后删除
+
+        Returns:
+            Optional[str]: 缓存的报告路径，未命中时返回None
+        """
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def put(self, key: str, report_file: str) -> None:
+        """
+        保存报告到缓存，先写入临时文件再原子地重命名，多个进程同时写入同一个键时不会损坏
+
+        Args:
+            key: 缓存键
+            report_file: 生成的报告路径
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as dst, open(report_file, 'rb') as src:
+                shutil.copyfileobj(src, dst, _CHUNK_SIZE)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self._remove_stale(key.split('/')[0])
+        if self.max_bytes:
+            self._trim(key.split('/')[0])
+
+    def _remove_stale(self, fingerprint: str) -> None:
+        """删除旧指纹（对照表、模板或代码已变化）下的缓存"""
+        for entry in os.scandir(self.cache_dir):
+            if entry.name != fingerprint and entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path, ignore_errors=True)
+                logger.info(f"对照表、模板或代码已变化，删除旧的报告缓存: {entry.name}")
+
+    def _trim(self, fingerprint: str) -> None:
+        """缓存总大小超过上限时，按修改时间从早到晚删除报告"""
+        entries = []
+        total = 0
+        for shard in os.scandir(os.path.join(self.cache_dir, fingerprint)):
+            if not shard.is_dir(follow_symlinks=False):
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.name.endswith('.xlsx'):
+                    continue
+                try:
+                    stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        removed = 0
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except OSError:
+                # 其他进程已删除
+                pass
+            total -= size
+            removed += 1
+            if total <= self.max_bytes:
+                break
+        logger.info(f"报告缓存超过上限 {self.max_bytes} 字节，删除最久未使用的报告 {removed} 个")
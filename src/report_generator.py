@@ -3,18 +3,19 @@
 
 import os
 import json
+import time
 import shutil
 import logging
-import pandas as pd
+import numpy as np
 from openpyxl import load_workbook
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 import openpyxl.cell.cell
 import traceback
 import xlrd
 import re
 from copy import copy
 import openpyxl.styles
-from src.web import OUTPUT_FOLDER, TEMP_FOLDER, UPLOAD_FOLDER
+from src.settings import OUTPUT_FOLDER, TEMP_FOLDER, UPLOAD_FOLDER, THICKNESS_MAP_FILE
 
 # 确保日志目录存在
 logs_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'logs')
@@ -32,6 +33,20 @@ logger = logging.getLogger(__name__)
 
 # 导入精确提取函数
 from src.extract_excel_cell import extract_product_info_direct, extract_cell_value
+from src.mtext_parser import parse_mtext
+from src.metrics import CATEGORY_DETAIL, CATEGORY_WORKBOOK, add_span, span
+
+# 各检验类别规格上下限保留的小数位数
+LIMIT_PRECISION = {
+    "外观": 1,
+    "尺寸": 1,
+    "性能": 1,
+}
+
+# 公差格式：10±0.1 或 10±(0.1, 0.2)
+TOLERANCE_PATTERN = re.compile(
+    r'(\d+(?:\.\d+)?)±(?:(\d+(?:\.\d+)?)|\((-?\d+(?:\.\d+)?),\s*(-?\d+(?:\.\d+)?)\))'
+)
 
 
 def load_json_file(file_path: str) -> Dict[str, Any]:
@@ -139,7 +154,8 @@ def extract_process_info_direct(excel_file: str) -> List[Dict[str, str]]:
         # 根据文件扩展名选择合适的库
         if file_extension == '.xlsx':
             # 使用openpyxl处理.xlsx文件
-            wb = load_workbook(excel_file, data_only=True)
+            with span('load_workbook', CATEGORY_WORKBOOK, file=os.path.basename(excel_file)):
+                wb = load_workbook(excel_file, data_only=True)
             if len(wb.sheetnames) == 0:
                 logger.error(f"Excel文件 {excel_file} 中没有工作表")
                 return []
@@ -192,7 +208,8 @@ def extract_process_info_direct(excel_file: str) -> List[Dict[str, str]]:
 
         elif file_extension == '.xls':
             # 使用xlrd处理.xls文件
-            wb = xlrd.open_workbook(excel_file)
+            with span('load_workbook', CATEGORY_WORKBOOK, file=os.path.basename(excel_file)):
+                wb = xlrd.open_workbook(excel_file)
             if wb.nsheets == 0:
                 logger.error(f"Excel文件 {excel_file} 中没有工作表")
                 return []
@@ -350,46 +367,8 @@ def clean_cad_text(text: str) -> str:
     if not text:
         return ""
 
-    # 1. 提取关键数据：寻找圆直径和公差信息
-    diameter_match = re.search(r'%%c(\d+(\.\d+)?)', text)
-    tolerance_match = re.search(r'\\S\+([0-9.]+)\^\s*([0-9.]+)', text)
-
-    # 如果找到直径
-    if diameter_match:
-        diameter = diameter_match.group(1)
-
-        # 处理公差
-        if tolerance_match:
-            positive_tol = tolerance_match.group(1)
-            negative_tol = tolerance_match.group(2)
-            return f"φ{diameter}±({positive_tol}, {negative_tol})"
-        else:
-            # 如果没有公差信息，使用默认公差
-            return f"φ{diameter}±0.2"
-
-    # 如果没有直径但有数字，可能是普通尺寸
-    else:
-        # 清理文本，去除格式标记
-        cleaned = re.sub(r'\\[A-Za-z][^;]*;', '', text)  # 移除 \A1; 等标记
-        cleaned = re.sub(r'{\\[^}]*}', '', cleaned)  # 移除花括号及其内容
-        cleaned = re.sub(r'{[^}]*}', '', cleaned)
-
-        # 替换标准符号
-        cleaned = cleaned.replace('%%P', '±')
-        cleaned = cleaned.replace('%%c', 'φ')
-
-        # 提取数字部分
-        number_match = re.search(r'(\d+(\.\d+)?)', cleaned)
-        if number_match:
-            # 如果已包含公差信息
-            if '±' in cleaned:
-                return cleaned
-            # 否则添加默认公差
-            else:
-                number = number_match.group(1)
-                return re.sub(r'(\d+(\.\d+)?)', f'\\1±0.2', cleaned, count=1)
-
-        return cleaned
+    # 单次扫描解析MTEXT格式，结果按原始文本缓存
+    return parse_mtext(text).display
 
 
 def extract_dwg_text(dwg_data: Dict[str, Any]) -> List[str]:
@@ -419,6 +398,52 @@ def extract_dwg_text(dwg_data: Dict[str, Any]) -> List[str]:
     return inspection_items
 
 
+def get_inspection_category(item: str) -> str:
+    """
+    根据检验项目内容确定检验类别
+
+    Args:
+        item: 检验项目文本
+
+    Returns:
+        str: 检验类别（外观/尺寸/性能）
+    """
+    if "外观" in item:
+        return "外观"
+    elif "尺寸" in item:
+        return "尺寸"
+    return "性能"
+
+
+def compute_tolerance_limits(inspection_items: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    一次性提取所有检验项目的名义尺寸和公差，并向量化计算规格上下限
+
+    Args:
+        inspection_items: 检验项目列表
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (下限数组, 上限数组)，不含公差的项目对应NaN
+    """
+    # 每行依次为：名义尺寸、上偏差、下偏差
+    values = np.full((len(inspection_items), 3), np.nan)
+
+    for idx, item in enumerate(inspection_items):
+        match = TOLERANCE_PATTERN.search(item)
+        if not match:
+            continue
+
+        nominal, symmetric, upper, lower = match.groups()
+        if symmetric is not None:
+            values[idx] = (float(nominal), float(symmetric), float(symmetric))
+        else:
+            values[idx] = (float(nominal), float(upper), float(lower))
+
+    lower_limits = values[:, 0] - values[:, 2]
+    upper_limits = values[:, 0] + values[:, 1]
+    return lower_limits, upper_limits
+
+
 def parse_material_info(material_str: str) -> Dict[str, str]:
     """
     解析材料信息，将其分割为材质和料厚
@@ -540,7 +565,8 @@ def insert_drawing_image(report_path: str, image_path: str) -> None:
         from openpyxl.drawing.image import Image as XLImage
 
         # 加载工作簿
-        wb = load_workbook(report_path)
+        with span('load_workbook', CATEGORY_WORKBOOK, file=os.path.basename(report_path)):
+            wb = load_workbook(report_path)
 
         # 获取或创建第二个sheet
         if len(wb.sheetnames) < 2:
@@ -588,7 +614,8 @@ def insert_drawing_image(report_path: str, image_path: str) -> None:
         sheet.add_image(img, 'A1')
 
         # 保存工作簿
-        wb.save(report_path)
+        with span('save_workbook', CATEGORY_WORKBOOK, file=os.path.basename(report_path)):
+            wb.save(report_path)
         logger.info(f"成功将图像插入到报告: {report_path}")
 
     except Exception as e:
@@ -597,8 +624,33 @@ def insert_drawing_image(report_path: str, image_path: str) -> None:
         raise
 
 
+def export_drawing_image(dwg_file: str, output_dir: str) -> Optional[str]:
+    """
+    通过AutoCAD将DWG图纸导出为PNG图像
+
+    Args:
+        dwg_file: DWG文件路径
+        output_dir: 图像输出目录
+
+    Returns:
+        Optional[str]: 图像文件路径，当前环境无法导出或导出失败时返回None
+    """
+    try:
+        from src.export_image import process_dwg
+    except ImportError as e:
+        logger.warning(f"当前环境无法导出图纸图像: {e}")
+        return None
+
+    base_name = os.path.splitext(os.path.basename(dwg_file))[0]
+    image_path = os.path.join(output_dir, f"{base_name}.png")
+    if process_dwg(dwg_file, output_dir) and os.path.exists(image_path):
+        return image_path
+    return None
+
+
 def generate_template_report(dwg_file: str, excel_file: str, appearance_map_file: str, template_file: str,
-                             output_dir: str = 'outputs', original_excel_file: str = None) -> str:
+                             output_dir: str = 'outputs', original_excel_file: str = None,
+                             limit_precision: Optional[Dict[str, int]] = None, render_drawing: bool = True) -> str:
     """
     根据模板生成检验报告
 
@@ -609,27 +661,23 @@ def generate_template_report(dwg_file: str, excel_file: str, appearance_map_file
         template_file: 报告模板文件路径
         output_dir: 输出目录
         original_excel_file: 原始Excel文件路径（可选）
+        limit_precision: 各检验类别规格上下限的小数位数（可选），覆盖 LIMIT_PRECISION 中的默认值
+        render_drawing: 是否转换DWG并在报告中插入图纸图像
 
     Returns:
         str: 生成的报告文件路径
     """
     try:
-        # 创建输出目录
-        os.makedirs(output_dir, exist_ok=True)
-
         # 检查输入文件路径
         if not os.path.exists(dwg_file):
             raise FileNotFoundError(f"DWG数据文件不存在: {dwg_file}")
         if not os.path.exists(excel_file):
             raise FileNotFoundError(f"Excel文件不存在: {excel_file}")
-        if not os.path.exists(appearance_map_file):
-            raise FileNotFoundError(f"外观要求对照表文件不存在: {appearance_map_file}")
-        if not os.path.exists(template_file):
-            raise FileNotFoundError(f"报告模板文件不存在: {template_file}")
 
         # 加载数据
         logger.info(f"加载DWG数据: {dwg_file}")
-        dwg_data = load_json_file(dwg_file)
+        with span('load_dwg_data', CATEGORY_DETAIL, file=os.path.basename(dwg_file)):
+            dwg_data = load_json_file(dwg_file)
 
         # 检查excel_file是JSON文件还是原始Excel文件
         is_json_file = excel_file.lower().endswith('.json')
@@ -637,7 +685,8 @@ def generate_template_report(dwg_file: str, excel_file: str, appearance_map_file
         if is_json_file:
             # 如果是JSON文件，加载Excel数据
             logger.info(f"加载Excel JSON数据: {excel_file}")
-            excel_data = load_json_file(excel_file)
+            with span('load_excel_data', CATEGORY_DETAIL, file=os.path.basename(excel_file)):
+                excel_data = load_json_file(excel_file)
 
             # 优先使用传入的原始Excel文件路径
             if original_excel_file and os.path.exists(original_excel_file):
@@ -667,20 +716,79 @@ def generate_template_report(dwg_file: str, excel_file: str, appearance_map_file
             logger.info(f"使用原始Excel文件: {excel_file}")
             original_excel_file = excel_file
 
-            # 为了兼容性，生成一个临时的Excel数据结构
-            from src.excel_parser import parse_excel_file
-            excel_data = parse_excel_file(excel_file)
+            # 直接从原始Excel文件中提取工序信息
+            with span('load_excel_data', CATEGORY_DETAIL, file=os.path.basename(excel_file)):
+                excel_data = {
+                    "file_name": os.path.basename(excel_file),
+                    "processes": extract_process_info_direct(excel_file)
+                }
+    except Exception as e:
+        logger.error(f"生成模板报告时出错: {e}")
+        logger.error(traceback.format_exc())
+        raise
+
+    with span('generate_report', CATEGORY_DETAIL):
+        return generate_report_from_data(
+            dwg_data,
+            excel_data,
+            appearance_map_file,
+            template_file,
+            output_dir,
+            original_excel_file=original_excel_file,
+            limit_precision=limit_precision,
+            render_drawing=render_drawing
+        )
+
+
+def generate_report_from_data(dwg_data: Dict[str, Any], excel_data: Dict[str, Any], appearance_map_file: str,
+                              template_file: str, output_dir: str = 'outputs', original_excel_file: str = None,
+                              limit_precision: Optional[Dict[str, int]] = None, render_drawing: bool = True,
+                              drawing_image: Optional[str] = None) -> str:
+    """
+    根据模板和已解析的数据生成检验报告，无需先将解析结果写入JSON文件
+
+    Args:
+        dwg_data: parse_dwg_file 返回的DWG数据
+        excel_data: parse_excel_file 返回的工序数据
+        appearance_map_file: 外观要求对照表文件路径
+        template_file: 报告模板文件路径
+        output_dir: 输出目录
+        original_excel_file: 原始Excel文件路径（可选），用于提取产品信息
+        limit_precision: 各检验类别规格上下限的小数位数（可选），覆盖 LIMIT_PRECISION 中的默认值
+        render_drawing: 是否在此处转换DWG并导出图纸图像；为False时由调用方提前生成图像
+        drawing_image: 已导出的图纸图像路径（可选），render_drawing 为False时插入报告
+
+    Returns:
+        str: 生成的报告文件路径
+    """
+    try:
+        # 创建输出目录
+        os.makedirs(output_dir, exist_ok=True)
+
+        # 检查输入文件路径
+        if not os.path.exists(appearance_map_file):
+            raise FileNotFoundError(f"外观要求对照表文件不存在: {appearance_map_file}")
+        if not os.path.exists(template_file):
+            raise FileNotFoundError(f"报告模板文件不存在: {template_file}")
 
         logger.info(f"加载外观要求对照表: {appearance_map_file}")
-        appearance_map = load_json_file(appearance_map_file)
+        with span('load_appearance_map', CATEGORY_DETAIL):
+            appearance_map = load_json_file(appearance_map_file)
 
         # 提取基本信息 - 使用精确提取函数
-        if original_excel_file:
+        if original_excel_file and os.path.exists(original_excel_file):
             logger.info(f"使用精确提取函数从原始Excel文件中提取产品信息")
-            product_info = extract_product_info(original_excel_file)
+            with span('extract_product_info', CATEGORY_DETAIL):
+                product_info = extract_product_info(original_excel_file)
         else:
-            logger.warning(f"未找到原始Excel文件，将使用JSON数据提取产品信息")
-            product_info = extract_product_info(excel_file)
+            logger.warning(f"未找到原始Excel文件，产品信息将为空")
+            product_info = {
+                "product_code": "",
+                "drawing_no": "",
+                "material": "",
+                "version": "",
+                "part_name": ""
+            }
 
         logger.info(f"提取的产品信息: {product_info}")
 
@@ -691,7 +799,8 @@ def generate_template_report(dwg_file: str, excel_file: str, appearance_map_file
 
         # 首先复制模板文件创建报告
         logger.info(f"复制模板文件 {template_file} 到 {output_file}")
-        shutil.copy2(template_file, output_file)
+        with span('copy_template', CATEGORY_DETAIL):
+            shutil.copy2(template_file, output_file)
 
         def get_task_id(file_path):
             task_id = None
@@ -705,7 +814,12 @@ def generate_template_report(dwg_file: str, excel_file: str, appearance_map_file
             return task_id
         # 处理DWG转换和图像插入
         dxf_path = os.path.join('outputs', f"{base_name}.dxf")
-        if not os.path.exists(dxf_path):
+        if not render_drawing:
+            dxf_path = None
+            if drawing_image and os.path.exists(drawing_image):
+                with span('insert_drawing_image', CATEGORY_DETAIL):
+                    insert_drawing_image(output_file, drawing_image)
+        elif not os.path.exists(dxf_path):
             # 从原始Excel文件路径中提取任务ID
 
             task_id = get_task_id(original_excel_file)
@@ -740,7 +854,9 @@ def generate_template_report(dwg_file: str, excel_file: str, appearance_map_file
                 insert_drawing_image(output_file, image_path)
 
         # 使用openpyxl加载工作簿
-        wb = load_workbook(output_file)
+        fill_start = time.perf_counter()
+        with span('load_workbook', CATEGORY_WORKBOOK, file=os.path.basename(output_file)):
+            wb = load_workbook(output_file)
         ws = wb.active
 
         # 安全设置单元格值的函数（处理合并单元格）
@@ -795,7 +911,7 @@ def generate_template_report(dwg_file: str, excel_file: str, appearance_map_file
         thickness_item = f"料厚：{material_info['thickness']}"
 
         # 查找厚度对应的公差
-        thickness_map_file = os.path.join('maps', 'thickness_map.json')
+        thickness_map_file = THICKNESS_MAP_FILE
         if os.path.exists(thickness_map_file) and material_info['thickness_value'] > 0:
             logger.info(f"查找厚度 {material_info['thickness_value']} 对应的公差")
             thickness_tolerance = get_thickness_tolerance(material_info['thickness_value'], thickness_map_file)
@@ -805,7 +921,7 @@ def generate_template_report(dwg_file: str, excel_file: str, appearance_map_file
 
         # 6. 获取工序信息和对应的外观要求
         logger.info("提取工序信息")
-        process_list = extract_process_info_direct(excel_file)
+        process_list = excel_data.get('processes', [])
         logger.info(f"找到 {len(process_list)} 个工序")
         logger.info(f"工序信息: {process_list}")
 
@@ -905,6 +1021,14 @@ def generate_template_report(dwg_file: str, excel_file: str, appearance_map_file
         # 从第9行开始填充其他检验项目
         remaining_row_start = start_row + 2
 
+        # 一次性计算所有检验项目的类别和规格上下限
+        precision_map = dict(LIMIT_PRECISION)
+        if limit_precision:
+            precision_map.update(limit_precision)
+        categories = [get_inspection_category(item) for item in inspection_items]
+        lower_limits, upper_limits = compute_tolerance_limits(inspection_items)
+        has_limits = ~np.isnan(lower_limits)
+
         # 填充其他检验项目
         for i, item in enumerate(inspection_items, start=1):
             row_index = remaining_row_start + i - 1
@@ -917,43 +1041,16 @@ def generate_template_report(dwg_file: str, excel_file: str, appearance_map_file
             set_cell_value(ws, f"B{row_index}", item)
 
             # H列：检验类别
-            category = "性能"  # 默认值
+            category = categories[i - 1]
 
-            # 提取公差信息，计算上下限
-            tolerance_match = re.search(r'(\d+(\.\d+)?)±(\d+(\.\d+)?)', item)
-            if tolerance_match:
-                base_value = float(tolerance_match.group(1))
-                tolerance = float(tolerance_match.group(3))
+            if has_limits[i - 1]:
+                precision = precision_map.get(category, 1)
 
                 # F列：规格下限值
-                lower_limit = base_value - tolerance
-                set_cell_value(ws, f"F{row_index}", f"{lower_limit:.1f}")
+                set_cell_value(ws, f"F{row_index}", f"{lower_limits[i - 1]:.{precision}f}")
 
                 # G列：规格上限值
-                upper_limit = base_value + tolerance
-                set_cell_value(ws, f"G{row_index}", f"{upper_limit:.1f}")
-
-            # 更复杂的公差格式 ±(a, b)
-            complex_tolerance_match = re.search(r'(\d+(\.\d+)?)±\((\d+(\.\d+)?),\s*(\d+(\.\d+)?)\)', item)
-            if complex_tolerance_match and not tolerance_match:
-                base_value = float(complex_tolerance_match.group(1))
-                upper_tolerance = float(complex_tolerance_match.group(3))
-                lower_tolerance = float(complex_tolerance_match.group(5))
-
-                # F列：规格下限值
-                lower_limit = base_value - lower_tolerance
-                set_cell_value(ws, f"F{row_index}", f"{lower_limit:.1f}")
-
-                # G列：规格上限值
-                upper_limit = base_value + upper_tolerance
-                set_cell_value(ws, f"G{row_index}", f"{upper_limit:.1f}")
-
-            if "外观" in item:
-                category = "外观"
-            elif "尺寸" in item:
-                category = "尺寸"
-            elif "加工" in item:
-                category = "性能"
+                set_cell_value(ws, f"G{row_index}", f"{upper_limits[i - 1]:.{precision}f}")
 
             set_cell_value(ws, f"H{row_index}", category)
 
@@ -967,9 +1064,12 @@ def generate_template_report(dwg_file: str, excel_file: str, appearance_map_file
             # 设置单元格字体为普通字体
             ws[f"P{row_index}"].font = openpyxl.styles.Font(name="宋体")
 
+        add_span('report_fill', time.perf_counter() - fill_start)
+
         # 保存Excel文件
         logger.info(f"保存Excel文件: {output_file}")
-        wb.save(output_file)
+        with span('report_save'):
+            wb.save(output_file)
         logger.info(f"检验报告已生成: {output_file}")
 
         return output_file
@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+import threading
+import multiprocessing
+import traceback
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Iterable, Optional, Tuple
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+def _pool_context():
+    """
+    工作进程的启动方式
+
+    进程池在服务进程中按需创建（包括进程池损坏后重建），此时已有请求线程、回调线程和清理线程，
+    直接fork可能复制其他线程持有的锁而死锁。支持时使用forkserver：工作进程由单线程的forkserver进程fork出来；
+    Windows只支持spawn。
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def _init_pool_worker() -> None:
+    """工作进程初始化：预加载模块和模板，失败时仅记录警告"""
+    from src.pipeline import warm_up
+    warm_up()
+
+
+@dataclass
+class _Job:
+    """调度器内部的作业状态"""
+    job_id: str
+    func: Callable[..., Any]
+    pending: Deque[Tuple[Any, ...]]
+    on_result: Callable[[Tuple[Any, ...], Any, Optional[BaseException]], None]
+    on_start: Optional[Callable[[], None]] = None
+    on_complete: Optional[Callable[[], None]] = None
+    priority: bool = False
+    running: int = 0
+    started: bool = False
+    done: bool = False
+
+
+class JobScheduler:
+    """
+    Web批处理的中心调度器
+
+    所有作业共用一个大小固定的进程池。作业按提交顺序排队，各作业轮流取出下一个任务，
+    后提交的小作业不必等待前面的大作业全部完成；同一作业内的任务并行执行。
+    同时提交到进程池的任务不超过 max_workers 个，排队中的任务只保存参数，内存占用有界。
+
+    优先通道的作业（如交互式的单文件作业）总是先于普通作业取任务，并且可以使用为其保留的 reserved_slots 个进程，
+    大批量作业运行时单文件作业也能立即开始。
+
+    结果回调和作业开始/完成回调在同一个回调线程中依次执行，回调中修改作业状态无需额外加锁。
+    """
+
+    def __init__(self, max_workers: int = 1, reserved_slots: int = 0):
+        """
+        Args:
+            max_workers: 工作进程数
+            reserved_slots: 为优先通道保留的进程数，普通作业最多使用 max_workers - reserved_slots 个（至少1个）
+        """
+        self.max_workers = max(1, max_workers)
+        self.reserved_slots = max(0, reserved_slots)
+        self._jobs: 'OrderedDict[str, _Job]' = OrderedDict()
+        self._running = 0
+        self._lock = threading.Condition()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._callbacks = ThreadPoolExecutor(max_workers=1, thread_name_prefix='job-callback')
+        self._dispatcher: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def submit(self, job_id: str, func: Callable[..., Any], tasks: Iterable[Tuple[Any, ...]], on_result: Callable,
+               on_start: Optional[Callable] = None, on_complete: Optional[Callable] = None,
+               priority: bool = False) -> None:
+        """
+        提交一个作业
+
+        Args:
+            job_id: 作业ID
+            func: 在工作进程中执行的函数，必须可以被pickle（模块级函数）
+            tasks: 任务参数元组列表，每个元组调用一次 func(*args)
+            on_result: 每个任务完成后调用 on_result(args, result, error)，出错时 result 为None
+            on_start: 作业的第一个任务开始执行时调用（可选）
+            on_complete: 作业所有任务完成后调用（可选）
+            priority: 是否使用优先通道
+        """
+        job = _Job(job_id, func, deque(tuple(args) for args in tasks), on_result, on_start, on_complete, priority)
+        with self._lock:
+            if self._stopped:
+                raise RuntimeError("调度器已停止")
+            if job_id in self._jobs:
+                raise ValueError(f"作业已存在: {job_id}")
+            self._jobs[job_id] = job
+            self._ensure_started()
+            self._lock.notify_all()
+        logger.info(f"作业 {job_id} 已加入队列，共 {len(job.pending)} 个任务")
+
+        if not job.pending:
+            self._finish_job(job)
+
+    def queued_tasks(self) -> int:
+        """排队中（尚未开始）的任务数"""
+        with self._lock:
+            return self._count_queued()
+
+    def running_tasks(self) -> int:
+        """正在执行的任务数"""
+        with self._lock:
+            return self._running
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待所有已提交的作业完成（包括完成回调）
+
+        Args:
+            timeout: 最长等待时间（秒），None表示一直等待
+
+        Returns:
+            bool: 是否所有作业都已完成
+        """
+        with self._lock:
+            if not self._lock.wait_for(lambda: not self._jobs, timeout):
+                return False
+        # 回调线程按提交顺序执行，等待此前提交的回调全部执行完
+        try:
+            self._callbacks.submit(lambda: None).result(timeout)
+        except FutureTimeoutError:
+            return False
+        return True
+
+    def shutdown(self, wait: bool = True) -> None:
+        """停止调度，未开始的任务不再执行"""
+        with self._lock:
+            self._stopped = True
+            self._lock.notify_all()
+        if self._dispatcher is not None:
+            self._dispatcher.join()
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+        self._callbacks.shutdown(wait=wait)
+
+    def _ensure_started(self) -> None:
+        """首次提交作业时再创建进程池和调度线程（调用方持有锁）"""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=_pool_context(),
+                                             initializer=_init_pool_worker)
+        if self._dispatcher is None:
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name='job-dispatcher', daemon=True)
+            self._dispatcher.start()
+
+    def _count_queued(self) -> int:
+        """排队中的任务数（调用方持有锁）"""
+        return sum(len(job.pending) for job in self._jobs.values())
+
+    def _next_task(self) -> Optional[Tuple[_Job, Tuple[Any, ...]]]:
+        """先优先通道后普通作业，按作业轮转取出下一个可以开始的任务（调用方持有锁）"""
+        normal_limit = max(1, self.max_workers - self.reserved_slots)
+        for priority in (True, False):
+            limit = self.max_workers if priority else normal_limit
+            if self._running >= limit:
+                continue
+            for job_id in list(self._jobs):
+                job = self._jobs[job_id]
+                if job.priority == priority and job.pending:
+                    # 取过任务的作业移到队尾，下一次先轮到其他作业
+                    self._jobs.move_to_end(job_id)
+                    return job, job.pending.popleft()
+        return None
+
+    def _dispatch_loop(self) -> None:
+        """调度线程：有空闲进程时按轮转顺序提交任务"""
+        while True:
+            with self._lock:
+                task = None
+                while not self._stopped:
+                    task = self._next_task()
+                    if task is not None:
+                        break
+                    self._lock.wait()
+                if self._stopped:
+                    return
+                job, args = task
+                job.running += 1
+                self._running += 1
+                first_task = not job.started
+                job.started = True
+
+            if first_task and job.on_start:
+                self._callbacks.submit(self._safe_call, job.on_start)
+            try:
+                try:
+                    future = self._pool.submit(job.func, *args)
+                except BrokenProcessPool:
+                    # 工作进程异常退出（如内存不足被终止）后重建进程池
+                    logger.warning("进程池已损坏，重新创建工作进程")
+                    self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=_pool_context(),
+                                                     initializer=_init_pool_worker)
+                    future = self._pool.submit(job.func, *args)
+            except Exception as e:
+                future = Future()
+                future.set_exception(e)
+            future.add_done_callback(lambda f, job=job, args=args: self._on_task_done(job, args, f))
+
+    def _on_task_done(self, job: _Job, args: Tuple[Any, ...], future: Future) -> None:
+        """任务完成：释放进程名额，在回调线程中处理结果"""
+        with self._lock:
+            self._running -= 1
+            self._lock.notify_all()
+
+        error = future.exception()
+        result = None if error is not None else future.result()
+        self._callbacks.submit(self._handle_result, job, args, result, error)
+
+    def _handle_result(self, job: _Job, args: Tuple[Any, ...], result: Any, error: Optional[BaseException]) -> None:
+        """在回调线程中调用结果回调，作业全部完成时调用完成回调"""
+        self._safe_call(job.on_result, args, result, error)
+        with self._lock:
+            job.running -= 1
+            finished = not job.pending and job.running == 0
+        if finished:
+            self._finish_job(job)
+
+    def _finish_job(self, job: _Job) -> None:
+        """移除已完成的作业并调用完成回调"""
+        with self._lock:
+            if job.done:
+                return
+            job.done = True
+            self._jobs.pop(job.job_id, None)
+            self._lock.notify_all()
+        logger.info(f"作业 {job.job_id} 的任务已全部完成")
+        if job.on_complete:
+            self._callbacks.submit(self._safe_call, job.on_complete)
+
+    @staticmethod
+    def _safe_call(callback: Callable, *args) -> None:
+        """调用回调函数，异常只记录不向外抛出"""
+        try:
+            callback(*args)
+        except Exception as e:
+            logger.error(f"执行作业回调时出错: {e}")
+            logger.error(traceback.format_exc())
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Web服务启动
+
+workers 大于1且安装了gunicorn（仅Linux/macOS）时使用多进程服务：
+
+    1. 主进程预加载ezdxf、openpyxl、pandas、解析和报告模块以及对照表和报告模板，然后fork出服务进程，
+       子进程直接共享已加载的模块，第一个请求不必承担导入开销
+    2. 每个服务进程使用gthread多线程处理请求（进度推送等长连接各占一个线程），
+       并拥有自己的批处理调度器，工作进程数按服务进程数平分
+    3. 服务进程退出（停止服务，或设置了 max_requests 时处理完相应数量的请求后重启）前，
+       最多等待 shutdown_timeout 秒让本进程已接收的批处理作业完成，超时未完成的作业由作业存储标记为已中断。
+       批处理调度器属于服务进程，默认不按请求数重启服务进程
+
+否则预加载后使用Flask自带的多线程服务器。
+"""
+
+import time
+import logging
+
+from src.pipeline import warm_up
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+def preload_app() -> None:
+    """预加载解析和报告模块以及对照表和报告模板，失败时仅记录警告"""
+    start = time.perf_counter()
+    warm_up()
+    logger.info(f"预加载完成，耗时: {time.perf_counter() - start:.2f}秒")
+
+
+def _post_fork(processes_per_worker: int):
+    """服务进程fork后调用：设置本进程调度器的工作进程数并启动后台任务"""
+    def post_fork(server, worker):
+        from src import web
+        # 调度器的进程池在第一次提交作业时才创建，此时修改仍然有效
+        web.scheduler.max_workers = processes_per_worker
+        web.start_background_tasks()
+    return post_fork
+
+
+def _worker_exit(timeout: float):
+    """
+    服务进程退出前调用：等待本进程的批处理作业完成后停止调度器
+
+    gunicorn在调用此钩子前已关闭心跳文件，等待期间无法再向主进程报告心跳，
+    主进程的 timeout 和 graceful_timeout 需不小于等待时间（见 serve）。
+    """
+    def worker_exit(server, worker):
+        from src import web
+        busy = web.scheduler.queued_tasks() + web.scheduler.running_tasks()
+        if busy:
+            logger.info(f"服务进程 {worker.pid} 等待 {busy} 个批处理任务完成后退出")
+        drained = web.scheduler.drain(timeout=timeout)
+        if not drained:
+            logger.warning(f"服务进程 {worker.pid} 等待 {timeout} 秒后仍有批处理任务未完成，未完成的作业将被标记为已中断")
+        web.scheduler.shutdown(wait=drained)
+    return worker_exit
+
+
+def serve(app, host: str = '0.0.0.0', port: int = 5001, workers: int = 1, threads: int = 8,
+          max_requests: int = 0, worker_processes: int = 1, shutdown_timeout: int = 600) -> None:
+    """
+    启动Web服务
+
+    Args:
+        app: Flask应用
+        host: 监听地址
+        port: 监听端口
+        workers: 服务进程数，大于1时使用gunicorn
+        threads: 每个服务进程的线程数
+        max_requests: 服务进程处理多少个请求后重启，0表示不重启
+        worker_processes: 批处理工作进程总数，由各服务进程平分
+        shutdown_timeout: 服务进程退出时等待批处理作业完成的最长时间（秒）
+    """
+    preload_app()
+
+    if workers > 1:
+        try:
+            from gunicorn.app.base import BaseApplication
+        except ImportError:
+            BaseApplication = None
+            logger.warning("未安装gunicorn（或当前系统不支持），使用单进程多线程服务")
+
+        if BaseApplication is not None:
+            options = {
+                'bind': f"{host}:{port}",
+                'workers': workers,
+                'worker_class': 'gthread',
+                'threads': threads,
+                'preload_app': True,
+                'max_requests': max_requests,
+                'max_requests_jitter': max_requests // 10,
+                # 服务进程退出时等待批处理作业期间没有心跳，超时时间留出余量，避免被主进程提前终止
+                'timeout': shutdown_timeout + 30,
+                'graceful_timeout': shutdown_timeout + 30,
+                'post_fork': _post_fork(max(1, worker_processes // workers)),
+                'worker_exit': _worker_exit(shutdown_timeout),
+            }
+
+            class _Application(BaseApplication):
+                def load_config(self):
+                    for key, value in options.items():
+                        self.cfg.set(key, value)
+
+                def load(self):
+                    return app
+
+            logger.info(f"启动多进程服务: {host}:{port}，服务进程数: {workers}，每个进程线程数: {threads}")
+            _Application().run()
+            return
+
+    from src import web
+    web.start_background_tasks()
+    app.run(host=host, port=port, debug=False, use_reloader=False, threaded=True)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+路径与运行配置
+
+不依赖Flask，命令行、Web应用和后台工作进程共用。导入时不创建任何目录，
+需要时调用 ensure_directories()。所有路径均可通过环境变量覆盖：
+
+    CADTOEXCEL_UPLOAD_FOLDER   上传文件目录
+    CADTOEXCEL_OUTPUT_FOLDER   输出目录
+    CADTOEXCEL_TEMP_FOLDER     批处理临时目录，默认为输出目录下的temp
+    CADTOEXCEL_MAPS_FOLDER     对照表和报告模板目录
+
+运行配置：
+
+    CADTOEXCEL_WORKERS         Web批处理工作进程数，默认为CPU核数
+    CADTOEXCEL_JOB_DB          批处理作业数据库文件，默认为输出目录下的jobs.sqlite3
+    CADTOEXCEL_JOB_RETENTION_DAYS  已结束作业的保留天数，默认为7
+    CADTOEXCEL_CONFIRM_DRAWING_NO  批处理配对时读取工艺流程卡C5单元格图号进行确认
+    CADTOEXCEL_CONTENT_STORE       上传文件内容库目录（按SHA-256去重），默认为上传目录下的store
+    CADTOEXCEL_UPLOAD_QUOTA_MB     上传目录容量上限（MB），超出时清理最久未访问的作业，默认不限制
+    CADTOEXCEL_OUTPUT_QUOTA_MB     输出目录容量上限（MB），默认不限制
+    CADTOEXCEL_JANITOR_INTERVAL    清理任务的执行间隔（秒），默认为600
+    CADTOEXCEL_REPORT_CACHE        是否使用检验报告缓存（同一对文件直接返回已生成的报告），默认开启
+    CADTOEXCEL_REPORT_CACHE_DIR    Web服务的报告缓存目录，默认为输出目录下的report_cache（命令行使用 --output 目录下的report_cache）
+    CADTOEXCEL_REPORT_CACHE_MAX_MB 报告缓存容量上限（MB），超出时删除最久未使用的报告，0表示不限制，默认为1024
+    CADTOEXCEL_HTTP_WORKERS        Web服务进程数，大于1时使用gunicorn多进程服务，默认为1（单进程多线程）
+    CADTOEXCEL_HTTP_THREADS        每个Web服务进程的线程数，默认为8
+    CADTOEXCEL_MAX_REQUESTS        Web服务进程处理多少个请求后重启，0表示不重启，默认为0
+    CADTOEXCEL_SHUTDOWN_TIMEOUT    Web服务进程退出（重启或停止服务）时等待本进程批处理作业完成的最长时间（秒），默认为600
+    CADTOEXCEL_MAX_QUEUED_TASKS    排队和处理中的文件对总数上限，达到时拒绝新的批处理作业（503），0表示不限制，默认为500
+    CADTOEXCEL_MAX_ACTIVE_SINGLE   进行中的单文件作业数上限，达到时拒绝新的单文件作业（503），0表示不限制，默认为50
+    CADTOEXCEL_MAX_JOBS_PER_CLIENT 每个客户端（IP地址）同时进行的作业数上限（429），0表示不限制，默认为3
+    CADTOEXCEL_PROXY_COUNT         Web服务前的反向代理层数，大于0时按 X-Forwarded-For 识别客户端IP，默认为0（直接访问）
+    CADTOEXCEL_TRACE               为每个Web作业在输出目录中保存Chrome trace-event JSON（trace.json），默认关闭
+    CADTOEXCEL_PROFILE_MEMORY      记录Web作业各阶段的内存峰值和RSS变化（各阶段依次执行，处理变慢），默认关闭
+    CADTOEXCEL_MEMORY_THRESHOLD_MB 内存分析时单个文件对的阶段峰值或RSS增长超过该值（MB）时标记，默认为512
+"""
+
+import os
+import sys
+
+# 项目根目录
+ROOT_DIR = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+
+
+def get_mei_dir() -> str:
+    """动态获取 PyInstaller 解压目录（_MEIxxxxxx）"""
+    decom_dir = os.environ.get('TEMP') or os.getcwd()
+    if not hasattr(sys, '_MEIPASS'):
+        mei_dirs = [
+            d for d in os.listdir(decom_dir)
+            if d.startswith('_MEI') and os.path.isdir(os.path.join(decom_dir, d))
+        ]
+
+        if not mei_dirs:
+            raise FileNotFoundError("PyInstaller 解压目录未找到 (_MEI*)")
+
+        # 按创建时间排序（取最新目录）
+        mei_dirs_sorted = sorted(
+            mei_dirs,
+            key=lambda x: os.path.getctime(os.path.join(decom_dir, x)),
+            reverse=True
+        )
+        return os.path.join(decom_dir, mei_dirs_sorted[0])
+
+    return os.path.join(decom_dir, str(sys._MEIPASS))
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    """读取布尔型环境变量（1/true/yes/on 为真）"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+if getattr(sys, 'frozen', False):
+    # PyInstaller打包后的临时目录
+    _DATA_DIR = get_mei_dir()
+else:
+    _DATA_DIR = ROOT_DIR
+
+UPLOAD_FOLDER = os.environ.get('CADTOEXCEL_UPLOAD_FOLDER') or os.path.join(_DATA_DIR, 'uploads')
+OUTPUT_FOLDER = os.environ.get('CADTOEXCEL_OUTPUT_FOLDER') or os.path.join(_DATA_DIR, 'outputs')
+TEMP_FOLDER = os.environ.get('CADTOEXCEL_TEMP_FOLDER') or os.path.join(OUTPUT_FOLDER, 'temp')  # 临时存储批处理任务文件
+LOGS_FOLDER = os.path.join(ROOT_DIR, 'logs')
+
+# 对照表和报告模板
+MAPS_FOLDER = os.environ.get('CADTOEXCEL_MAPS_FOLDER') or os.path.join(ROOT_DIR, 'maps')
+APPEARANCE_MAP_FILE = os.path.join(MAPS_FOLDER, 'appearance_map.json')
+THICKNESS_MAP_FILE = os.path.join(MAPS_FOLDER, 'thickness_map.json')
+TEMPLATE_FILE = os.path.join(MAPS_FOLDER, 'report_map.xlsx')
+
+# 是否额外导出解析结果JSON
+EXPORT_JSON = _env_flag('CADTOEXCEL_EXPORT_JSON')
+# 是否保存压缩的原始DWG数据
+SAVE_RAW_DWG = _env_flag('CADTOEXCEL_SAVE_RAW_DWG')
+
+# Web批处理工作进程数
+WORKER_PROCESSES = max(1, int(os.environ.get('CADTOEXCEL_WORKERS') or os.cpu_count() or 1))
+
+# 批处理配对时是否读取工艺流程卡C5单元格图号进行确认
+CONFIRM_DRAWING_NO = _env_flag('CADTOEXCEL_CONFIRM_DRAWING_NO')
+
+# 批处理作业存储
+JOB_DB_FILE = os.environ.get('CADTOEXCEL_JOB_DB') or os.path.join(OUTPUT_FOLDER, 'jobs.sqlite3')
+JOB_LOG_LIMIT = 200  # 每个作业保留的日志条数
+JOB_RETENTION_SECONDS = float(os.environ.get('CADTOEXCEL_JOB_RETENTION_DAYS') or 7) * 24 * 3600
+JOB_STALE_SECONDS = 3600  # 超过该时间没有进展视为已中断（没有记录所属进程的旧作业、遗留的工作目录）
+
+# 上传文件内容库
+CONTENT_STORE_FOLDER = os.environ.get('CADTOEXCEL_CONTENT_STORE') or os.path.join(UPLOAD_FOLDER, 'store')
+
+# 上传和输出目录的容量上限（字节），0表示不限制
+UPLOAD_QUOTA_BYTES = int(float(os.environ.get('CADTOEXCEL_UPLOAD_QUOTA_MB') or 0) * 1024 * 1024)
+OUTPUT_QUOTA_BYTES = int(float(os.environ.get('CADTOEXCEL_OUTPUT_QUOTA_MB') or 0) * 1024 * 1024)
+JANITOR_INTERVAL = float(os.environ.get('CADTOEXCEL_JANITOR_INTERVAL') or 600)
+
+# 检验报告缓存
+REPORT_CACHE = _env_flag('CADTOEXCEL_REPORT_CACHE', default=True)
+REPORT_CACHE_DIRNAME = 'report_cache'
+REPORT_CACHE_DIR = os.environ.get('CADTOEXCEL_REPORT_CACHE_DIR') or os.path.join(OUTPUT_FOLDER, REPORT_CACHE_DIRNAME)
+REPORT_CACHE_MAX_BYTES = int(float(os.environ.get('CADTOEXCEL_REPORT_CACHE_MAX_MB') or 1024) * 1024 * 1024)
+
+# Web服务
+HTTP_WORKERS = max(1, int(os.environ.get('CADTOEXCEL_HTTP_WORKERS') or 1))
+HTTP_THREADS = max(1, int(os.environ.get('CADTOEXCEL_HTTP_THREADS') or 8))
+HTTP_MAX_REQUESTS = max(0, int(os.environ.get('CADTOEXCEL_MAX_REQUESTS') or 0))
+HTTP_SHUTDOWN_TIMEOUT = max(1, int(os.environ.get('CADTOEXCEL_SHUTDOWN_TIMEOUT') or 600))
+
+# 准入控制：超出上限时拒绝新作业，而不是无限排队
+MAX_QUEUED_TASKS = max(0, int(os.environ.get('CADTOEXCEL_MAX_QUEUED_TASKS') or 500))
+MAX_ACTIVE_SINGLE_JOBS = max(0, int(os.environ.get('CADTOEXCEL_MAX_ACTIVE_SINGLE') or 50))
+MAX_JOBS_PER_CLIENT = max(0, int(os.environ.get('CADTOEXCEL_MAX_JOBS_PER_CLIENT') or 3))
+# 反向代理层数：经过代理时所有请求的来源地址都是代理，需按 X-Forwarded-For 区分客户端
+PROXY_COUNT = max(0, int(os.environ.get('CADTOEXCEL_PROXY_COUNT') or 0))
+
+# 性能跟踪
+TRACE = _env_flag('CADTOEXCEL_TRACE')
+PROFILE_MEMORY = _env_flag('CADTOEXCEL_PROFILE_MEMORY')
+MEMORY_THRESHOLD_BYTES = int(float(os.environ.get('CADTOEXCEL_MEMORY_THRESHOLD_MB') or 512) * 1024 * 1024)
+
+
+def ensure_directories() -> None:
+    """确保上传、输出和临时目录存在"""
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+    os.makedirs(TEMP_FOLDER, exist_ok=True)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+将计时段导出为Chrome trace-event JSON
+
+开启跟踪（metrics.recording(trace=True)）后，pipeline 各阶段、报告生成的细分步骤、外部命令和工作簿读写
+都记录为带开始时间、进程和线程的计时段。导出的文件可在 https://ui.perfetto.dev 或 chrome://tracing 中打开，
+同一线程中的计时段按时间嵌套显示，多个工作进程的文件对按进程分行显示。
+"""
+
+import os
+import json
+import logging
+import tempfile
+from typing import Any, Dict, Iterable, List
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+TRACE_FILENAME = 'trace.json'
+
+
+def trace_events(spans: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    将计时段转换为trace事件（完整事件 ph=X，时间单位为微秒），并补充进程和线程名
+
+    Args:
+        spans: metrics.Recorder 收集的计时段
+
+    Returns:
+        List[Dict[str, Any]]: trace事件列表
+    """
+    # 开始时间相同时较长的计时段在前，保证嵌套关系正确
+    spans = sorted(spans, key=lambda item: (item['pid'], item['tid'], item['start'], -item['seconds']))
+
+    events = []
+    processes = set()
+    threads = set()
+    for item in spans:
+        pid, tid = item['pid'], item['tid']
+        if pid not in processes:
+            processes.add(pid)
+            events.append({'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': f"worker {pid}"}})
+        if (pid, tid) not in threads:
+            threads.add((pid, tid))
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': item['thread']}})
+
+        args = dict(item.get('args') or {})
+        if not item['ok']:
+            args['error'] = True
+        events.append({
+            'name': item['name'],
+            'cat': item['category'],
+            'ph': 'X',
+            'ts': round(item['start'] * 1e6),
+            'dur': round(item['seconds'] * 1e6),
+            'pid': pid,
+            'tid': tid,
+            'args': args
+        })
+    return events
+
+
+def write_trace(spans: Iterable[Dict[str, Any]], path: str) -> str:
+    """
+    写入trace文件，先写入临时文件再原子地重命名
+
+    Args:
+        spans: 计时段
+        path: 输出文件路径
+
+    Returns:
+        str: 输出文件路径
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': trace_events(spans), 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    logger.info(f"跟踪文件已保存: {path}")
+    return path
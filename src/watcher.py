@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, Any, Callable, List, Tuple
+
+from src.batch import DWG_EXTENSIONS, EXCEL_EXTENSIONS, is_up_to_date, process_pair, _init_worker
+from src.pairing import pair_files
+from src.pipeline import warm_up
+from src.settings import JOB_STALE_SECONDS, REPORT_CACHE_DIRNAME
+from src.workspace import remove_stale_workspaces
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 等待所有工作进程完成预热的最长时间（秒）
+WARM_UP_TIMEOUT = 300
+
+
+def _init_watch_worker() -> None:
+    """监控模式工作进程初始化：重定向输出并预加载模块和模板"""
+    _init_worker()
+    warm_up()
+
+
+def _warm_up_barrier(barrier) -> int:
+    """
+    预热任务：在屏障处等待，直到每个工作进程都执行了一个预热任务
+
+    工作进程先执行初始化函数（预热）再执行任务，所有任务同时阻塞在屏障处，保证任务分布在不同的进程中，
+    屏障放行时所有进程都已完成预热
+
+    Returns:
+        int: 工作进程的PID
+    """
+    barrier.wait(WARM_UP_TIMEOUT)
+    return os.getpid()
+
+
+class FolderWatcher:
+    """
+    监控共享文件夹，DWG和Excel文件写入完成后自动配对并生成检验报告
+
+    优先使用watchdog（Linux下基于inotify）接收文件变化通知，未安装时退化为定时轮询。
+    两种方式都只用通知唤醒扫描：文件大小和修改时间在 settle_seconds 内保持不变才视为写入完成。
+    """
+
+    def __init__(self, watch_dir: str, output_dir: str, jobs: int = 1, settle_seconds: float = 2.0,
+                 poll_interval: float = 2.0, use_polling: bool = False, export_json: bool = False,
+                 save_raw: bool = False):
+        """
+        Args:
+            watch_dir: 监控目录
+            output_dir: 报告输出目录
+            jobs: 工作进程数
+            settle_seconds: 文件保持不变多久后视为写入完成（秒）
+            poll_interval: 轮询间隔（秒）
+            use_polling: 强制使用轮询
+            export_json: 是否导出解析结果JSON
+            save_raw: 是否保存压缩的原始DWG数据
+        """
+        self.watch_dir = watch_dir
+        self.output_dir = output_dir
+        self.jobs = max(1, jobs)
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.use_polling = use_polling
+        self.export_json = export_json
+        self.save_raw = save_raw
+
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        # 路径 -> (大小, 修改时间, 最近一次变化的时间)
+        self._seen: Dict[str, Tuple[int, int, float]] = {}
+        # (DWG路径, Excel路径) -> 提交时两个文件的修改时间，只包含当前目录中已就绪的文件对
+        self._submitted: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        self._in_flight: Dict[Future, Tuple[str, str]] = {}
+
+    def stop(self) -> None:
+        """停止监控"""
+        self._stopped.set()
+        self._wakeup.set()
+
+    def _start_observer(self):
+        """启动文件变化通知，watchdog不可用时返回None"""
+        if self.use_polling:
+            return None
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            logger.info("未安装watchdog，使用轮询方式监控文件夹")
+            return None
+
+        wakeup = self._wakeup
+
+        class _WakeupHandler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                wakeup.set()
+
+        observer = Observer()
+        observer.schedule(_WakeupHandler(), self.watch_dir, recursive=False)
+        observer.start()
+        logger.info(f"使用文件变化通知监控文件夹: {self.watch_dir}")
+        return observer
+
+    def _scan(self) -> Tuple[List[str], List[str], bool]:
+        """
+        扫描监控目录，找出已写入完成的文件
+
+        Returns:
+            Tuple[List[str], List[str], bool]: (DWG路径列表, Excel路径列表, 是否仍有文件在写入)
+        """
+        now = time.monotonic()
+        dwg_files = []
+        excel_files = []
+        unsettled = False
+        current = set()
+
+        for entry in os.scandir(self.watch_dir):
+            ext = os.path.splitext(entry.name)[1].lower()
+            if ext not in DWG_EXTENSIONS and ext not in EXCEL_EXTENSIONS:
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+
+            current.add(entry.path)
+            previous = self._seen.get(entry.path)
+            if previous is None or previous[:2] != (stat.st_size, stat.st_mtime_ns):
+                self._seen[entry.path] = (stat.st_size, stat.st_mtime_ns, now)
+                unsettled = True
+                continue
+            if stat.st_size == 0 or now - previous[2] < self.settle_seconds:
+                unsettled = True
+                continue
+
+            if ext in DWG_EXTENSIONS:
+                dwg_files.append(entry.path)
+            else:
+                excel_files.append(entry.path)
+
+        # 清理已删除的文件
+        for path in list(self._seen):
+            if path not in current:
+                del self._seen[path]
+
+        return dwg_files, excel_files, unsettled
+
+    def _submit_ready_pairs(self, executor: ProcessPoolExecutor, dwg_files: List[str],
+                            excel_files: List[str]) -> None:
+        """按图号和版本号配对，提交已就绪且需要处理的文件对"""
+        busy = set(self._in_flight.values())
+        pairs, _ = pair_files(dwg_files, excel_files)
+
+        # 只保留当前仍能配对的文件对：文件被删除、正在重写或改为与其他文件配对时不再保留记录
+        current = set(pairs)
+        for pair in [pair for pair in self._submitted if pair not in current]:
+            del self._submitted[pair]
+
+        for pair in pairs:
+            signature = (self._seen[pair[0]][1], self._seen[pair[1]][1])
+            if pair in busy or self._submitted.get(pair) == signature:
+                continue
+            self._submitted[pair] = signature
+            if is_up_to_date(pair[0], pair[1], self.output_dir):
+                continue
+
+            logger.info(f"提交文件对: {os.path.basename(pair[0])} 和 {os.path.basename(pair[1])}")
+            future = executor.submit(process_pair, pair[0], pair[1], self.output_dir, self.export_json, self.save_raw,
+                                     cache_dir=os.path.join(self.output_dir, REPORT_CACHE_DIRNAME))
+            future.add_done_callback(lambda _: self._wakeup.set())
+            self._in_flight[future] = pair
+
+    def _collect_results(self, on_result: Callable[[Dict[str, Any]], None]) -> None:
+        """收集已完成的任务结果"""
+        for future in [f for f in self._in_flight if f.done()]:
+            dwg_file, excel_file = self._in_flight.pop(future)
+            try:
+                record = future.result()
+            except Exception as e:
+                record = {
+                    "dwg": dwg_file,
+                    "excel": excel_file,
+                    "status": "error",
+                    "error": f"工作进程异常: {e}",
+                    "duration": 0.0
+                }
+            on_result(record)
+
+    def run(self, on_result: Callable[[Dict[str, Any]], None]) -> None:
+        """
+        持续监控文件夹直到调用 stop()
+
+        Args:
+            on_result: 每个文件对处理完成后的回调，参数为结果记录
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        remove_stale_workspaces(self.output_dir, JOB_STALE_SECONDS)
+
+        with ProcessPoolExecutor(max_workers=self.jobs, initializer=_init_watch_worker) as executor:
+            # 提前启动并预热所有工作进程：单个任务可能被同一个进程连续取走，用屏障使每个进程各执行一个
+            with multiprocessing.Manager() as manager:
+                barrier = manager.Barrier(self.jobs)
+                try:
+                    pids = {future.result() for future in
+                            [executor.submit(_warm_up_barrier, barrier) for _ in range(self.jobs)]}
+                    logger.info(f"已启动 {len(pids)} 个预热的工作进程")
+                except threading.BrokenBarrierError:
+                    logger.warning(f"等待工作进程预热超时（{WARM_UP_TIMEOUT}秒），继续监控")
+
+            observer = self._start_observer()
+            try:
+                while not self._stopped.is_set():
+                    dwg_files, excel_files, unsettled = self._scan()
+                    self._submit_ready_pairs(executor, dwg_files, excel_files)
+                    self._collect_results(on_result)
+
+                    # 有通知时，仅在仍有文件写入时才定时复查；否则等待下一次通知
+                    if observer is not None and not unsettled:
+                        timeout = None
+                    elif observer is not None:
+                        timeout = self.settle_seconds
+                    else:
+                        timeout = self.poll_interval
+                    self._wakeup.wait(timeout)
+                    self._wakeup.clear()
+            finally:
+                if observer is not None:
+                    observer.stop()
+                    observer.join()
+                for future in list(self._in_flight):
+                    future.cancel()
@@ -5,21 +5,29 @@ import os
 import sys
 import uuid
 import logging
-import threading
 import time
-import zipfile
 import glob
 import json
 import shutil
+import threading
 import traceback
-from typing import Dict, List, Any, Tuple, Optional
-from flask import Flask, render_template, request, send_file, redirect, url_for, flash, jsonify, session, send_from_directory
+from typing import Dict, List, Any
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, jsonify, session, send_from_directory
 from werkzeug.utils import secure_filename
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 # 设置项目根目录
 ROOT_DIR = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
 sys.path.insert(0, ROOT_DIR)
 
+from src.settings import (
+    UPLOAD_FOLDER, OUTPUT_FOLDER, TEMP_FOLDER,
+    EXPORT_JSON, SAVE_RAW_DWG, WORKER_PROCESSES, JOB_DB_FILE, JOB_LOG_LIMIT, JOB_RETENTION_SECONDS,
+    JOB_STALE_SECONDS, CONFIRM_DRAWING_NO, CONTENT_STORE_FOLDER, UPLOAD_QUOTA_BYTES, OUTPUT_QUOTA_BYTES, JANITOR_INTERVAL,
+    MAX_QUEUED_TASKS, MAX_ACTIVE_SINGLE_JOBS, MAX_JOBS_PER_CLIENT, PROXY_COUNT, TRACE, PROFILE_MEMORY, MEMORY_THRESHOLD_BYTES,
+    HTTP_THREADS, ensure_directories
+)
+
 # 确保日志目录存在
 logs_dir = os.path.join(ROOT_DIR, 'logs')
 os.makedirs(logs_dir, exist_ok=True)
@@ -40,61 +48,124 @@ app = Flask(__name__, template_folder='../web/templates', static_folder='../web/
 app.secret_key = 'CADtoExcel-secret-key'
 app.config['SESSION_TYPE'] = 'filesystem'
 
+# 部署在反向代理之后时，按代理添加的 X-Forwarded-For/X-Forwarded-Proto 还原客户端地址和协议，
+# 否则所有客户端共用代理的地址，按客户端限制的作业数会变成全站的限制
+if PROXY_COUNT:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_COUNT, x_proto=PROXY_COUNT)
+
 # 配置文件上传
-UPLOAD_FOLDER = os.path.join(ROOT_DIR, 'uploads')
 ALLOWED_EXTENSIONS_DWG = {'dwg'}
 ALLOWED_EXTENSIONS_EXCEL = {'xls', 'xlsx'}
-OUTPUT_FOLDER = os.path.join(ROOT_DIR, 'outputs')
-TEMP_FOLDER = os.path.join(ROOT_DIR, 'outputs', 'temp')  # 临时存储批处理任务文件
-
-
-def get_mei_dir() -> str:
-    """动态获取 PyInstaller 解压目录（_MEIxxxxxx）"""
-    decom_dir = os.environ.get('TEMP') or os.getcwd()
-    if not hasattr(sys, '_MEIPASS'):
-        mei_dirs = [
-            d for d in os.listdir(decom_dir)
-            if d.startswith('_MEI') and os.path.isdir(os.path.join(decom_dir, d))
-        ]
-
-        if not mei_dirs:
-            raise FileNotFoundError("PyInstaller 解压目录未找到 (_MEI*)")
-
-        # 按创建时间排序（取最新目录）
-        mei_dirs_sorted = sorted(
-            mei_dirs,
-            key=lambda x: os.path.getctime(os.path.join(decom_dir, x)),
-            reverse=True
-        )
-        return os.path.join(decom_dir, mei_dirs_sorted[0])
-
-    return os.path.join(decom_dir, str(sys._MEIPASS))
-
-
-if getattr(sys, 'frozen', False):
-    # PyInstaller打包后的临时目录
-    UPLOAD_FOLDER = os.path.join(get_mei_dir(), 'uploads')
-    OUTPUT_FOLDER = os.path.join(get_mei_dir(), 'outputs')
-    TEMP_FOLDER = os.path.join(get_mei_dir(), 'outputs', 'temp')
 
 # 确保目录存在
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(OUTPUT_FOLDER, exist_ok=True)
-os.makedirs(TEMP_FOLDER, exist_ok=True)
+ensure_directories()
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['OUTPUT_FOLDER'] = OUTPUT_FOLDER
 app.config['TEMP_FOLDER'] = TEMP_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 限制上传文件大小为100MB
-
-# 存储批处理任务状态
-batch_jobs = {}
+app.config['EXPORT_JSON'] = EXPORT_JSON  # 是否额外导出解析结果JSON
+app.config['SAVE_RAW_DWG'] = SAVE_RAW_DWG  # 是否保存压缩的原始DWG数据
+app.config['WORKER_PROCESSES'] = WORKER_PROCESSES  # 批处理工作进程数
+app.config['CONFIRM_DRAWING_NO'] = CONFIRM_DRAWING_NO  # 配对时是否确认C5单元格图号
+app.config['TRACE'] = TRACE  # 是否为每个作业保存trace.json
+app.config['PROFILE_MEMORY'] = PROFILE_MEMORY  # 是否记录各阶段的内存
+app.config['MEMORY_THRESHOLD'] = MEMORY_THRESHOLD_BYTES  # 内存分析时标记文件对的阈值（字节）
+
+# 每页显示的批处理作业数
+JOBS_PER_PAGE = 20
+
+# 进度推送（SSE）检查作业状态的间隔和心跳间隔（秒）
+PROGRESS_POLL_INTERVAL = 0.5
+PROGRESS_HEARTBEAT_INTERVAL = 15
+
+# 每个进度推送连接占用一个请求线程：每个服务进程最多同时推送的连接数（超出时页面改为轮询），
+# 单个连接的最长时间（秒，到期后浏览器按 retry 毫秒后自动重连，通过 Last-Event-ID 继续接收）
+MAX_PROGRESS_STREAMS = max(1, HTTP_THREADS // 2)
+PROGRESS_STREAM_LIFETIME = 300
+PROGRESS_RETRY_MS = 3000
+progress_streams = threading.BoundedSemaphore(MAX_PROGRESS_STREAMS)
+
+# 拒绝新作业时建议客户端重试的等待时间（秒）
+RETRY_AFTER_SECONDS = 30
 
 # 导入自定义模块
-from src.excel_parser import parse_excel_file, save_excel_data_to_json
-from src.dwg_parser import parse_dwg_file, save_dwg_data_to_json, convert_dwg_to_dxf
-from src.report_generator import generate_template_report
-from src.extract_excel_cell import extract_product_info_direct
+from src.batch import process_pair
+from src.pairing import pair_files
+from src.dwg_parser import convert_dwg_to_dxf
+from src.scheduler import JobScheduler
+from src.zip_stream import iter_zip, unique_arc_names
+from src.job_store import ACTIVE_STATUSES, FINISHED_STATUSES, KIND_BATCH, KIND_SINGLE, JobStore
+from src.janitor import AREA_OUTPUTS, AREA_TEMP, AREA_UPLOADS, Janitor, dir_size, shard_path
+from src.content_store import ContentStore, is_digest
+from src import metrics
+from src.tracing import TRACE_FILENAME, write_trace
+
+# 所有作业共用的调度器和工作进程池，有多个工作进程时为单文件作业保留一个
+scheduler = JobScheduler(app.config['WORKER_PROCESSES'], reserved_slots=1 if app.config['WORKER_PROCESSES'] > 1 else 0)
+
+# 批处理作业状态存储，所属服务进程已退出（如重启前）的未完成作业标记为失败
+job_store = JobStore(JOB_DB_FILE, log_limit=JOB_LOG_LIMIT)
+job_store.expire_stale(JOB_STALE_SECONDS)
+
+# 按保留期限和容量上限清理上传和输出目录，并定期将服务进程退出后中断的作业标记为失败
+janitor = Janitor(
+    job_store,
+    JOB_RETENTION_SECONDS,
+    quotas={AREA_UPLOADS: UPLOAD_QUOTA_BYTES, AREA_OUTPUTS: OUTPUT_QUOTA_BYTES},
+    interval=JANITOR_INTERVAL,
+    stale_seconds=JOB_STALE_SECONDS
+)
+
+# 上传文件内容库，按SHA-256去重
+content_store = ContentStore(CONTENT_STORE_FOLDER)
+MAX_CHECK_DIGESTS = 1000  # 一次握手最多查询的摘要数
+
+def start_background_tasks():
+    """
+    启动后台清理线程
+    
+    不在导入时启动：多进程服务在fork之前导入本模块，线程不会被复制到子进程，由每个子进程启动后调用
+    """
+    janitor.start()
+
+def client_id():
+    """提交作业的客户端标识（IP地址，经过反向代理时需设置 CADTOEXCEL_PROXY_COUNT），用于限制每个客户端同时进行的作业数"""
+    return request.remote_addr or 'unknown'
+
+def reject(status, message, retry_after=RETRY_AFTER_SECONDS):
+    """拒绝新作业：返回繁忙页面和 Retry-After 头"""
+    response = app.make_response((render_template('busy.html', message=message, retry_after=retry_after), status))
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+@app.before_request
+def admission_control():
+    """
+    准入控制：在读取上传内容之前检查负载，超出上限时立即拒绝，而不是让作业无限排队
+    
+    - 同一客户端进行中的作业数达到上限时返回429
+    - 批处理：所有服务进程排队和处理中的文件对总数达到上限时返回503
+    - 单文件：进行中的单文件作业数达到上限时返回503（单文件作业使用优先通道，不受批处理积压影响）
+    """
+    if request.method != 'POST' or request.endpoint not in ('upload_file', 'batch_upload'):
+        return None
+    
+    if MAX_JOBS_PER_CLIENT and job_store.count_active(client=client_id()) >= MAX_JOBS_PER_CLIENT:
+        logger.warning(f"客户端 {client_id()} 进行中的作业数已达上限 {MAX_JOBS_PER_CLIENT}，拒绝新作业")
+        return reject(429, f"您已有 {MAX_JOBS_PER_CLIENT} 个作业正在处理，请等待完成后再提交。")
+    
+    if request.endpoint == 'batch_upload':
+        depth = job_store.queue_depth()
+        if MAX_QUEUED_TASKS and depth >= MAX_QUEUED_TASKS:
+            logger.warning(f"排队中的文件对 {depth} 个，已达上限 {MAX_QUEUED_TASKS}，拒绝新的批处理作业")
+            return reject(503, f"服务器繁忙，当前有 {depth} 个文件对等待处理，请稍后再提交。")
+    else:
+        active = job_store.count_active(kind=KIND_SINGLE)
+        if MAX_ACTIVE_SINGLE_JOBS and active >= MAX_ACTIVE_SINGLE_JOBS:
+            logger.warning(f"进行中的单文件作业 {active} 个，已达上限 {MAX_ACTIVE_SINGLE_JOBS}，拒绝新作业")
+            return reject(503, "服务器繁忙，请稍后再提交。")
+    return None
 
 def allowed_file_dwg(filename):
     """检查是否是允许的DWG文件扩展名"""
@@ -114,292 +185,312 @@ def product_intro():
     """产品介绍页面"""
     return render_template('product_intro.html')
 
-@app.route('/upload', methods=['POST'])
-def upload_file():
-    """处理单个文件上传"""
-    # 检查是否有文件
-    if 'dwg_file' not in request.files or 'excel_file' not in request.files:
-        flash('没有选择文件')
-        return redirect(request.url)
+@app.route('/upload/check', methods=['POST'])
+def upload_check():
+    """
+    上传握手：客户端提交所选文件的SHA-256摘要，返回内容库中没有、需要上传的摘要
     
-    dwg_file = request.files['dwg_file']
-    excel_file = request.files['excel_file']
+    请求体为 {"digests": [...]}，返回 {"missing": [...]}
+    """
+    digests = (request.get_json(silent=True) or {}).get('digests')
+    if not isinstance(digests, list) or len(digests) > MAX_CHECK_DIGESTS or not all(is_digest(d) for d in digests):
+        return jsonify({'error': '无效的摘要列表'}), 400
+    return jsonify({'missing': content_store.missing(digests)})
+
+def receive_uploads(targets):
+    """
+    保存上传的文件，支持摘要握手
     
-    # 如果用户未选择文件
-    if dwg_file.filename == '' or excel_file.filename == '':
-        flash('没有选择文件')
-        return redirect(request.url)
+    所有上传的文件先存入内容库，再链接到作业目录。表单带有 manifest（JSON列表，每项包含 field、name、digest）时，
+    manifest 列出所选的全部文件，请求中只包含握手时内容库里没有的文件，其余文件直接从内容库取得；
+    没有 manifest 时（浏览器不支持摘要计算）按普通表单上传处理
+    
+    Args:
+        targets: 表单字段 -> (保存目录, 文件类型检查函数)
+    
+    Returns:
+        Dict[str, List[str]]: 表单字段 -> 保存的文件路径列表
     
+    Raises:
+        ValueError: manifest 无效，或引用的文件不在内容库中
+    """
+    uploaded = []
+    for field in targets:
+        for upload in request.files.getlist(field):
+            if upload and upload.filename:
+                digest, size = content_store.add(upload.stream)
+                job_store.register_dir(digest, AREA_UPLOADS, content_store.path(digest), size)
+                uploaded.append((field, upload.filename, digest))
+    
+    manifest = request.form.get('manifest')
+    if manifest:
+        try:
+            entries = [(item['field'], item['name'], item['digest']) for item in json.loads(manifest)]
+        except (ValueError, TypeError, KeyError) as e:
+            raise ValueError(f"无效的文件清单: {e}")
+        logger.info(f"上传握手：清单中 {len(entries)} 个文件，实际上传 {len(uploaded)} 个")
+    else:
+        entries = uploaded
+    
+    saved = {field: [] for field in targets}
+    for field, name, digest in entries:
+        if field not in targets:
+            continue
+        folder, allowed = targets[field]
+        filename = secure_filename(name)
+        if not filename or not allowed(name):
+            continue
+        try:
+            path = content_store.materialize(digest, os.path.join(folder, filename))
+        except (FileNotFoundError, ValueError):
+            raise ValueError(f"文件 {name} 的内容未上传或已被清理，请重新提交")
+        job_store.touch_dirs(digest)
+        saved[field].append(path)
+    return saved
+
+def upload_redirect(location):
+    """
+    上传结束后跳转到指定页面
+    
+    去重上传脚本（带 manifest 的表单）通过fetch提交，若返回重定向，fetch会在后台跟随并渲染目标页面，
+    flash消息在这次不可见的渲染中被消耗；因此对脚本返回JSON，由脚本跳转
+    """
+    if request.form.get('manifest'):
+        return jsonify({'redirect': location})
+    return redirect(location)
+
+@app.route('/upload', methods=['POST'])
+def upload_file():
+    """处理单个文件上传"""
     # 创建一个唯一的会话ID
     session_id = str(uuid.uuid4())
-    session_folder = os.path.join(app.config['UPLOAD_FOLDER'], session_id)
+    session_folder = shard_path(app.config['UPLOAD_FOLDER'], session_id)
     os.makedirs(session_folder, exist_ok=True)
     
-    if dwg_file and allowed_file_dwg(dwg_file.filename) and excel_file and allowed_file_excel(excel_file.filename):
-        # 安全地获取文件名
-        dwg_filename = secure_filename(dwg_file.filename)
-        excel_filename = secure_filename(excel_file.filename)
-        
-        # 保存上传的文件
-        dwg_path = os.path.join(session_folder, dwg_filename)
-        excel_path = os.path.join(session_folder, excel_filename)
-        
-        dwg_file.save(dwg_path)
-        excel_file.save(excel_path)
-        
-        logger.info(f"文件保存成功: {dwg_path} 和 {excel_path}")
-        
-        try:
-            # 处理文件
-            dwg_json_path, excel_json_path, report_path = process_files(dwg_path, excel_path)
-            
-            # 获取结果文件名并传递给模板
-            dwg_json_name = os.path.basename(dwg_json_path)
-            excel_json_name = os.path.basename(excel_json_path)
-            report_name = os.path.basename(report_path)
-            
-            logger.info(f"生成的文件: {dwg_json_name}, {excel_json_name}, {report_name}")
-            
-            # 渲染结果页面
-            return render_template(
-                'result.html',
-                success=True,
+    # 保存上传的文件（内容库中已有的文件无需再次上传）
+    try:
+        saved = receive_uploads({
+            'dwg_file': (session_folder, allowed_file_dwg),
+            'excel_file': (session_folder, allowed_file_excel)
+        })
+    except ValueError as e:
+        shutil.rmtree(session_folder, ignore_errors=True)
+        flash(str(e))
+        return upload_redirect(url_for('index'))
+    
+    if not saved['dwg_file'] or not saved['excel_file']:
+        shutil.rmtree(session_folder, ignore_errors=True)
+        flash('没有选择文件，或文件类型不支持（仅支持.dwg和.xls/.xlsx）')
+        return upload_redirect(url_for('index'))
+    
+    dwg_path = saved['dwg_file'][0]
+    excel_path = saved['excel_file'][0]
+    logger.info(f"文件保存成功: {dwg_path} 和 {excel_path}")
+    
+    # 加入处理队列，立即返回，由结果页面等待处理完成
+    try:
+        submit_single_job(session_id, dwg_path, excel_path)
+        job_store.register_dir(session_id, AREA_UPLOADS, session_folder, dir_size(session_folder, skip_linked=True))
+    except Exception as e:
+        logger.error(f"提交处理任务时出错: {e}")
+        logger.error(traceback.format_exc())
+        flash(f"处理文件时出错: {str(e)}")
+        return upload_redirect(url_for('index'))
+    
+    return upload_redirect(url_for('upload_status', job_id=session_id))
+
+def save_trace(spans, output_folder):
+    """将作业的计时段保存为输出目录中的 trace.json，可通过 /download/<作业ID>/trace.json 下载"""
+    try:
+        write_trace(spans, os.path.join(output_folder, TRACE_FILENAME))
+    except OSError as e:
+        logger.warning(f"保存跟踪文件失败: {e}")
+
+def pair_task(dwg_path, excel_path, output_folder):
+    """process_pair 的参数（按配置导出JSON、跟踪和内存分析）"""
+    return (
+        dwg_path, excel_path, output_folder, app.config['EXPORT_JSON'], app.config['SAVE_RAW_DWG'], True,
+        app.config['TRACE'], app.config['PROFILE_MEMORY'], app.config['MEMORY_THRESHOLD']
+    )
+
+def submit_single_job(job_id, dwg_path, excel_path):
+    """
+    将单个文件对作为作业提交到调度器
+    
+    与批处理作业共用工作进程池，但使用优先通道：先于批处理作业开始，并可使用保留的工作进程。
+    结果文件写入 <输出目录>/<分片>/<作业ID>，文件名保存在作业的 result 字段中
+    
+    Args:
+        job_id: 作业ID（与上传目录同名）
+        dwg_path: DWG文件路径
+        excel_path: Excel文件路径
+    """
+    # 每个作业使用独立的输出目录，同名图纸的作业互不覆盖
+    output_folder = shard_path(app.config['OUTPUT_FOLDER'], job_id)
+    job_store.create_job(job_id, kind=KIND_SINGLE, total=1, output_folder=output_folder, client=client_id())
+    job_store.register_dir(job_id, AREA_OUTPUTS, output_folder)
+    
+    def on_start():
+        job_store.update_job(job_id, status='processing')
+    
+    def on_result(args, record, error):
+        if error is None and app.config['TRACE']:
+            save_trace(record.get('spans') or (), output_folder)
+        job_store.set_dir_size(output_folder, dir_size(output_folder))
+        job_store.increment_metrics(metrics.record_samples(record if error is None else None, KIND_SINGLE))
+        timings = metrics.summarize(record.get('spans') or ()) if error is None else {}
+        if error is None and record['status'] == 'success':
+            job_store.increment(job_id, processed=1, success=1)
+            job_store.update_job(
+                job_id,
+                status='completed',
+                end_time=time.time(),
                 message="文件处理成功！已生成检验报告。",
-                dwg_file=dwg_filename,
-                excel_file=excel_filename, 
-                dwg_json=dwg_json_name, 
-                excel_json=excel_json_name, 
-                report_file=report_name
+                result={
+                    'dwg_file': os.path.basename(dwg_path),
+                    'excel_file': os.path.basename(excel_path),
+                    'report_file': os.path.basename(record['report']),
+                    'dwg_json': os.path.basename(record['dwg_json']) if record['dwg_json'] else None,
+                    'excel_json': os.path.basename(record['excel_json']) if record['excel_json'] else None,
+                    'timings': timings,
+                    'memory': record.get('memory')
+                }
             )
-        except Exception as e:
-            logger.error(f"处理文件时出错: {e}")
-            logger.error(traceback.format_exc())
-            flash(f"处理文件时出错: {str(e)}")
-            return redirect(url_for('index'))
-    else:
-        flash('不支持的文件类型，仅支持.dwg和.xls/.xlsx')
+            logger.info(f"生成的文件: {os.path.basename(record['report'])}")
+        else:
+            reason = f"工作进程异常: {error}" if error is not None else record.get('error')
+            job_store.increment(job_id, processed=1, error=1)
+            job_store.update_job(
+                job_id,
+                status='failed',
+                end_time=time.time(),
+                message=f"处理文件时出错: {reason}",
+                result={'timings': timings, 'memory': record.get('memory') if error is None else None}
+            )
+            logger.error(f"处理文件 {dwg_path} 和 {excel_path} 时出错: {reason}")
+    
+    scheduler.submit(
+        job_id,
+        process_pair,
+        [pair_task(dwg_path, excel_path, output_folder)],
+        on_result,
+        on_start=on_start,
+        priority=True
+    )
+
+@app.route('/upload/status/<job_id>')
+def upload_status(job_id):
+    """单文件处理结果页面，处理完成前显示等待页面"""
+    job = job_store.get_job(job_id)
+    if job is None or job['kind'] != KIND_SINGLE:
+        flash('无效的任务ID')
         return redirect(url_for('index'))
+    
+    if job['status'] in ACTIVE_STATUSES:
+        return render_template('upload_status.html', job=job)
+    
+    result = job['result'] or {}
+    return render_template(
+        'result.html',
+        success=job['status'] == 'completed',
+        message=job['message'],
+        job_id=job_id,
+        dwg_file=result.get('dwg_file'),
+        excel_file=result.get('excel_file'),
+        dwg_json=result.get('dwg_json'),
+        excel_json=result.get('excel_json'),
+        report_file=result.get('report_file')
+    )
 
 @app.route('/batch')
 def batch_page():
-    """批量处理页面"""
+    """批量处理页面，已结束的作业分页显示"""
+    page = max(1, request.args.get('page', 1, type=int))
+    finished_count = job_store.count_jobs(FINISHED_STATUSES)
+    page_count = max(1, (finished_count + JOBS_PER_PAGE - 1) // JOBS_PER_PAGE)
+    page = min(page, page_count)
+    
     # 获取正在进行的批处理任务
-    active_jobs = {job_id: job for job_id, job in batch_jobs.items() if job['status'] != 'completed'}
-    completed_jobs = {job_id: job for job_id, job in batch_jobs.items() if job['status'] == 'completed'}
+    active_jobs = job_store.list_jobs(ACTIVE_STATUSES, limit=JOBS_PER_PAGE)
+    completed_jobs = job_store.list_jobs(FINISHED_STATUSES, limit=JOBS_PER_PAGE, offset=(page - 1) * JOBS_PER_PAGE)
     
-    return render_template('batch.html', active_jobs=active_jobs, completed_jobs=completed_jobs)
+    return render_template(
+        'batch.html',
+        active_jobs=active_jobs,
+        completed_jobs=completed_jobs,
+        page=page,
+        page_count=page_count
+    )
 
 @app.route('/batch/upload', methods=['POST'])
 def batch_upload():
     """处理批量文件上传"""
-    # 检查是否有文件
-    if 'dwg_files' not in request.files or 'excel_files' not in request.files:
-        flash('没有选择文件')
-        return redirect(url_for('batch_page'))
-    
-    dwg_files = request.files.getlist('dwg_files')
-    excel_files = request.files.getlist('excel_files')
-    
-    # 如果用户未选择文件
-    if not dwg_files or not excel_files:
-        flash('请同时上传DWG文件和Excel文件')
-        return redirect(url_for('batch_page'))
-    
     # 创建一个唯一的批处理作业ID
     job_id = str(uuid.uuid4())
-    job_folder = os.path.join(app.config['TEMP_FOLDER'], job_id)
+    job_folder = shard_path(app.config['TEMP_FOLDER'], job_id)
     dwg_folder = os.path.join(job_folder, 'dwg')
     excel_folder = os.path.join(job_folder, 'excel')
     
     os.makedirs(dwg_folder, exist_ok=True)
     os.makedirs(excel_folder, exist_ok=True)
     
-    # 保存DWG文件
-    dwg_filenames = []
-    for dwg_file in dwg_files:
-        if dwg_file and allowed_file_dwg(dwg_file.filename):
-            filename = secure_filename(dwg_file.filename)
-            file_path = os.path.join(dwg_folder, filename)
-            dwg_file.save(file_path)
-            logger.info(f"====>保存DWG文件: {file_path}")
-            dwg_filenames.append(filename)
-    
-    # 保存Excel文件
-    excel_filenames = []
-    for excel_file in excel_files:
-        if excel_file and allowed_file_excel(excel_file.filename):
-            filename = secure_filename(excel_file.filename)
-            file_path = os.path.join(excel_folder, filename)
-            excel_file.save(file_path)
-            excel_filenames.append(filename)
+    # 保存上传的文件（内容库中已有的文件无需再次上传）
+    try:
+        saved = receive_uploads({
+            'dwg_files': (dwg_folder, allowed_file_dwg),
+            'excel_files': (excel_folder, allowed_file_excel)
+        })
+    except ValueError as e:
+        shutil.rmtree(job_folder, ignore_errors=True)
+        flash(str(e))
+        return upload_redirect(url_for('batch_page'))
+    
+    dwg_filenames = [os.path.basename(path) for path in saved['dwg_files']]
+    excel_filenames = [os.path.basename(path) for path in saved['excel_files']]
+    logger.info(f"保存DWG文件 {len(dwg_filenames)} 个，Excel文件 {len(excel_filenames)} 个")
     
     if not dwg_filenames or not excel_filenames:
+        shutil.rmtree(job_folder, ignore_errors=True)
         flash('没有有效的文件被上传')
-        return redirect(url_for('batch_page'))
+        return upload_redirect(url_for('batch_page'))
     
     # 创建批处理作业
-    batch_jobs[job_id] = {
-        'id': job_id,
-        'status': 'pending',
-        'start_time': time.time(),
-        'end_time': None,
-        'total': 0,
-        'processed': 0,
-        'success': 0,
-        'error': 0,
-        'logs': []
-    }
-    
-    # 启动后台线程处理批处理作业
-    thread = threading.Thread(target=process_batch_job, args=(job_id,))
-    thread.daemon = True
-    thread.start()
-    
-    return redirect(url_for('batch_status', job_id=job_id))
-
-def process_files(dwg_file: str, excel_file: str) -> Tuple[str, str, str]:
-    """
-    处理DWG和Excel文件，生成报告
-    
-    Args:
-        dwg_file: DWG文件路径
-        excel_file: Excel文件路径
-        
-    Returns:
-        Tuple[str, str, str]: 包含DWG JSON路径、Excel JSON路径和报告路径的元组
-    """
-    logger.info(f"开始处理文件: {dwg_file} 和 {excel_file}")
-    
-    # 获取基础文件名，用于生成输出文件
-    base_name = os.path.splitext(os.path.basename(dwg_file))[0]
-    
-    # 确保输出目录存在
-    output_dir = os.path.join(app.config['OUTPUT_FOLDER'])
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # 解析DWG文件并生成JSON
-    logger.info(f"解析DWG文件: {dwg_file}")
-    try:
-        dwg_data, dwg_raw_data = parse_dwg_file(dwg_file)
-        dwg_json_path = os.path.join(output_dir, f"{base_name}_dwg.json")
-        dwg_raw_json_path = os.path.join(output_dir, f"{base_name}_dwg_raw_data.json")
-        
-        # 保存DWG数据
-        with open(dwg_json_path, 'w', encoding='utf-8') as f:
-            json.dump(dwg_data, f, ensure_ascii=False, indent=2)
-        
-        # 保存原始DWG数据 - 如果解析成功
-        if dwg_raw_data:
-            with open(dwg_raw_json_path, 'w', encoding='utf-8') as f:
-                json.dump(dwg_raw_data, f, ensure_ascii=False, indent=2)
-        else:
-            # 如果原始数据为空，创建一个简化的数据结构
-            logger.warning("原始DWG数据为空，将创建简化的数据结构")
-            with open(dwg_raw_json_path, 'w', encoding='utf-8') as f:
-                json.dump({"source": "raw_data_not_available", "parsed_data": dwg_data}, f, ensure_ascii=False, indent=2)
-        
-        logger.info(f"DWG JSON数据已保存: {dwg_json_path} 和 {dwg_raw_json_path}")
-    except Exception as e:
-        logger.error(f"解析DWG文件时出错: {e}")
-        logger.error(traceback.format_exc())
-        raise
-    
-    # 解析Excel文件并生成JSON
-    logger.info(f"解析Excel文件: {excel_file}")
-    try:
-        excel_data = parse_excel_file(excel_file)
-        excel_json_path = os.path.join(output_dir, f"{base_name}_excel.json")
-        
-        # 保存Excel数据
-        with open(excel_json_path, 'w', encoding='utf-8') as f:
-            json.dump(excel_data, f, ensure_ascii=False, indent=2)
-        
-        logger.info(f"Excel JSON数据已保存: {excel_json_path}")
-    except Exception as e:
-        logger.error(f"解析Excel文件时出错: {e}")
-        logger.error(traceback.format_exc())
-        raise
+    job_store.create_job(job_id, kind=KIND_BATCH, client=client_id())
+    job_store.register_dir(job_id, AREA_TEMP, job_folder, dir_size(job_folder, skip_linked=True))
     
-    # 生成报告
-    logger.info(f"生成检验报告")
-    try:
-        # 获取外观要求对照表
-        appearance_map_file = os.path.join(ROOT_DIR, 'maps', 'appearance_map.json')
-        template_file = os.path.join(ROOT_DIR, 'maps', 'report_map.xlsx')
-        
-        # 生成报告
-        report_path = generate_template_report(
-            dwg_json_path, 
-            excel_json_path, 
-            appearance_map_file, 
-            template_file,
-            output_dir,
-            original_excel_file=excel_file
-        )
-        
-        logger.info(f"报告已生成: {report_path}")
-    except Exception as e:
-        logger.error(f"生成报告时出错: {e}")
-        logger.error(traceback.format_exc())
-        raise
+    # 配对文件并提交到调度器
+    process_batch_job(job_id)
     
-    return dwg_json_path, excel_json_path, report_path
-
-def create_zip_file(folder_path, file_list, zip_path):
-    """
-    创建包含指定文件的ZIP文件
-    
-    Args:
-        folder_path: 文件夹路径，如果为None则file_list包含完整的文件路径
-        file_list: 要包含的文件列表
-        zip_path: 输出ZIP文件路径
-    """
-    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        for file in file_list:
-            if folder_path:
-                # 如果提供了文件夹路径，则file是相对路径
-                file_path = os.path.join(folder_path, file)
-                arc_name = file
-            else:
-                # 否则file是完整路径
-                file_path = file
-                arc_name = os.path.basename(file)
-            
-            try:
-                zipf.write(file_path, arc_name)
-                logger.info(f"已添加文件到ZIP: {file_path}")
-            except Exception as e:
-                logger.error(f"添加文件到ZIP时出错: {file_path}, 错误: {e}")
+    return upload_redirect(url_for('batch_status', job_id=job_id))
 
 def process_batch_job(job_id):
     """
-    处理批处理作业
+    配对批处理作业的文件并提交到调度器
+    
+    文件对在共用的工作进程池中并行处理，结果由调度器的回调线程依次写回作业状态，
+    所有文件对完成后清理临时目录
     
     Args:
         job_id: 作业ID
     """
-    if job_id not in batch_jobs:
+    job = job_store.get_job(job_id)
+    if job is None:
         logger.error(f"无效的作业ID: {job_id}")
         return
     
-    job = batch_jobs[job_id]
-    job['status'] = 'processing'
-    job['processed'] = 0
-    job['success'] = 0
-    job['error'] = 0
-    job['start_time'] = time.time()
-    job['logs'] = []
-    
     # 创建输出目录
-    job_output_dir = os.path.join(app.config['OUTPUT_FOLDER'], f"batch_{job_id}")
+    job_output_dir = shard_path(app.config['OUTPUT_FOLDER'], job_id, f"batch_{job_id}")
+    job_temp_dir = shard_path(app.config['TEMP_FOLDER'], job_id)
     os.makedirs(job_output_dir, exist_ok=True)
-    job['output_folder'] = job_output_dir
+    job_store.update_job(job_id, output_folder=job_output_dir)
+    job_store.register_dir(job_id, AREA_OUTPUTS, job_output_dir)
+    
+    # 开启跟踪时收集所有文件对的计时段，作业完成后写入 trace.json
+    trace_spans = []
     
     def log_message(message, level='info'):
         """记录日志消息"""
-        timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
-        log_entry = f"[{timestamp}] {message}"
-        job['logs'].append(log_entry)
+        job_store.append_log(job_id, message, level)
         if level == 'info':
             logger.info(message)
         elif level == 'error':
@@ -407,11 +498,72 @@ def process_batch_job(job_id):
         elif level == 'warning':
             logger.warning(message)
     
+    def fail_job(e):
+        """作业失败"""
+        job_store.update_job(job_id, status='failed', end_time=time.time(), message=str(e))
+        log_message(f"批处理作业失败: {str(e)}", level='error')
+        logger.error(traceback.format_exc())
+    
+    def on_start():
+        """第一个文件对开始处理"""
+        job_store.update_job(job_id, status='processing')
+        log_message("开始处理文件对")
+    
+    def on_result(args, record, error):
+        """一个文件对处理完成"""
+        dwg_file, excel_file = args[0], args[1]
+        job_store.increment_metrics(metrics.record_samples(record if error is None else None, KIND_BATCH))
+        if error is None and app.config['TRACE']:
+            trace_spans.extend(record.get('spans') or ())
+        if error is None:
+            # 作业记录中按阶段累计各文件对的耗时
+            result = job_store.get_job(job_id)['result'] or {}
+            result['timings'] = metrics.merge_timings(result.get('timings'), record.get('spans') or ())
+            memory = record.get('memory')
+            if memory:
+                # 记录各文件对中最大的阶段峰值，以及超过阈值的图纸
+                result['memory_peak'] = max(result.get('memory_peak', 0), memory['peak'])
+                if memory['over_threshold']:
+                    result.setdefault('memory_flagged', []).append(os.path.basename(dwg_file))
+                    log_message(
+                        f"图纸 {os.path.basename(dwg_file)} 处理时内存超过阈值，阶段峰值: {memory['peak'] / 1048576:.1f} MB",
+                        level='warning'
+                    )
+            job_store.update_job(job_id, result=result)
+        if error is None and record['status'] == 'success':
+            job_store.add_file(job_id, record['report'])
+            job_store.increment(job_id, processed=1, success=1)
+            source = "（来自缓存）" if record.get('cached') else ""
+            log_message(f"成功生成报告{source}: {os.path.basename(record['report'])}，耗时: {record['duration']:.2f}秒")
+        else:
+            job_store.increment(job_id, processed=1, error=1)
+            reason = f"工作进程异常: {error}" if error is not None else record.get('error')
+            log_message(
+                f"处理文件对 {os.path.basename(dwg_file)} 和 {os.path.basename(excel_file)} 时出错: {reason}",
+                level='error'
+            )
+    
+    def on_complete():
+        """所有文件对处理完成"""
+        try:
+            # 处理完成，报告包在下载时生成
+            job_store.update_job(job_id, status='completed', end_time=time.time())
+            done = job_store.get_job(job_id)
+            log_message(f"批处理作业已完成，总计: {done['total']}，成功: {done['success']}，失败: {done['error']}，耗时: {done['duration']:.2f}秒")
+        except Exception as e:
+            fail_job(e)
+        finally:
+            if app.config['TRACE']:
+                save_trace(trace_spans, job_output_dir)
+            # 清理临时目录，记录输出目录大小
+            shutil.rmtree(job_temp_dir, ignore_errors=True)
+            job_store.remove_dir(job_temp_dir)
+            job_store.set_dir_size(job_output_dir, dir_size(job_output_dir))
+    
     try:
         # 获取文件路径
-        dwg_folder = os.path.join(app.config['TEMP_FOLDER'], job_id, 'dwg')
-        excel_folder = os.path.join(app.config['TEMP_FOLDER'], job_id, 'excel')
-        output_folder = job['output_folder']
+        dwg_folder = os.path.join(job_temp_dir, 'dwg')
+        excel_folder = os.path.join(job_temp_dir, 'excel')
         
         # 获取所有DWG和Excel文件
         dwg_files = glob.glob(os.path.join(dwg_folder, '*.dwg'))
@@ -419,130 +571,203 @@ def process_batch_job(job_id):
         
         log_message(f"找到 {len(dwg_files)} 个DWG文件和 {len(excel_files)} 个Excel文件")
         
-        # 为每对文件找到匹配项
-        file_pairs = []
-        report_files = []
-        
-        # 按文件名前缀匹配文件
-        for dwg_file in dwg_files:
-            dwg_basename = os.path.splitext(os.path.basename(dwg_file))[0]
-            matched = False
-            
-            # 查找匹配的Excel文件
-            for excel_file in excel_files:
-                excel_basename = os.path.splitext(os.path.basename(excel_file))[0]
-                
-                # 检查是否匹配
-                if dwg_basename == excel_basename or dwg_basename in excel_basename or excel_basename in dwg_basename:
-                    file_pairs.append((dwg_file, excel_file))
-                    matched = True
-                    log_message(f"匹配到文件对: {os.path.basename(dwg_file)} 和 {os.path.basename(excel_file)}")
-                    break
-            
-            if not matched:
-                log_message(f"DWG文件 {os.path.basename(dwg_file)} 未找到匹配的Excel文件", level='warning')
-        
-        # 处理每对文件
-        job['total'] = len(file_pairs)
-        
+        # 按规范化的图号和版本号配对
+        file_pairs, unmatched = pair_files(dwg_files, excel_files, confirm_cell=app.config['CONFIRM_DRAWING_NO'])
         for dwg_file, excel_file in file_pairs:
-            try:
-                # 增加处理计数
-                job['processed'] += 1
-                
-                # 生成报告
-                log_message(f"处理文件对: {os.path.basename(dwg_file)} 和 {os.path.basename(excel_file)}")
-                dwg_json_path, excel_json_path, report_path = process_files(dwg_file, excel_file)
-                
-                # 将报告路径添加到列表
-                report_files.append(report_path)
-                
-                # 增加成功计数
-                job['success'] += 1
-                log_message(f"成功生成报告: {os.path.basename(report_path)}")
-                
-            except Exception as e:
-                # 增加错误计数
-                job['error'] += 1
-                error_message = f"处理文件对 {os.path.basename(dwg_file)} 和 {os.path.basename(excel_file)} 时出错: {str(e)}"
-                log_message(error_message, level='error')
-                logger.error(traceback.format_exc())
-        
-        # 创建报告包
-        if report_files:
-            # 创建ZIP包
-            zip_file_path = os.path.join(output_folder, f"batch_{job_id}_reports.zip")
-            create_zip_file(None, report_files, zip_file_path)
-            job['result_zip'] = zip_file_path
-            log_message(f"已创建报告包: {os.path.basename(zip_file_path)}")
+            log_message(f"匹配到文件对: {os.path.basename(dwg_file)} 和 {os.path.basename(excel_file)}")
+        for dwg_file in unmatched:
+            log_message(f"DWG文件 {os.path.basename(dwg_file)} 未找到匹配的Excel文件", level='warning')
         
-        # 处理完成
-        job['status'] = 'completed'
-        job['end_time'] = time.time()
-        job['duration'] = job['end_time'] - job['start_time']
-        log_message(f"批处理作业已完成，总计: {job['total']}，成功: {job['success']}，失败: {job['error']}，耗时: {job['duration']:.2f}秒")
+        job_store.update_job(job_id, total=len(file_pairs))
         
-        # 清理临时目录
-        shutil.rmtree(os.path.join(app.config['TEMP_FOLDER'], job_id), ignore_errors=True)
+        # 提交到调度器，与其他作业轮流使用工作进程；结果写入作业的输出目录
+        scheduler.submit(
+            job_id,
+            process_pair,
+            [pair_task(dwg_file, excel_file, job_output_dir) for dwg_file, excel_file in file_pairs],
+            on_result,
+            on_start=on_start,
+            on_complete=on_complete
+        )
+        log_message(f"已加入处理队列，排队中的文件对: {scheduler.queued_tasks()}")
         
     except Exception as e:
         # 作业失败
-        job['status'] = 'failed'
-        job['end_time'] = time.time()
-        job['duration'] = job['end_time'] - job['start_time']
-        error_message = f"批处理作业失败: {str(e)}"
-        log_message(error_message, level='error')
-        logger.error(traceback.format_exc())
+        fail_job(e)
 
 @app.route('/batch/status/<job_id>')
 def batch_status(job_id):
     """批处理状态页面"""
-    # 检查作业是否存在
-    if job_id not in batch_jobs:
+    # 获取作业信息
+    job = job_store.get_job(job_id)
+    if job is None:
         flash('无效的作业ID')
         return redirect(url_for('batch_page'))
     
-    # 获取作业信息
-    job = batch_jobs[job_id]
-    
+    job['logs'] = job_store.get_logs(job_id)
     return render_template('batch_status.html', job=job, job_id=job_id)
 
+def job_progress(job):
+    """作业进度推送和查询返回的字段，不含日志"""
+    return {
+        'id': job['id'],
+        'status': job['status'],
+        'total': job['total'],
+        'processed': job['processed'],
+        'success': job['success'],
+        'error': job['error'],
+        'progress': job['progress'],
+        'message': job['message'],
+        'completed': job['completed'],
+        'zip_file': job['zip_file'],
+        'timings': (job['result'] or {}).get('timings')
+    }
+
 @app.route('/batch/status/<job_id>/json')
 def batch_status_json(job_id):
-    """获取批处理作业状态的JSON数据"""
-    if job_id not in batch_jobs:
+    """
+    获取批处理作业状态的JSON数据
+    
+    查询参数 since 为客户端已收到的最后一条日志序号，只返回之后的日志；
+    返回的 cursor 作为下一次请求的 since
+    """
+    job = job_store.get_job(job_id)
+    if job is None:
         return jsonify({'error': '无效的作业ID'})
     
-    return jsonify(batch_jobs[job_id])
+    since = request.args.get('since', 0, type=int)
+    result = job_progress(job)
+    result['logs'] = job_store.get_logs(job_id, since) if job['log_seq'] > since else []
+    result['cursor'] = job['log_seq']
+    return jsonify(result)
+
+@app.route('/batch/status/<job_id>/events')
+def batch_status_events(job_id):
+    """
+    以Server-Sent Events推送批处理作业进度
+    
+    事件类型：progress（进度有变化时）、log（每条新日志，id为日志序号）、done（作业结束）。
+    连接在 PROGRESS_STREAM_LIFETIME 秒后由服务器结束，浏览器自动重连，并通过 Last-Event-ID 请求头继续接收之后的日志。
+    本进程的推送连接数已达 MAX_PROGRESS_STREAMS 时返回503，页面改为轮询 /batch/status/<job_id>/json
+    """
+    if job_store.get_job(job_id) is None:
+        return jsonify({'error': '无效的作业ID'}), 404
+    
+    if not progress_streams.acquire(blocking=False):
+        logger.warning(f"进度推送连接数已达上限 {MAX_PROGRESS_STREAMS}，作业 {job_id} 改为轮询")
+        response = jsonify({'error': '进度推送连接数已达上限', 'poll': url_for('batch_status_json', job_id=job_id)})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(RETRY_AFTER_SECONDS)
+        return response
+    
+    since = request.headers.get('Last-Event-ID', type=int) or request.args.get('since', 0, type=int)
+    
+    def sse(event, data, event_id=None):
+        message = f"event: {event}\n"
+        if event_id is not None:
+            message += f"id: {event_id}\n"
+        return message + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    
+    def generate():
+        cursor = since
+        last_progress = None
+        last_sent = time.time()
+        deadline = last_sent + PROGRESS_STREAM_LIFETIME
+        yield f"retry: {PROGRESS_RETRY_MS}\n\n"
+        while True:
+            job = job_store.get_job(job_id)
+            if job is None:
+                yield sse('done', {'status': 'deleted'})
+                return
+            
+            progress = job_progress(job)
+            if progress != last_progress:
+                last_progress = progress
+                last_sent = time.time()
+                yield sse('progress', progress)
+            
+            if job['log_seq'] > cursor:
+                for log in job_store.get_logs(job_id, cursor):
+                    cursor = log['seq']
+                    yield sse('log', log, event_id=log['seq'])
+                last_sent = time.time()
+            
+            if job['status'] in FINISHED_STATUSES:
+                yield sse('done', progress)
+                return
+            
+            # 结束连接，释放请求线程；浏览器重连后从最后一条日志继续
+            if time.time() >= deadline:
+                return
+            
+            # 保持连接，避免被代理超时断开
+            if time.time() - last_sent >= PROGRESS_HEARTBEAT_INTERVAL:
+                last_sent = time.time()
+                yield ": heartbeat\n\n"
+            time.sleep(PROGRESS_POLL_INTERVAL)
+    
+    response = Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # 连接关闭时释放名额（客户端断开时生成器可能尚未开始执行，不能依赖生成器中的 finally）
+    response.call_on_close(progress_streams.release)
+    return response
 
 @app.route('/batch/download/<job_id>')
 def batch_download(job_id):
-    """下载批处理作业结果ZIP包"""
-    # 检查作业是否存在且完成
-    if job_id not in batch_jobs or batch_jobs[job_id]['status'] != 'completed':
-        flash('作业未完成或不存在')
-        return redirect(url_for('batch_page'))
+    """
+    下载批处理作业结果ZIP包
     
-    job = batch_jobs[job_id]
+    ZIP包边读取报告边生成并直接发送，不写入临时文件；xlsx和png已是压缩格式，直接存储。
+    作业仍在处理时下载已生成的部分报告
+    """
+    job = job_store.get_job(job_id)
+    if job is None:
+        flash('作业不存在')
+        return redirect(url_for('batch_page'))
     
-    # 检查ZIP文件是否存在
-    if 'result_zip' not in job or not os.path.exists(job['result_zip']):
-        flash('结果文件不存在')
+    job_store.touch_dirs(job_id)
+    report_files = [path for path in job_store.get_files(job_id) if os.path.exists(path)]
+    if not report_files:
+        flash('暂无已生成的报告')
         return redirect(url_for('batch_status', job_id=job_id))
     
-    return send_file(job['result_zip'], as_attachment=True)
-
-@app.route('/download/<filename>')
-def download_file(filename):
-    """下载单个报告文件"""
+    if job['status'] == 'completed':
+        zip_name = f"batch_{job_id}_reports.zip"
+    else:
+        zip_name = f"batch_{job_id}_reports_partial.zip"
+    
+    return Response(
+        iter_zip(unique_arc_names(report_files)),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{zip_name}"'}
+    )
+
+@app.route('/download/<job_id>/<filename>')
+def download_file(job_id, filename):
+    """下载单个作业输出目录中的报告文件"""
+    job = job_store.get_job(job_id)
+    if job is None or not job['output_folder']:
+        flash('文件不存在或已过期')
+        return redirect(url_for('index'))
+    job_store.touch_dirs(job_id)
     try:
-        return send_file(os.path.join(app.config['OUTPUT_FOLDER'], filename),
-                         as_attachment=True,
-                         download_name=filename)
+        return send_from_directory(job['output_folder'], filename, as_attachment=True, download_name=filename)
     except Exception as e:
         flash(f'下载文件时发生错误: {e}')
         return redirect(url_for('index'))
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus格式的处理耗时和作业指标（所有服务进程的累计值）"""
+    samples = job_store.get_metrics()
+    samples += metrics.QUEUED_PAIRS.samples(job_store.queue_depth())
+    for kind in (KIND_BATCH, KIND_SINGLE):
+        samples += metrics.ACTIVE_JOBS.samples(job_store.count_active(kind=kind), kind=kind)
+    return Response(metrics.render(samples), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/index')
 def index_alias():
     """主页别名"""
@@ -575,7 +800,7 @@ def convert_upload():
     
     # 创建一个唯一的会话ID
     session_id = str(uuid.uuid4())
-    session_folder = os.path.join(app.config['UPLOAD_FOLDER'], session_id)
+    session_folder = shard_path(app.config['UPLOAD_FOLDER'], session_id)
     os.makedirs(session_folder, exist_ok=True)
     
     # 安全地保存文件
@@ -583,12 +808,14 @@ def convert_upload():
     dwg_file_path = os.path.join(session_folder, dwg_filename)
     dwg_file.save(dwg_file_path)
     logger.info(f"DWG文件已保存: {dwg_file_path}")
+    job_store.register_dir(session_id, AREA_UPLOADS, session_folder, dir_size(session_folder, skip_linked=True))
     
     try:
         # 转换DWG为DXF
         base_name = os.path.splitext(dwg_filename)[0]
-        output_folder = os.path.join(app.config['OUTPUT_FOLDER'], session_id)
+        output_folder = shard_path(app.config['OUTPUT_FOLDER'], session_id)
         os.makedirs(output_folder, exist_ok=True)
+        job_store.register_dir(session_id, AREA_OUTPUTS, output_folder)
         
         dxf_file_path = os.path.join(output_folder, f"{base_name}.dxf")
         result_path = convert_dwg_to_dxf(dwg_file_path, dxf_file_path)
@@ -599,6 +826,7 @@ def convert_upload():
             return redirect(url_for('convert_page'))
         
         logger.info(f"DWG已成功转换为DXF: {result_path}")
+        job_store.set_dir_size(output_folder, dir_size(output_folder))
         
         # 返回结果信息
         result = {
@@ -640,13 +868,15 @@ def convert_result():
 
 @app.route('/convert/download/<session_id>/<filename>')
 def download_dxf(session_id, filename):
-    """下载转换后的DXF文件"""
-    output_folder = os.path.join(app.config['OUTPUT_FOLDER'], session_id)
-    if not os.path.exists(output_folder) or not os.path.exists(os.path.join(output_folder, filename)):
+    """下载转换后的DXF文件，输出目录从目录索引中查找"""
+    output_folder = next((entry['path'] for entry in job_store.get_dirs(session_id) if entry['area'] == AREA_OUTPUTS), None)
+    if not output_folder or not os.path.exists(os.path.join(output_folder, filename)):
         flash('文件不存在或已过期')
         return redirect(url_for('convert_page'))
     
+    job_store.touch_dirs(session_id)
     return send_from_directory(output_folder, filename, as_attachment=True, download_name=filename)
 
 if __name__ == '__main__':
+    start_background_tasks()
     app.run(debug=True, host='0.0.0.0', port=5001) 
\ No newline at end of file
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件对处理的独立工作目录
+
+每次处理在输出目录下创建一个独立的隐藏工作目录（.work-<图号>-<随机后缀>），所有中间文件和结果都写在其中。
+处理成功后逐个文件通过 os.replace 原子地移动到输出目录，处理失败则整个删除。
+工作目录与输出目录在同一文件系统上，移动只是重命名：读取输出目录的一方要么看到旧文件，要么看到完整的新文件，
+不会读到写了一半的报告；同名图纸并行处理时也不会互相覆盖中间文件，无需加锁。
+"""
+
+import os
+import time
+import shutil
+import logging
+import tempfile
+from typing import Dict, Iterable
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 工作目录名前缀
+WORKSPACE_PREFIX = '.work-'
+
+
+class Workspace:
+    """
+    输出目录下的独立工作目录，用作上下文管理器：退出时删除未发布的内容
+    """
+
+    def __init__(self, output_dir: str, name: str = ''):
+        """
+        Args:
+            output_dir: 发布结果的输出目录
+            name: 工作目录名中的标识（如DWG文件名），便于排查
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+        self.path = os.path.abspath(tempfile.mkdtemp(prefix=f"{WORKSPACE_PREFIX}{name}-", dir=output_dir))
+
+    def __enter__(self) -> 'Workspace':
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb) -> None:
+        self.discard()
+
+    def publish(self, last: Iterable[str] = ()) -> Dict[str, str]:
+        """
+        将工作目录中的文件原子地移动到输出目录，同名文件被替换
+
+        Args:
+            last: 最后发布的文件（工作目录中的路径），例如报告：报告出现即说明同一次处理的其他文件都已就位
+
+        Returns:
+            Dict[str, str]: 工作目录中的路径 -> 发布后的路径
+        """
+        last = {os.path.abspath(path) for path in last if path}
+        names = sorted(os.listdir(self.path), key=lambda name: os.path.join(self.path, name) in last)
+
+        published = {}
+        for name in names:
+            source = os.path.join(self.path, name)
+            if not os.path.isfile(source):
+                continue
+            target = os.path.join(self.output_dir, name)
+            os.replace(source, target)
+            published[source] = target
+        self.discard()
+        logger.debug(f"已发布 {len(published)} 个文件到 {self.output_dir}")
+        return published
+
+    def discard(self) -> None:
+        """删除工作目录及其中未发布的文件"""
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def remove_stale_workspaces(output_dir: str, max_age: float) -> int:
+    """
+    删除输出目录中超过指定时间未修改的工作目录（处理进程被强制终止时遗留）
+
+    Args:
+        output_dir: 输出目录
+        max_age: 最长保留时间（秒）
+
+    Returns:
+        int: 删除的工作目录数
+    """
+    if not os.path.isdir(output_dir):
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for entry in os.scandir(output_dir):
+        if not entry.name.startswith(WORKSPACE_PREFIX) or not entry.is_dir(follow_symlinks=False):
+            continue
+        try:
+            if entry.stat(follow_symlinks=False).st_mtime >= cutoff:
+                continue
+        except OSError:
+            continue
+        shutil.rmtree(entry.path, ignore_errors=True)
+        removed += 1
+    if removed:
+        logger.info(f"已删除 {removed} 个遗留的工作目录: {output_dir}")
+    return removed
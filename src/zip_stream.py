@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import zipfile
+import logging
+from typing import Iterable, Iterator, List, Tuple
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 本身已压缩的文件直接存储，不再重复压缩
+STORED_EXTENSIONS = ('.xlsx', '.png', '.zip', '.gz')
+
+# 每次读取和输出的数据块大小
+CHUNK_SIZE = 64 * 1024
+
+
+class _ChunkBuffer:
+    """
+    只支持写入的缓冲区，供 ZipFile 写入后由生成器取走数据
+
+    不提供 tell/seek，ZipFile 会按不可定位的流写入（使用数据描述符），无需临时文件
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        """取出已写入的数据"""
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def compress_type_for(path: str) -> int:
+    """根据扩展名选择压缩方式：xlsx、png等已压缩的文件直接存储，其余使用DEFLATE"""
+    if path.lower().endswith(STORED_EXTENSIONS):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def iter_zip(files: Iterable[Tuple[str, str]], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    边读取文件边生成ZIP数据，内存占用与文件大小无关
+
+    Args:
+        files: (文件路径, ZIP内的文件名) 列表，不存在或无法读取的文件被跳过
+        chunk_size: 读取文件的数据块大小
+
+    Yields:
+        bytes: ZIP数据块
+    """
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w') as zipf:
+        for path, arc_name in files:
+            try:
+                zinfo = zipfile.ZipInfo.from_file(path, arc_name)
+                src = open(path, 'rb')
+            except OSError as e:
+                logger.error(f"添加文件到ZIP时出错: {path}, 错误: {e}")
+                continue
+
+            zinfo.compress_type = compress_type_for(path)
+            with src, zipf.open(zinfo, 'w') as dst:
+                while True:
+                    data = src.read(chunk_size)
+                    if not data:
+                        break
+                    dst.write(data)
+                    chunk = buffer.take()
+                    if chunk:
+                        yield chunk
+            logger.info(f"已添加文件到ZIP: {path}")
+            chunk = buffer.take()
+            if chunk:
+                yield chunk
+    # 中央目录
+    chunk = buffer.take()
+    if chunk:
+        yield chunk
+
+
+def unique_arc_names(paths: Iterable[str]) -> List[Tuple[str, str]]:
+    """以文件名作为ZIP内的文件名，重名时追加序号，直到与已使用的文件名都不相同"""
+    used = set()
+    counters = {}
+    result = []
+    for path in paths:
+        name = os.path.basename(path)
+        if name in used:
+            stem, ext = os.path.splitext(name)
+            count = counters.get(name, 0)
+            while name in used:
+                count += 1
+                name = f"{stem}_{count}{ext}"
+            counters[os.path.basename(path)] = count
+        used.add(name)
+        result.append((path, name))
+    return result
@@ -0,0 +1,98 @@
+// 上传去重：提交前在浏览器中计算所选文件的SHA-256，先询问服务器哪些文件已存在，只上传缺少的文件。
+// 浏览器不支持摘要计算（如非HTTPS访问）或握手失败时按普通表单提交。
+(function() {
+    function toHex(buffer) {
+        return Array.prototype.map.call(new Uint8Array(buffer), function(b) {
+            return ('0' + b.toString(16)).slice(-2);
+        }).join('');
+    }
+
+    function sha256(file) {
+        return file.arrayBuffer().then(function(buffer) {
+            return crypto.subtle.digest('SHA-256', buffer);
+        }).then(toHex);
+    }
+
+    window.enableDedupUpload = function(form, checkUrl, onStart) {
+        if (!window.crypto || !window.crypto.subtle || !window.fetch || !window.Blob || !Blob.prototype.arrayBuffer) {
+            if (onStart) {
+                form.addEventListener('submit', onStart);
+            }
+            return;
+        }
+
+        form.addEventListener('submit', function(event) {
+            event.preventDefault();
+            if (onStart) {
+                onStart();
+            }
+
+            var entries = [];
+            var submitted = false;
+            Array.prototype.forEach.call(form.querySelectorAll('input[type=file]'), function(input) {
+                Array.prototype.forEach.call(input.files, function(file) {
+                    entries.push({field: input.name, file: file});
+                });
+            });
+
+            Promise.all(entries.map(function(entry) { return sha256(entry.file); }))
+                .then(function(digests) {
+                    entries.forEach(function(entry, i) { entry.digest = digests[i]; });
+                    return fetch(checkUrl, {
+                        method: 'POST',
+                        headers: {'Content-Type': 'application/json'},
+                        body: JSON.stringify({digests: digests})
+                    });
+                })
+                .then(function(response) {
+                    if (!response.ok) {
+                        throw new Error('握手失败: ' + response.status);
+                    }
+                    return response.json();
+                })
+                .then(function(result) {
+                    var missing = {};
+                    result.missing.forEach(function(digest) { missing[digest] = true; });
+
+                    var data = new FormData();
+                    data.append('manifest', JSON.stringify(entries.map(function(entry) {
+                        return {field: entry.field, name: entry.file.name, digest: entry.digest};
+                    })));
+                    // 相同内容的文件只上传一次
+                    entries.forEach(function(entry) {
+                        if (missing[entry.digest]) {
+                            data.append(entry.field, entry.file, entry.file.name);
+                            delete missing[entry.digest];
+                        }
+                    });
+                    // 文件已经提交，之后出错时显示服务器返回的内容，不再按普通方式重新上传
+                    submitted = true;
+                    return fetch(form.action, {method: 'POST', body: data});
+                })
+                .then(function(response) {
+                    if (!response.ok) {
+                        // 服务器繁忙（503/429）或其他错误（如413、500）时显示返回的页面
+                        return response.text().then(function(html) {
+                            document.open();
+                            document.write(html);
+                            document.close();
+                        });
+                    }
+                    // 服务器返回跳转地址（成功时为状态页面，出错时为带提示消息的上传页面）
+                    return response.json().then(function(result) {
+                        window.location.href = result.redirect;
+                    });
+                })
+                .catch(function(error) {
+                    if (submitted) {
+                        console.error('上传失败:', error);
+                        alert('上传失败，请检查网络后重试');
+                        window.location.reload();
+                        return;
+                    }
+                    console.warn('上传去重不可用，按普通方式上传:', error);
+                    HTMLFormElement.prototype.submit.call(form);
+                });
+        });
+    };
+})();